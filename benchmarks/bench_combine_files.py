@@ -0,0 +1,96 @@
+#!/usr/bin/python2
+"""Compares chunking and compression settings for combine_files.
+
+Builds synthetic single time step channel files, combines them with
+several chunking and compression settings, and reports write time, file
+size, and the time to read one river's time series and one time step's
+map. Run from a folder where pynwm can be imported, e.g.,
+PYTHONPATH=../src python bench_combine_files.py
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from netCDF4 import Dataset
+import numpy as np
+
+from pynwm import nwm_subset
+
+_SETTINGS = [('default', {}),
+             ('zlib map', {'zlib': True, 'chunking': 'map'}),
+             ('zlib time_series', {'zlib': True, 'chunking': 'time_series'}),
+             ('zlib1 time_series', {'zlib': True, 'complevel': 1,
+                                    'chunking': 'time_series'})]
+
+
+def _make_step_files(folder, num_times, num_rivers):
+    ids = np.arange(num_rivers) + 1
+    base = np.random.gamma(1.0, 20.0, num_rivers)
+    files = []
+    for i in range(num_times):
+        nc_file = os.path.join(folder, 'bench_step{0:03d}.nc'.format(i))
+        with Dataset(nc_file, 'w') as nc:
+            nc.model_output_valid_time = '2017-04-29_{0:02d}:00:00'.format(
+                i % 24)
+            nc.createDimension('feature_id', num_rivers)
+            id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+            id_var[:] = ids
+            q_var = nc.createVariable('streamflow', 'f', ('feature_id',))
+            q_var[:] = base * (1 + 0.05 * i)
+        files.append(nc_file)
+    return files
+
+
+def _time_reads(nc_file, count):
+    with Dataset(nc_file) as nc:
+        var = nc.variables['streamflow']
+        num_times, num_rivers = var.shape
+        start = time.time()
+        for j in np.random.randint(0, num_rivers, count):
+            var[:, j]
+        series_time = (time.time() - start) / count
+        start = time.time()
+        for i in np.random.randint(0, num_times, count):
+            var[i, :]
+        map_time = (time.time() - start) / count
+    return series_time, map_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rivers', type=int, default=500000,
+                        help='Number of rivers in each synthetic file')
+    parser.add_argument('--times', type=int, default=18,
+                        help='Number of time step files to combine')
+    parser.add_argument('--reads', type=int, default=20,
+                        help='Number of reads to average per access pattern')
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    files = _make_step_files(folder, args.times, args.rivers)
+    out_file = os.path.join(folder, 'bench_combined.nc')
+    row = '{0:>18} {1:>9} {2:>9} {3:>12} {4:>12}'
+    print(row.format('setting', 'write s', 'MB', 'series ms', 'map ms'))
+    try:
+        for name, kwargs in _SETTINGS:
+            start = time.time()
+            nwm_subset.combine_files(files, out_file, **kwargs)
+            write_time = time.time() - start
+            size_mb = os.path.getsize(out_file) / 1e6
+            series_time, map_time = _time_reads(out_file, args.reads)
+            print(row.format(name, '{0:.2f}'.format(write_time),
+                             '{0:.1f}'.format(size_mb),
+                             '{0:.2f}'.format(series_time * 1000),
+                             '{0:.2f}'.format(map_time * 1000)))
+            os.remove(out_file)
+    finally:
+        for nc_file in files + [out_file]:
+            if os.path.isfile(nc_file):
+                os.remove(nc_file)
+        os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/python2
+"""Compares strategies for reading streamflow for a set of rivers.
+
+Builds a synthetic channel file shaped like a National Water Model CONUS
+file, then times read_streamflow with each read strategy for river sets
+of different sizes. Run from a folder where pynwm can be imported, e.g.,
+PYTHONPATH=../src python bench_read_streamflow.py
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from netCDF4 import Dataset
+import numpy as np
+
+from pynwm import nwm_data
+
+_STRATEGIES = ['auto', 'full', 'blocks', 'points']
+
+
+def _make_channel_file(nc_filename, num_rivers, chunk_len):
+    """Writes a packed, compressed streamflow file with shuffled ids."""
+
+    ids = np.random.permutation(num_rivers * 4)[:num_rivers] + 1
+    flows = np.random.randint(0, 100000, num_rivers)
+    with Dataset(nc_filename, 'w') as nc:
+        nc.createDimension('feature_id', num_rivers)
+        id_var = nc.createVariable('feature_id', 'i', ('feature_id',),
+                                   zlib=True, chunksizes=(chunk_len,))
+        id_var[:] = ids
+        q_var = nc.createVariable('streamflow', 'i', ('feature_id',),
+                                  zlib=True, chunksizes=(chunk_len,),
+                                  fill_value=-999900)
+        q_var.scale_factor = 0.01
+        q_var.add_offset = 0.0
+        q_var.set_auto_maskandscale(False)
+        q_var[:] = flows
+        nc.model_output_valid_time = '2017-04-29_00:00:00'
+    return ids
+
+
+def _time_read(nc_filename, river_ids, strategy, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        nwm_data.read_streamflow(nc_filename, river_ids,
+                                 read_strategy=strategy)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rivers', type=int, default=2700000,
+                        help='Number of rivers in the synthetic file')
+    parser.add_argument('--chunk', type=int, default=100000,
+                        help='Storage chunk length of the synthetic file')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timing repetitions; the best time is shown')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000, 10000, 100000],
+                        help='Sizes of the river sets to read')
+    args = parser.parse_args()
+
+    nc_filename = os.path.join(tempfile.gettempdir(), 'bench_read.nc')
+    try:
+        ids = _make_channel_file(nc_filename, args.rivers, args.chunk)
+        nwm_data.get_id_index(ids)  # Keep the sort out of the timings
+        header = '{0:>8}' + ''.join(' {%d:>9}' % (i + 1)
+                                    for i in range(len(_STRATEGIES)))
+        print(header.format('rivers', *_STRATEGIES) + '  (seconds)')
+        for size in args.sizes:
+            river_ids = np.random.choice(ids, min(size, len(ids)),
+                                         replace=False)
+            nwm_data.get_id_indices(river_ids, ids)  # Warm the lookup
+            times = ['{0:.4f}'.format(_time_read(nc_filename, river_ids,
+                                                 strategy, args.repeat))
+                     for strategy in _STRATEGIES]
+            print(header.format(size, *times))
+    finally:
+        if os.path.isfile(nc_filename):
+            os.remove(nc_filename)
+
+
+if __name__ == '__main__':
+    main()
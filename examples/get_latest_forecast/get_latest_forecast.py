@@ -5,34 +5,18 @@ This script downloads forecasted streamflow for rivers of interest. Run
 as a scheduled task or cron job to keep your database current.
 """
 
-import gzip
 import json
 import os
 import tempfile
-from urllib import urlretrieve
 
 from netCDF4 import Dataset
 import numpy as np
 
-from pynwm.noaa import noaa_latest
+from pynwm.noaa import noaa_download, noaa_latest
 from pynwm.nwm_data import get_schema
 from pynwm.nwm_subset import combine_files
 
 
-def _unzip(filename):
-    """If zip file, unzips and deletes the zip."""
-
-    if filename[-3:] == '.gz':
-        tmpdir = tempfile.gettempdir()
-        nc_file = os.path.join(tmpdir, os.path.basename(filename[:-3]))
-        with gzip.open(filename, 'rb') as z, open(nc_file, 'wb') as uz:
-            uz.write(z.read())
-        os.remove(filename)
-        return nc_file
-    else:
-        return filename
-
-
 def _add_max_q(nc_filename):
     """Adds a variable storing maximum streamflow for each river."""
 
@@ -71,13 +55,10 @@ def main():
         else:
             # We don't have it yet. Download, subset and merge files.
             print('\nRetrieving files to build ' + filename)
-            dl_files = []
-            for index, nwm_file in enumerate(sim['files']):
-                dl_file = os.path.join(tmpdir, nwm_file)
-                print('Downloading ' + nwm_file)
-                urlretrieve(sim['links'][index], dl_file)
-                nc_file = _unzip(dl_file)
-                dl_files.append(nc_file)
+            print('Downloading {0} files'.format(len(sim['files'])))
+            # Gzipped files are read directly, so no need to unzip
+            dl_files = noaa_download.download_files(
+                sim['links'], tmpdir, sim['files'], overwrite=True)
             print('Building cube')
             filepath = os.path.join(output_folder, filename)
             combine_files(dl_files, filepath, ids)
@@ -0,0 +1,202 @@
+#!/usr/bin/python2
+"""Catalog of National Water Model products for each model version.
+
+The catalog is built once at import from the product descriptions in
+pynwm.constants. Looking up a product for a model version is a single
+dictionary access, and a simulation date is matched to its model
+version by searching the few version start dates.
+"""
+
+import bisect
+import collections
+
+import numpy as np
+
+import pynwm.constants as constants
+
+VERSIONS = ('1.0', '1.1', '2.0')
+
+# Simulation date each version starts, in the same order as VERSIONS
+_VERSION_STARTS = ('', constants.V1_1_DATE, constants.V2_0_DATE)
+
+_VERSION_PRODUCTS = {'1.0': constants.PRODUCTSv1_0,
+                     '1.1': constants.PRODUCTSv1_1,
+                     '2.0': constants.PRODUCTSv2_0}
+
+_VERSION_SCHEMAS = {'1.0': constants.SCHEMAv1_0,
+                    '1.1': constants.SCHEMAv1_1,
+                    '2.0': constants.SCHEMAv1_1}
+
+
+class ProductInfo(collections.namedtuple(
+        'ProductInfo',
+        ['product', 'version', 'channel', 'max_time_step', 'step_hrs',
+         'steps', 'offset_hrs', 'forecast_hours', 'valid_offsets',
+         'series_offsets'])):
+    """Description of a product for one model version.
+
+    The arrays are shared by every lookup and are read-only.
+
+    Attributes:
+        product: Product name, e.g., 'long_range_mem1'.
+        version: Model version, e.g., '1.1'.
+        channel: Channel file type in filenames, e.g.,
+            'long_range.channel_rt_1'.
+        max_time_step: Time step of the last file, e.g., 'f720'.
+        step_hrs: Hours between time steps.
+        steps: Number of time steps in a complete simulation.
+        offset_hrs: Hours from the model initialization time to the
+            first value of a HydroShare time series.
+        forecast_hours: Ascending int16 array of the forecast hours of a
+            complete simulation as in filenames.parse_filename, e.g.,
+            [-2, -1, 0] for analysis_assim.
+        valid_offsets: timedelta64[s] array of the valid time of each
+            file in forecast_hours, relative to the cycle time.
+        series_offsets: timedelta64[s] array of the time of each of the
+            first steps values of a HydroShare time series, relative to
+            the model initialization time.
+    """
+
+    __slots__ = ()
+
+    def series_offsets_for(self, count):
+        """Gets the offsets of the first count values of a time series.
+
+        Analysis time series may span more values than a simulation has
+        time steps, in which case the offsets are extended at the same
+        step.
+
+        Args:
+            count: Number of values in the time series.
+
+        Returns:
+            timedelta64[s] array of count offsets.
+        """
+
+        if count <= self.steps:
+            return self.series_offsets[:count]
+        return _hours_to_offsets(
+            self.offset_hrs + np.arange(count, dtype='i8') * self.step_hrs)
+
+
+def _hours_to_offsets(hours):
+    offsets = (np.asarray(hours, dtype='i8') * 3600).astype('timedelta64[s]')
+    offsets.flags.writeable = False
+    return offsets
+
+
+def _build_info(product, version, desc):
+    step_hrs = desc['step_hrs']
+    steps = desc['steps']
+    index = np.arange(steps, dtype='i2')
+    if desc['max_time_step'].startswith('tm'):  # Hours before the cycle
+        forecast_hours = (index - (steps - 1)) * step_hrs
+    else:
+        forecast_hours = desc['offset_hrs'] + index * step_hrs
+    forecast_hours = forecast_hours.astype('i2')
+    forecast_hours.flags.writeable = False
+    series_hours = desc['offset_hrs'] + index.astype('i8') * step_hrs
+    return ProductInfo(product, version, desc['channel'],
+                       desc['max_time_step'], step_hrs, steps,
+                       desc['offset_hrs'], forecast_hours,
+                       _hours_to_offsets(forecast_hours),
+                       _hours_to_offsets(series_hours))
+
+
+class ProductCatalog(object):
+    """Indexes product descriptions by product and model version.
+
+    Example:
+        >>> info = catalog.CATALOG.get('short_range', date='20170401t06-00')
+        >>> info.version, info.steps
+        ('1.0', 15)
+    """
+
+    def __init__(self):
+        self._products = {}
+        for version in VERSIONS:
+            for product, desc in _VERSION_PRODUCTS[version].iteritems():
+                self._products[(product, version)] = _build_info(
+                    product, version, desc)
+
+    @staticmethod
+    def version_for_date(date):
+        """Gets the model version that produced a simulation.
+
+        Args:
+            date: Simulation date, e.g., '20170401t06-00', or day, e.g.,
+                '20170401'.
+
+        Returns:
+            Model version string, e.g., '1.0'.
+        """
+
+        return VERSIONS[bisect.bisect_right(_VERSION_STARTS, date) - 1]
+
+    def get(self, product, date=None, version=None):
+        """Gets the description of a product.
+
+        Args:
+            product: The product, e.g., 'short_range'.
+            date: (Optional) Simulation date, e.g., '20170401t06-00',
+                used to choose the model version if version is not
+                given.
+            version: (Optional) Model version, e.g., '1.1'. Defaults to
+                the version for date, or the latest version if date is
+                not given either.
+
+        Returns:
+            A ProductInfo named tuple.
+
+        Raises:
+            KeyError: The product is not part of the model version.
+        """
+
+        if version is None:
+            version = (VERSIONS[-1] if date is None
+                       else self.version_for_date(date))
+        return self._products[(product, version)]
+
+    def products(self, version=VERSIONS[-1]):
+        """Lists the product names of a model version."""
+
+        return sorted(p for p, v in self._products if v == version)
+
+    @staticmethod
+    def schema(version):
+        """Gets the file schema dictionary of a model version."""
+
+        return _VERSION_SCHEMAS[version]
+
+
+CATALOG = ProductCatalog()
+
+
+def get_product(product, date=None, version=None):
+    """Gets the description of a product from the catalog.
+
+    See ProductCatalog.get.
+    """
+
+    return CATALOG.get(product, date, version)
+
+
+def valid_times(product, sim_date):
+    """Gets the valid time of each file in a complete simulation.
+
+    Args:
+        product: The product, e.g., 'short_range'
+        sim_date: Simulation date, e.g., '20170401t06-00'
+
+    Returns:
+        datetime64[s] array of naive UTC times in forecast hour order.
+
+    Example:
+        >>> catalog.valid_times('analysis_assim', '20170601t06-00')
+        array(['2017-06-01T04:00:00', '2017-06-01T05:00:00',
+               '2017-06-01T06:00:00'], dtype='datetime64[s]')
+    """
+
+    cycle = np.datetime64('{0}-{1}-{2}T{3}:00'.format(
+        sim_date[:4], sim_date[4:6], sim_date[6:8], sim_date[9:11]), 's')
+    return cycle + get_product(product, sim_date).valid_offsets
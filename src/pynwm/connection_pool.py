@@ -0,0 +1,171 @@
+#!/usr/bin/python2
+"""Reuses HTTP connections across requests to the same host."""
+
+import collections
+import contextlib
+import httplib
+import socket
+import threading
+import urllib2
+import urlparse
+
+_REDIRECT_CODES = [301, 302, 303, 307, 308]
+_MAX_REDIRECTS = 5
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of keep-alive HTTP and HTTPS connections.
+
+    Opening a new connection, and for HTTPS a new TLS session, for every
+    file is slow when downloading hundreds of files from the same
+    server. A ConnectionPool keeps idle connections to each host so that
+    later requests, including requests from other threads, reuse them.
+
+    Attributes:
+        max_idle: Most idle connections kept per host.
+        timeout: Socket timeout in seconds.
+    """
+
+    def __init__(self, max_idle=8, timeout=60):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connect(self, host_key):
+        with self._lock:
+            if self._idle[host_key]:
+                return self._idle[host_key].pop(), True
+        return self._new_connection(host_key), False
+
+    def _new_connection(self, host_key):
+        scheme, netloc = host_key
+        if scheme == 'https':
+            return httplib.HTTPSConnection(netloc, timeout=self.timeout)
+        return httplib.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _discard_idle(self, host_key):
+        with self._lock:
+            connections = self._idle.pop(host_key, [])
+        for conn in connections:
+            conn.close()
+
+    def _release(self, host_key, conn, response):
+        """Keeps a connection for reuse if its response was fully read."""
+
+        if response.isclosed() and not response.will_close:
+            with self._lock:
+                if len(self._idle[host_key]) < self.max_idle:
+                    self._idle[host_key].append(conn)
+                    return
+        conn.close()
+
+    def _send(self, method, url, headers):
+        parts = urlparse.urlsplit(url)
+        host_key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        conn, reused = self._connect(host_key)
+        try:
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+        except (httplib.HTTPException, socket.error):
+            conn.close()
+            if not reused:
+                raise
+            # The server may have closed idle connections, in which case
+            # the others kept for this host are closed too. Retry once on
+            # a new connection.
+            self._discard_idle(host_key)
+            conn = self._new_connection(host_key)
+            try:
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                raise
+        return host_key, conn, response
+
+    @contextlib.contextmanager
+    def open(self, url, headers=None, method='GET'):
+        """Sends a request and yields the response.
+
+        Redirects are followed. Read the response within the with block;
+        its connection returns to the pool afterward if it was fully
+        read.
+
+        Args:
+            url: URL to request.
+            headers: (Optional) Dictionary of request headers.
+            method: (Optional) HTTP method.
+
+        Yields:
+            An httplib.HTTPResponse.
+
+        Raises:
+            IOError: The request was redirected more than _MAX_REDIRECTS
+                times.
+        """
+
+        headers = headers or {}
+        for _ in range(_MAX_REDIRECTS + 1):
+            host_key, conn, response = self._send(method, url, headers)
+            location = response.getheader('location')
+            if response.status not in _REDIRECT_CODES or not location:
+                break
+            response.read()
+            self._release(host_key, conn, response)
+            url = urlparse.urljoin(url, location)
+        else:
+            raise IOError('Too many redirects: ' + url)
+        try:
+            yield response
+        finally:
+            self._release(host_key, conn, response)
+
+    def fetch(self, url, headers=None):
+        """Gets the body of a URL.
+
+        Args:
+            url: URL to request.
+            headers: (Optional) Dictionary of request headers.
+
+        Returns:
+            Tuple of status code, dictionary of lowercase response
+            headers, and body string.
+        """
+
+        with self.open(url, headers) as response:
+            body = response.read()
+            return response.status, dict(response.getheaders()), body
+
+    def close(self):
+        """Closes all idle connections."""
+
+        with self._lock:
+            for connections in self._idle.values():
+                for conn in connections:
+                    conn.close()
+            self._idle.clear()
+
+
+def raise_for_status(url, response, ok_codes=(200,)):
+    """Raises urllib2.HTTPError if the response status is not ok.
+
+    Raising the same error type as urllib2.urlopen lets callers handle
+    pooled and unpooled requests alike.
+    """
+
+    if response.status not in ok_codes:
+        raise urllib2.HTTPError(url, response.status, response.reason,
+                                response.msg, None)
+
+
+_default_pool = ConnectionPool()
+
+
+def get_default_pool():
+    """Returns the connection pool shared within this process."""
+
+    return _default_pool
@@ -4,7 +4,51 @@
 import collections
 import re
 
-import pynwm.constants as constants
+import numpy as np
+
+from pynwm import catalog
+
+_PRODUCT_PATTERN = re.compile(r'(?<=z.)([\w]+)')  # Between 'z.' and next '.'
+_MEMBER_PATTERN = re.compile(r'(?<=channel_rt_)([\d])')
+_HOUR_PATTERN = re.compile(r'(?<=\.)(t[\d]{2}z)')  # E.g., t06z
+
+# Matches, e.g., '.t06z.long_range.channel_rt_1.f006.conus' in one pass.
+# Sub-hourly leads have five digits, hours then minutes, e.g., f00115.
+_FILENAME_PATTERN = re.compile(
+    r'\.t(?P<cycle_hour>\d{2})z'
+    r'\.(?P<config>\w+?)'
+    r'\.(?P<file_type>\w+?)(?:_(?P<member>\d+))?'
+    r'\.(?:f(?P<lead>\d{3}(?:\d{2})?)|tm(?P<lag>\d{2}))'
+    r'\.(?P<domain>\w+?)\.')
+
+_MEMBER_PRODUCTS = ['long_range', 'medium_range']
+
+
+class NwmFilename(collections.namedtuple(
+        'NwmFilename',
+        ['cycle_hour', 'product', 'member', 'forecast_hour', 'domain',
+         'forecast_minute'])):
+    """Parts of a National Water Model filename.
+
+    Attributes:
+        cycle_hour: Integer hour the simulation was run, e.g., 6 for t06z.
+        product: Product name as returned by product_from_filename, e.g.,
+            'long_range_mem1'.
+        member: Integer ensemble member number, or 0 if none.
+        forecast_hour: Integer hours from the cycle time to the valid
+            time, e.g., 6 for f006, 1 for f00115, and -2 for tm02.
+        domain: Model domain, e.g., 'conus'.
+        forecast_minute: Integer minutes past forecast_hour for
+            sub-hourly files, e.g., 15 for f00115, otherwise 0.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, cycle_hour, product, member, forecast_hour, domain,
+                forecast_minute=0):
+        return super(NwmFilename, cls).__new__(
+            cls, cycle_hour, product, member, forecast_hour, domain,
+            forecast_minute)
 
 
 def product_from_filename(filename):
@@ -20,11 +64,9 @@ def product_from_filename(filename):
         Product name, e.g., 'short_range'
     """
 
-    pattern = r'(?<=z.)([\w]+)'  # Finds between 'z.' and next '.'
-    product = re.search(pattern, filename).group(0)
-    if product in ['long_range', 'medium_range']:
-        pattern = r'(?<=channel_rt_)([\d])'
-        result = re.search(pattern, filename)
+    product = _PRODUCT_PATTERN.search(filename).group(0)
+    if product in _MEMBER_PRODUCTS:
+        result = _MEMBER_PATTERN.search(filename)
         if result:
             member_number = result.group(0)
             product += '_mem' + member_number
@@ -44,31 +86,145 @@ def hour_from_filename(filename):
         String for the hour the simulation was run, e.g., 't06z'
     """
 
-    pattern = r'(?<=\.)(t[\d]{2}z)'  # Finds, e.g., t06z
-    hour = re.search(pattern, filename).group(0)
+    hour = _HOUR_PATTERN.search(filename).group(0)
     return hour
 
 
+def parse_filename(filename):
+    """Extracts simulation details from a filename in a single match.
+
+    E.g., from 'nwm.t06z.long_range.channel_rt_1.f012.conus.nc', return
+    NwmFilename(cycle_hour=6, product='long_range_mem1', member=1,
+                forecast_hour=12, domain='conus').
+
+    Args:
+        filename: The simulation result filename. HydroShare filenames,
+            which start with the product and date, are also accepted.
+
+    Returns:
+        An NwmFilename named tuple.
+
+    Raises:
+        ValueError: The filename does not follow the model's pattern.
+    """
+
+    match = _FILENAME_PATTERN.search(filename)
+    if not match:
+        raise ValueError('Not a National Water Model filename: ' + filename)
+    (cycle_hour, product, file_type, member, lead, lag,
+     domain) = match.groups()
+    if (member and product in _MEMBER_PRODUCTS and
+            file_type == 'channel_rt' and len(member) == 1):
+        product += '_mem' + member
+    forecast_minute = 0
+    if lead is None:
+        forecast_hour = -int(lag)
+    elif len(lead) == 5:
+        forecast_hour, forecast_minute = int(lead[:3]), int(lead[3:])
+    else:
+        forecast_hour = int(lead)
+    return NwmFilename(int(cycle_hour), product, int(member or 0),
+                       forecast_hour, domain, forecast_minute)
+
+
+def parse_filenames(filenames):
+    """Parses a listing of filenames into columns of NumPy arrays.
+
+    The filenames are joined into one string and matched with a single
+    pass of the compiled filename pattern. The parts are then converted
+    to columns with array operations rather than one filename at a time.
+
+    Args:
+        filenames: List of simulation result filenames.
+
+    Returns:
+        An NwmFilename named tuple whose attributes are arrays with one
+        value per filename: int8 cycle_hour, string product, int8
+        member, int16 forecast_hour, string domain, and int8
+        forecast_minute.
+
+    Raises:
+        ValueError: A filename does not follow the model's pattern.
+
+    Example:
+        >>> parsed = filenames.parse_filenames(sim['files'])
+        >>> parsed.forecast_hour.max()
+        18
+    """
+
+    filenames = list(filenames)
+    if not filenames:
+        dtypes = ['i1', 'S', 'i1', 'i2', 'S', 'i1']
+        return NwmFilename(*[np.zeros(0, dtype) for dtype in dtypes])
+    # Matches cannot span the newlines, so each belongs to one filename
+    matches = list(_FILENAME_PATTERN.finditer('\n'.join(filenames)))
+    starts = np.cumsum([0] + [len(f) + 1 for f in filenames[:-1]])
+    rows = np.searchsorted(starts, [m.start() for m in matches],
+                           side='right') - 1
+    rows, first = np.unique(rows, return_index=True)  # First match per row
+    if len(rows) < len(filenames):
+        unmatched = np.setdiff1d(np.arange(len(filenames)), rows)[0]
+        raise ValueError('Not a National Water Model filename: ' +
+                         filenames[unmatched])
+    parts = np.array([matches[i].groups('') for i in first])
+    (cycle_hour, product, file_type, member, lead, lag,
+     domain) = parts.T
+    has_member = ((member != '') & (file_type == 'channel_rt') &
+                  (np.char.str_len(member) == 1) &
+                  np.in1d(product, _MEMBER_PRODUCTS))
+    product = np.where(has_member,
+                       np.char.add(np.char.add(product, '_mem'), member),
+                       product)
+    lead_len = np.char.str_len(lead)
+    lead_value = np.where(lead_len > 0, lead, '0').astype('i4')
+    sub_hourly = lead_len == 5
+    forecast_hour = np.where(sub_hourly, lead_value // 100, lead_value)
+    forecast_minute = np.where(sub_hourly, lead_value % 100, 0)
+    lag_value = np.where(lag != '', lag, '0').astype('i4')
+    forecast_hour = np.where(lead_len > 0, forecast_hour, -lag_value)
+    return NwmFilename(cycle_hour.astype('i1'),
+                       product,
+                       np.where(member != '', member, '0').astype('i1'),
+                       forecast_hour.astype('i2'),
+                       domain,
+                       forecast_minute.astype('i1'))
+
+
+def expected_forecast_hours(product, sim_date):
+    """Lists the forecast hours of a complete simulation.
+
+    Args:
+        product: The product, e.g., 'short_range'
+        sim_date: Simulation date, e.g., '20170401t06-00'
+
+    Returns:
+        Ascending list of integer forecast hours as in parse_filename,
+        e.g., [1, 2, ..., 18] for short_range or [-2, -1, 0] for
+        analysis_assim.
+    """
+
+    return catalog.get_product(product, sim_date).forecast_hours.tolist()
+
+
 def is_sim_complete(sim):
-    """Checks that file count matches expected number of time steps.
+    """Checks that all expected time steps are present.
 
     Args:
         sim: Simulation dictionary with these items:
             product: The product, e.g., 'short_range'
             date: Simulation date, e.g., '20170401t06-00'
             files: List of files in the simulation
+            missing_steps: (Optional) List of forecast hours with no
+                file, as set by group_simulations. If absent, the file
+                count is compared with the expected number of steps.
 
     Returns:
         True if all expected files are listed; False otherwise.
     """
 
-    product = sim['product']
-    if sim['date'] >= constants.V2_0_DATE:
-        expected_steps = constants.PRODUCTSv2_0[product]['steps']
-    elif sim['date'] >= constants.V1_1_DATE:
-        expected_steps = constants.PRODUCTSv1_1[product]['steps']
-    else:
-        expected_steps = constants.PRODUCTSv1_0[product]['steps']
+    if 'missing_steps' in sim:
+        return not sim['missing_steps']
+    expected_steps = catalog.get_product(sim['product'], sim['date']).steps
     return (len(sim['files']) == expected_steps)
 
 
@@ -80,9 +236,19 @@ def group_simulations(filenames, yyyymmdd, links=None):
     and includes a list of filenames, e.g.
     {'product': 'long_range_mem1',
      'date': '20170401t06-00',
-     'is_complete': True,
+     'is_complete': False,
      'files': ['nwm...f006.conus.nc', 'nwm...f012.conus.nc', ...]
-     'links': ['http...', ...]}
+     'links': ['http...', ...],
+     'forecast_hours': [6, 12, ...],
+     'missing_steps': [42, 48]}
+
+    Files are sorted by forecast hour, and only the first file listed
+    for a forecast time step is kept. Sub-hourly files, e.g., f00115,
+    are kept for each minute, so their hour may be listed more than
+    once in forecast_hours. Forecast hours expected for the product but
+    not found are listed in missing_steps, so that a partial simulation
+    can be processed as its steps arrive. Filenames that do not follow
+    the model's pattern are skipped.
 
      Args:
          filenames: List of filenames to be grouped.
@@ -97,25 +263,35 @@ def group_simulations(filenames, yyyymmdd, links=None):
 
     if type(yyyymmdd) is not str:
         yyyymmdd = str(yyyymmdd)
+    steps = {}  # Simulation key -> {(hour, minute): file index}
     sims = {}
     for index, f in enumerate(filenames):
-        product = product_from_filename(f)
-        hour = hour_from_filename(f)
-        date = yyyymmdd + hour.replace('z', '-00')  # for date parsing
+        try:
+            parsed = parse_filename(f)
+        except ValueError:
+            continue
+        product = parsed.product
+        date = '{0}t{1:02d}-00'.format(yyyymmdd, parsed.cycle_hour)
         key = product + '_' + date
-        if key in sims:
-            sim = sims[key]
-        else:
-            sim = {'product': product,
-                   'date': date,
-                   'is_complete': False,
-                   'files': [],
-                   'links': []}
-            sims[key] = sim
-        sim['files'].append(f)
-        if links:
-            sim['links'].append(links[index])
+        if key not in sims:
+            sims[key] = {'product': product,
+                         'date': date,
+                         'is_complete': False,
+                         'files': [],
+                         'links': []}
+            steps[key] = {}
+        step = (parsed.forecast_hour, parsed.forecast_minute)
+        steps[key].setdefault(step, index)
     for key, sim in sims.iteritems():
+        step_indices = sorted(steps[key].items())
+        sim['forecast_hours'] = [hour for (hour, minute), i in step_indices]
+        sim['files'] = [filenames[i] for _, i in step_indices]
+        if links:
+            sim['links'] = [links[i] for _, i in step_indices]
+        expected = expected_forecast_hours(sim['product'], sim['date'])
+        found = set(sim['forecast_hours'])
+        sim['missing_steps'] = [hour for hour in expected
+                                if hour not in found]
         sim['is_complete'] = is_sim_complete(sim)
     sims = collections.OrderedDict(sorted(sims.items()))
     return sims
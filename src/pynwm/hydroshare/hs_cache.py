@@ -0,0 +1,129 @@
+#!/usr/bin/python2
+"""Caches HydroShare time series responses on disk."""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Default most bytes of responses kept in a cache
+_MAX_BYTES = 100 * 1024 * 1024
+
+
+class ResponseCache(object):
+    """Keeps service responses in a SQLite database file.
+
+    Responses are stored under the SHA-1 hash of the request URI, which
+    includes the product, feature, simulation date and hour, and lag.
+    When the stored responses grow past max_bytes, the least recently
+    used ones are removed.
+
+    Attributes:
+        filename: SQLite database filename.
+        max_bytes: Most bytes of responses to keep.
+    """
+
+    def __init__(self, filename, max_bytes=_MAX_BYTES):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        db = self._connect()
+        try:
+            with db:
+                db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                           'key TEXT PRIMARY KEY, body BLOB, size INTEGER, '
+                           'expires REAL, last_used REAL)')
+                db.execute('CREATE INDEX IF NOT EXISTS responses_last_used '
+                           'ON responses (last_used)')
+        finally:
+            db.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.filename, timeout=30)
+
+    @staticmethod
+    def _key(uri):
+        return hashlib.sha1(uri).hexdigest()
+
+    def get(self, uri):
+        """Gets a cached response.
+
+        Args:
+            uri: Request URI.
+
+        Returns:
+            Response body string, or None if the response is not cached
+            or has expired.
+        """
+
+        key = self._key(uri)
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            try:
+                with db:
+                    row = db.execute('SELECT body, expires FROM responses '
+                                     'WHERE key = ?', (key,)).fetchone()
+                    if row is None:
+                        return None
+                    body, expires = row
+                    if expires is not None and expires <= now:
+                        db.execute('DELETE FROM responses WHERE key = ?',
+                                   (key,))
+                        return None
+                    db.execute('UPDATE responses SET last_used = ? '
+                               'WHERE key = ?', (now, key))
+            finally:
+                db.close()
+        return str(body)
+
+    def put(self, uri, body, ttl=None):
+        """Stores a response, evicting old responses if needed.
+
+        Args:
+            uri: Request URI.
+            body: Response body string.
+            ttl: (Optional) Seconds to keep the response, or None to keep
+                it until evicted.
+        """
+
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        row = (self._key(uri), sqlite3.Binary(body), len(body), expires, now)
+        with self._lock:
+            db = self._connect()
+            try:
+                with db:
+                    db.execute('INSERT OR REPLACE INTO responses VALUES '
+                               '(?, ?, ?, ?, ?)', row)
+                    self._evict(db)
+            finally:
+                db.close()
+
+    def _evict(self, db):
+        """Removes least recently used responses beyond max_bytes."""
+
+        total = db.execute('SELECT COALESCE(SUM(size), 0) '
+                           'FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = db.execute('SELECT key, size FROM responses '
+                          'ORDER BY last_used').fetchall()
+        remove = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            remove.append((key,))
+            total -= size
+        db.executemany('DELETE FROM responses WHERE key = ?', remove)
+
+    def clear(self):
+        """Removes all cached responses."""
+
+        with self._lock:
+            db = self._connect()
+            try:
+                with db:
+                    db.execute('DELETE FROM responses')
+            finally:
+                db.close()
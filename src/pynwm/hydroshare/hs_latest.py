@@ -1,8 +1,16 @@
 #!/usr/bin/python2
 """Identifies the latest National Water Model files in HydroShare."""
 
+import collections
+import contextlib
+import itertools
+from multiprocessing.pool import ThreadPool
+
 from hs_list import list_sims, list_dates
 
+# Older dates listed ahead while checking the newest for a simulation
+_PREFETCH_DATES = 2
+
 
 def _find_complete_sim(sims):
     for key in reversed(sims):
@@ -12,7 +20,34 @@ def _find_complete_sim(sims):
     return (None, None)
 
 
-def find_latest_simulation(product):
+def _iter_date_sims(product, dates, prefetch=_PREFETCH_DATES):
+    """Yields list_sims results for each date in order.
+
+    While the caller checks one date's simulations, the next prefetch
+    dates are already being listed in background threads. If the caller
+    stops early, listings still in progress are abandoned rather than
+    waited for.
+    """
+
+    dates = iter(dates)
+    threads = ThreadPool(prefetch + 1)
+    pending = collections.deque()
+    try:
+        for date in itertools.islice(dates, prefetch + 1):
+            pending.append(threads.apply_async(list_sims, (product, date)))
+        while pending:
+            yield pending.popleft().get()
+            for date in itertools.islice(dates, 1):
+                pending.append(threads.apply_async(list_sims, (product, date)))
+    finally:
+        if pending:  # Stopped early, so the listings are not needed
+            threads.terminate()
+        else:
+            threads.close()
+            threads.join()
+
+
+def find_latest_simulation(product, prefetch=_PREFETCH_DATES):
     """Identifies files for the most recent complete simulation.
 
     As files arrive at HydroShare from NOAA, a folder for the forecast
@@ -29,8 +64,12 @@ def find_latest_simulation(product):
      'files': ['nwm...f006.conus.nc', 'nwm...f012.conus.nc', ...],
      'links': ['http...', ...]}
 
+    Dates are checked newest first. To hide request latency, the next
+    older dates are listed speculatively while a date is checked.
+
     Args:
         product: String product name, e.g., 'short_range'.
+        prefetch: (Optional) Number of older dates to list ahead.
 
     Returns:
         An ordered dictionary of simulation dictionaries, indexed by
@@ -47,10 +86,11 @@ def find_latest_simulation(product):
             sims[key] = sim
     else:
         dates = reversed(list_dates(product))
-        for date in dates:
-            date_sims = list_sims(product, date)
-            key, sim = _find_complete_sim(date_sims)
-            if key:
-                sims[key] = sim
-                break
+        date_sims_iter = _iter_date_sims(product, dates, prefetch)
+        with contextlib.closing(date_sims_iter):
+            for date_sims in date_sims_iter:
+                key, sim = _find_complete_sim(date_sims)
+                if key:
+                    sims[key] = sim
+                    break
     return sims
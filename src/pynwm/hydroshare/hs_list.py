@@ -5,13 +5,16 @@ import collections
 import datetime
 import json
 import re
-from urllib import urlopen
 
 from dateutil import parser as date_parser
 
 from pynwm.filenames import group_simulations
+from pynwm.listing_cache import (LIST_WORKERS, fetch_listing,
+                                 map_concurrent, ttl_for_date)
 from hs_constants import HS_DATA_EXPLORER_URI
 
+_PRODUCTS = ['analysis_assim', 'short_range', 'medium_range', 'long_range']
+
 
 def _date_to_start_date_arg(date):
     start_date = ''
@@ -46,11 +49,12 @@ def _list_files(product, date=None):
 
     config = 'long_range' if 'long_range' in product else product
     member = _product_to_member_arg(product)
+    ttl = ttl_for_date(date)
     date = _date_to_start_date_arg(date)
     template = 'api/GetFileList/?config={config}&geom=channel{date}{member}'
     args = template.format(config=config, date=date, member=member)
     uri = HS_DATA_EXPLORER_URI + args
-    response = urlopen(uri).read()
+    response = fetch_listing(uri, ttl)
     files = json.loads(response)
     if not isinstance(files, list):
         return []
@@ -89,7 +93,7 @@ def list_dates(product):
         if 'long_range' in product:
             product = 'long_range'
         uri = template.format(product)
-        response = urlopen(uri).read()
+        response = fetch_listing(uri)
         dates = re.findall(r'\>([0-9]+)\<', response)
     return sorted(dates)
 
@@ -110,7 +114,27 @@ def _add_links(sims):
                         for f in sim['files']]
 
 
-def list_sims(product=None, yyyymmdd=None):
+def _list_product_sims(product_date):
+    """Lists simulations for one product and date.
+
+    For analysis_assim, the date may be None to list all dates at once.
+    """
+
+    product, date = product_date
+    files = _list_files(product, date)
+    if product != 'analysis_assim':
+        sims = group_simulations(files, date)
+        _add_links(sims)
+        return sims
+    sims = {}
+    for file_date, date_files in _group_by_date(files).iteritems():
+        date_sims = group_simulations(date_files, file_date)
+        _add_links(date_sims)
+        sims.update(date_sims)
+    return sims
+
+
+def list_sims(product=None, yyyymmdd=None, workers=LIST_WORKERS):
     """List available simulation results.
 
     Each simulation is represented as a dictionary describing product
@@ -122,11 +146,15 @@ def list_sims(product=None, yyyymmdd=None):
      'files': ['nwm...f006.conus.nc', 'nwm...f012.conus.nc', ...],
      'links': ['http...', ...]}
 
+    Files for each product and date are listed concurrently.
+
     Args:
         product: (Optional) String product name, e.g., 'short_range'.
             If None, then all products are returned.
         yyyymmdd: String date of the simulation. If None, then all
             available dates are used.
+        workers: (Optional) Most listing requests to send at the same
+            time.
 
     Returns:
         An ordered dictionary of simulation dictionaries, indexed by
@@ -136,28 +164,21 @@ def list_sims(product=None, yyyymmdd=None):
     if yyyymmdd is not None and type(yyyymmdd) is not str:
         yyyymmdd = str(yyyymmdd)
 
-    sims = {}
-    if product is None:
-        products = ['analysis_assim', 'short_range', 'medium_range',
-                    'long_range']
-        for p in products:
-            product_sims = list_sims(p, yyyymmdd)
-            sims.update(product_sims)
-    elif product == 'analysis_assim':
-        all_files = _list_files(product, yyyymmdd)
-        groups = _group_by_date(all_files)
-        for date, files in groups.iteritems():
-            date_sims = group_simulations(files, date)
-            _add_links(date_sims)
-            sims.update(date_sims)
-    elif yyyymmdd is None:
-        dates = list_dates(product)
-        for date in dates:
-            date_sims = list_sims(product, date)
-            sims.update(date_sims)
+    products = [product] if product else _PRODUCTS
+    # analysis_assim lists all dates in one request
+    dated = [p for p in products if p != 'analysis_assim']
+    if yyyymmdd is None:
+        product_dates = map_concurrent(list_dates, dated, workers)
     else:
-        files = _list_files(product, yyyymmdd)
-        sims = group_simulations(files, yyyymmdd)
-        _add_links(sims)
+        product_dates = [[yyyymmdd]] * len(dated)
+    product_date_pairs = [(p, date) for p, dates in zip(dated, product_dates)
+                          for date in dates]
+    if 'analysis_assim' in products:
+        product_date_pairs.append(('analysis_assim', yyyymmdd))
+
+    sims = {}
+    for product_sims in map_concurrent(_list_product_sims,
+                                        product_date_pairs, workers):
+        sims.update(product_sims)
     sims = collections.OrderedDict(sorted(sims.items()))
     return sims
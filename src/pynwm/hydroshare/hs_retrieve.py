@@ -1,19 +1,52 @@
 #!/usr/bin/python2
 """Retrieves National Water Model data from HydroShare."""
 
-from datetime import datetime, timedelta
+import collections
+import httplib
 import json
+from multiprocessing.pool import ThreadPool
 import os
 import re
-from urllib import urlopen, urlretrieve
+import socket
+import sys
+import time
+from urllib import urlretrieve
 from urllib2 import HTTPError
 
 from dateutil import parser as date_parser
+import numpy as np
 import pytz
 
 from hs_constants import HS_DATA_EXPLORER_URI, HS_API_URI
 from hs_latest import find_latest_simulation
-from pynwm.constants import PRODUCTSv1_1
+from pynwm.connection_pool import get_default_pool, raise_for_status
+from pynwm.catalog import get_product
+from pynwm.listing_cache import ttl_for_date
+
+# Seconds to cache responses for latest forecasts and recent analyses
+LATEST_TTL = 300
+
+# Cache for get-netcdf-data responses, or None. See set_response_cache.
+_response_cache = None
+
+# Use a faster JSON decoder if one is installed
+try:
+    import ujson as _json_decoder
+except ImportError:
+    try:
+        import simplejson as _json_decoder
+    except ImportError:
+        _json_decoder = json
+
+# Most get-netcdf-data requests sent at the same time
+_WORKERS = 8
+
+# Retries after an Internal Server Error, which HydroShare returns
+# intermittently, or another transient error, and the delay before the
+# first retry. The delay doubles with each retry.
+_RETRIES = 3
+_BACKOFF_SECS = 1.0
+_RETRY_CODES = (500, 502, 503)
 
 
 def get_file(filename, output_folder):
@@ -22,27 +55,38 @@ def get_file(filename, output_folder):
     urlretrieve(uri, output_filename)
 
 
-def _get_netcdf_data_response_to_json(uri, response):
-    """Loads JSON from response to get-netcdf-data request."""
+def _read_netcdf_data_response(uri, response):
+    """Reads the text of a response to get-netcdf-data request."""
 
     text = response.read()
-    if 'Internal Server Error' in text:
+    if response.status == 500 or 'Internal Server Error' in text:
         raise HTTPError(uri, 500, 'Internal Server Error', None, None)
-    response_obj = json.loads(text)
+    raise_for_status(uri, response)
+    return text
+
+
+def _get_netcdf_data_text_to_json(text):
+    """Loads JSON from the text of a get-netcdf-data response."""
+
+    response_obj = _json_decoder.loads(text)
     if 'error' in response_obj:
         parameter_error_message = '{0} -- Try adjusting input parameters'
         raise ValueError(parameter_error_message.format(response_obj['error']))
     data_text = response_obj['ts_pairs_data']
-    data = json.loads(data_text)
+    data = _json_decoder.loads(data_text)
     return data
 
 
-def _unpack_series(json_data, product):
-    """Returns a list of time series from get-netcdf-data JSON."""
+def _unpack_series(json_data, product, as_numpy=False):
+    """Returns a list of time series from get-netcdf-data JSON.
+
+    If as_numpy is True, dates are a numpy datetime64[s] array of naive
+    UTC times computed from the model initialization time, and values
+    are a float32 array.
+    """
 
     key = 'long_range_mem1' if product == 'long_range' else product
-    time_step_hrs = PRODUCTSv1_1[key]['step_hrs']
-    offset_hrs = PRODUCTSv1_1[key]['offset_hrs']
+    info = get_product(key, version='1.1')  # HydroShare's time convention
 
     data_list = json_data.itervalues().next()
     series_list = []
@@ -52,13 +96,12 @@ def _unpack_series(json_data, product):
         if not len(sim_result[1]):
             m = 'Empty result set. Try adjusting input parameters'
             raise ValueError(m)
-        model_init_time = datetime.utcfromtimestamp(sim_result[0][0]).replace(
-            tzinfo=pytz.utc)
-        start_date = model_init_time + timedelta(hours=offset_hrs)
         value_count = len(sim_result[1])
         series_count = len(sim_result) - 2
-        dates = [start_date + timedelta(hours=i*time_step_hrs)
-                 for i in range(value_count)]
+        model_init_time = np.datetime64(int(sim_result[0][0]), 's')
+        dates = model_init_time + info.series_offsets_for(value_count)
+        if not as_numpy:
+            dates = [d.replace(tzinfo=pytz.utc) for d in dates.tolist()]
 
         label = sim_result[-1]
 
@@ -68,6 +111,8 @@ def _unpack_series(json_data, product):
             else:
                 name = product
 
+            if as_numpy:
+                value_list = np.array(value_list, dtype='f4')
             series_list.append({'name': name,
                                 'dates': dates,
                                 'values': value_list})
@@ -79,7 +124,8 @@ def _hours_to_lags(hour_list):
     return '%2C'.join(hours)
 
 
-def _get_streamflow(product, feature_id, s_date, s_time, e_date, lag):
+def _get_streamflow(product, feature_id, s_date, s_time, e_date, lag,
+                    as_numpy=False, cache_ttl=None):
     """Downloads streamflow time series for a given river.
 
     Downloads streamflow time series for a given river feature using
@@ -98,6 +144,11 @@ def _get_streamflow(product, feature_id, s_date, s_time, e_date, lag):
         lag: (String) Lag argument for URI. This is an escaped comma
             delimited list of long_range forecast simulation hours,
             e.g., 00z%2C06z%2C12z%2C18z.
+        as_numpy: (Optional) True to return dates as a numpy
+            datetime64[s] array of naive UTC times and values as a
+            float32 array.
+        cache_ttl: (Optional) Seconds to keep the response in the
+            response cache, or None to keep it until evicted.
 
     Returns:
         A list of dicts representing time series. Each series includes
@@ -124,12 +175,123 @@ def _get_streamflow(product, feature_id, s_date, s_time, e_date, lag):
         'variable=streamflow&COMID={1}&'
         'startDate={2}&time={3}&endDate={4}&lag={5}')
     uri = uri_template.format(product, feature_id, s_date, s_time, e_date, lag)
-    response = urlopen(uri)
-    json_data = _get_netcdf_data_response_to_json(uri, response)
-    series_list = _unpack_series(json_data, product)
+    json_data = _request_netcdf_data(uri, cache_ttl)
+    series_list = _unpack_series(json_data, product, as_numpy)
     return series_list
 
 
+def _request_netcdf_data(uri, cache_ttl=None):
+    """Requests get-netcdf-data JSON, retrying transient errors.
+
+    Responses are read from and saved to the response cache, if set.
+    Responses with errors are not cached.
+    """
+
+    cache = _response_cache
+    text = cache.get(uri) if cache is not None else None
+    if text is not None:
+        return _get_netcdf_data_text_to_json(text)
+    for attempt in range(_RETRIES + 1):
+        try:
+            with get_default_pool().open(uri) as response:
+                text = _read_netcdf_data_response(uri, response)
+            break
+        except HTTPError as ex:
+            if ex.code not in _RETRY_CODES or attempt == _RETRIES:
+                raise
+        except (httplib.HTTPException, socket.error):
+            if attempt == _RETRIES:
+                raise
+        time.sleep(_BACKOFF_SECS * 2 ** attempt)
+    json_data = _get_netcdf_data_text_to_json(text)
+    if cache is not None:
+        cache.put(uri, text, cache_ttl)
+    return json_data
+
+
+def set_response_cache(cache):
+    """Sets the cache for time series responses.
+
+    Forecasts for a given simulation never change once published, so
+    they are kept until evicted. Latest forecasts and recent analysis
+    results are kept for LATEST_TTL seconds.
+
+    Args:
+        cache: An hs_cache.ResponseCache, or None to disable caching.
+
+    Example:
+        >>> cache = hs_cache.ResponseCache('nwm_responses.sqlite')
+        >>> hs_retrieve.set_response_cache(cache)
+    """
+
+    global _response_cache
+    _response_cache = cache
+
+
+def _is_id_list(feature_id):
+    return isinstance(feature_id, (list, tuple, np.ndarray))
+
+
+def _get_streamflows(product, feature_ids, s_date, s_time, e_date, lag,
+                     workers=_WORKERS, as_numpy=False, cache_ttl=None,
+                     errors=None):
+    """Downloads streamflow for several rivers at once.
+
+    A failed request does not stop the others, so the results of every
+    other river are kept.
+
+    Args:
+        feature_ids: List of river feature identifiers.
+        workers: (Optional) Most requests to send at the same time.
+        errors: (Optional) Dictionary to fill with the exception raised
+            for each feature identifier that failed. If not given, the
+            exception of the first failed identifier is raised after
+            all requests finish, with the dictionary of results as its
+            results attribute and the dictionary of exceptions as its
+            errors attribute.
+        Other arguments are passed to _get_streamflow.
+
+    Returns:
+        An ordered dictionary of _get_streamflow results, indexed by
+        feature identifier in the order given. Failed identifiers are
+        left out.
+    """
+
+    def get(feature_id):
+        try:
+            return _get_streamflow(product, feature_id, s_date, s_time,
+                                   e_date, lag, as_numpy, cache_ttl), None
+        except Exception:
+            return None, sys.exc_info()
+
+    feature_ids = list(feature_ids)
+    if len(feature_ids) < 2 or workers <= 1:
+        outcomes = [get(f) for f in feature_ids]
+    else:
+        threads = ThreadPool(min(workers, len(feature_ids)))
+        try:
+            outcomes = threads.map(get, feature_ids)
+        finally:
+            threads.close()
+            threads.join()
+    results = collections.OrderedDict()
+    failures = collections.OrderedDict()
+    for feature_id, (result, exc_info) in zip(feature_ids, outcomes):
+        if exc_info is None:
+            results[feature_id] = result
+        else:
+            failures[feature_id] = exc_info
+    if failures and errors is None:
+        error = next(iter(failures.values()))
+        error[1].results = results
+        error[1].errors = collections.OrderedDict(
+            (f, exc_info[1]) for f, exc_info in failures.iteritems())
+        raise error[0], error[1], error[2]
+    if errors is not None:
+        errors.update((f, exc_info[1]) for f, exc_info in failures.iteritems())
+    return results
+
+
 def _assert_forecast_product(product):
     valid_products = ['short_range', 'medium_range', 'long_range']
     if product not in valid_products:
@@ -138,15 +300,26 @@ def _assert_forecast_product(product):
         raise ValueError(m)
 
 
-def get_forecasted_streamflow(product, feature_id, sim_yyyymmdd, sim_hh):
+def get_forecasted_streamflow(product, feature_id, sim_yyyymmdd, sim_hh,
+                              workers=_WORKERS, as_numpy=False, errors=None):
     """Downloads forecasted streamflow time series for a given river.
 
     Args:
         product: String indicating model product. Valid values are:
             short_range, medium_range, long_range
-        feature_id: String or Integer identifier of the river feature.
+        feature_id: String or Integer identifier of the river feature,
+            or a list of identifiers to request concurrently.
         sim_yyyymmdd: Model simulation date in yyyymmdd string format.
         sim_hh: (String) Two digit simulation hour, e.g., '06'.
+        workers: (Optional) Most requests to send at the same time when
+            feature_id is a list.
+        as_numpy: (Optional) True to return dates as a numpy
+            datetime64[s] array of naive UTC times and values as a
+            float32 array.
+        errors: (Optional) Dictionary to fill with the exception raised
+            for each identifier that failed when feature_id is a list.
+            Failed identifiers are left out of the results. If not
+            given, the first failure is raised; see _get_streamflows.
 
     Returns:
         A list of dicts representing time series. Each series includes
@@ -156,6 +329,9 @@ def get_forecasted_streamflow(product, feature_id, sim_yyyymmdd, sim_hh):
          'dates': ['2016-06-02 01:00:00+00:00', '2016-06-02 02:...']
          'values': [257.2516, 1295.7293]}
 
+        If feature_id is a list, an ordered dictionary of such lists,
+        indexed by feature identifier.
+
     Example:
         >>> series = hs_retrieve.get_forecasted_streamflow(
                 'short_range', 5671187, '20170420', '06')
@@ -167,37 +343,71 @@ def get_forecasted_streamflow(product, feature_id, sim_yyyymmdd, sim_hh):
 
     _assert_forecast_product(product)
     lag = _hours_to_lags([sim_hh])
-    return _get_streamflow(product, feature_id, sim_yyyymmdd, sim_hh, '', lag)
+    if _is_id_list(feature_id):
+        return _get_streamflows(product, feature_id, sim_yyyymmdd, sim_hh, '',
+                                lag, workers, as_numpy, errors=errors)
+    return _get_streamflow(product, feature_id, sim_yyyymmdd, sim_hh, '', lag,
+                           as_numpy)
 
 
-def get_analysis_streamflow(feature_id, start_date, end_date):
+def get_analysis_streamflow(feature_id, start_date, end_date,
+                            workers=_WORKERS, as_numpy=False, errors=None):
     """Downloads analysis_assim streamflow time series for a river.
 
     Args:
-        feature_id: String identifier of the river feature.
+        feature_id: String identifier of the river feature, or a list of
+            identifiers to request concurrently.
         start_date: (String or Date) Start date for time series data.
         end_date: (String or Date) End date for time series data.
+        workers: (Optional) Most requests to send at the same time when
+            feature_id is a list.
+        as_numpy: (Optional) True to return dates as a numpy
+            datetime64[s] array of naive UTC times and values as a
+            float32 array.
+        errors: (Optional) Dictionary to fill with the exception raised
+            for each identifier that failed when feature_id is a list.
+            Failed identifiers are left out of the results. If not
+            given, the first failure is raised; see _get_streamflows.
 
     Returns:
         A list of dicts representing time series. Each series includes
-        name, dates, and values.
+        name, dates, and values. If feature_id is a list, an ordered
+        dictionary of such lists, indexed by feature identifier.
     """
 
+    # Analysis results through yesterday or today may still be added
+    cache_ttl = None if ttl_for_date(end_date) is None else LATEST_TTL
+    if _is_id_list(feature_id):
+        return _get_streamflows('analysis_assim', feature_id, start_date, '',
+                                end_date, '', workers, as_numpy, cache_ttl,
+                                errors)
     return _get_streamflow('analysis_assim', feature_id, start_date, '',
-                           end_date, '')
+                           end_date, '', as_numpy, cache_ttl)
 
 
-def get_latest_forecasted_streamflow(product, feature_id):
+def get_latest_forecasted_streamflow(product, feature_id, workers=_WORKERS,
+                                     as_numpy=False, errors=None):
     """Gets the latest forecasted streamflow time series for a river.
 
     Args:
         product: String indicating model product. Valid values are:
             short_range, medium_range, long_range
-        feature_id: String identifier of the river feature.
+        feature_id: String identifier of the river feature, or a list of
+            identifiers to request concurrently.
+        workers: (Optional) Most requests to send at the same time when
+            feature_id is a list.
+        as_numpy: (Optional) True to return dates as a numpy
+            datetime64[s] array of naive UTC times and values as a
+            float32 array.
+        errors: (Optional) Dictionary to fill with the exception raised
+            for each identifier that failed when feature_id is a list.
+            Failed identifiers are left out of the results. If not
+            given, the first failure is raised; see _get_streamflows.
 
     Returns:
         A list of dicts representing time series. Each series includes
-        name, dates, and values.
+        name, dates, and values. If feature_id is a list, an ordered
+        dictionary of such lists, indexed by feature identifier.
     """
 
     _assert_forecast_product(product)
@@ -206,4 +416,8 @@ def get_latest_forecasted_streamflow(product, feature_id):
     key = next(iter(sims))
     sim_date = re.findall('\d{8}', key)[0]
     sim_hh = re.findall('t\d\d-', key)[0][1:3]
-    return _get_streamflow(product, feature_id, sim_date, sim_hh, '', lag)
+    if _is_id_list(feature_id):
+        return _get_streamflows(product, feature_id, sim_date, sim_hh, '',
+                                lag, workers, as_numpy, LATEST_TTL, errors)
+    return _get_streamflow(product, feature_id, sim_date, sim_hh, '', lag,
+                           as_numpy, LATEST_TTL)
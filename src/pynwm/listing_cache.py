@@ -0,0 +1,229 @@
+#!/usr/bin/python2
+"""Caches remote directory listings used to find model files."""
+
+import collections
+import datetime
+import hashlib
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+import time
+
+from dateutil import parser as date_parser
+
+from pynwm.connection_pool import get_default_pool, raise_for_status
+
+# Seconds before listings that may still change are checked again
+RECENT_TTL = 60
+
+# Default most pages kept in memory
+_MAX_ENTRIES = 1000
+
+# Most listing pages requested at the same time
+LIST_WORKERS = 8
+
+
+class ListingCache(object):
+    """Caches listing pages in memory and optionally on disk.
+
+    Each page is kept for a time-to-live chosen per request. After it
+    expires, the page is requested again with any ETag or Last-Modified
+    validators from the server, so an unchanged page costs a 304 reply
+    rather than a new download.
+
+    At most max_entries pages are kept in memory. When more are added,
+    the least recently used pages are dropped from memory; pages saved
+    in cache_dir are loaded again when next requested.
+
+    Attributes:
+        cache_dir: Folder for cached pages, or None to cache only in
+            memory.
+        max_entries: Most pages kept in memory.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        name = hashlib.sha1(url).hexdigest() + '.json'
+        return os.path.join(self.cache_dir, name)
+
+    def _remember(self, url, entry):
+        """Keeps an entry in memory as the most recently used."""
+
+        with self._lock:
+            self._entries.pop(url, None)
+            self._entries[url] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None and self.cache_dir:
+            try:
+                with open(self._path(url)) as f:
+                    entry = json.load(f)
+            except (IOError, ValueError):
+                return None
+            entry['body'] = entry['body'].encode('latin-1')
+        if entry is not None:
+            self._remember(url, entry)
+        return entry
+
+    def _store(self, url, entry):
+        self._remember(url, entry)
+        if not self.cache_dir:
+            return
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        disk_entry = dict(entry, body=entry['body'].decode('latin-1'))
+        path = self._path(url)
+        tmp_path = '{0}.{1}.{2}.tmp'.format(path, os.getpid(),
+                                            threading.current_thread().ident)
+        with open(tmp_path, 'w') as f:
+            json.dump(disk_entry, f)
+        if os.path.isfile(path):
+            os.remove(path)  # os.rename does not replace on Windows
+        os.rename(tmp_path, path)
+
+    def get(self, url, ttl=RECENT_TTL):
+        """Gets a listing page from the cache or the server.
+
+        Args:
+            url: URL of the listing.
+            ttl: (Optional) Seconds to keep the page before checking the
+                server again, or None to keep it forever.
+
+        Returns:
+            Page body string.
+
+        Raises:
+            HTTPError: The server returned an error status.
+        """
+
+        entry = self._load(url)
+        now = time.time()
+        if entry and (entry['expires'] is None or now < entry['expires']):
+            return entry['body']
+
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        with get_default_pool().open(url, headers) as response:
+            body = response.read()
+            if not (entry and response.status == 304):
+                raise_for_status(url, response)
+                entry = {'body': body,
+                         'etag': response.getheader('etag'),
+                         'last_modified': response.getheader('last-modified')}
+        entry['expires'] = None if ttl is None else now + ttl
+        self._store(url, entry)
+        return entry['body']
+
+    def clear(self):
+        """Removes all cached pages from memory and disk."""
+
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+_listing_cache = ListingCache()
+
+
+def get_listing_cache():
+    """Returns the listing cache used by noaa_list and hs_list."""
+
+    return _listing_cache
+
+
+def set_listing_cache(cache):
+    """Sets the listing cache used by noaa_list and hs_list.
+
+    Args:
+        cache: A ListingCache, e.g., ListingCache('/tmp/nwm_listings')
+            to keep listings across runs, or None to disable caching.
+    """
+
+    global _listing_cache
+    _listing_cache = cache
+
+
+def fetch_listing(url, ttl=RECENT_TTL):
+    """Gets a listing page through the current listing cache.
+
+    Args:
+        url: URL of the listing.
+        ttl: (Optional) Seconds to keep the page, or None for forever.
+
+    Returns:
+        Page body string.
+    """
+
+    if _listing_cache is None:
+        with get_default_pool().open(url) as response:
+            body = response.read()
+            raise_for_status(url, response)
+        return body
+    return _listing_cache.get(url, ttl)
+
+
+def map_concurrent(func, items, workers=LIST_WORKERS):
+    """Calls func on each item in a thread pool, returning results in order.
+
+    Used by noaa_list and hs_list to request several listings at once.
+
+    Args:
+        func: Function taking one item.
+        items: List of items.
+        workers: (Optional) Most calls made at the same time. With 1 or
+            fewer, or fewer than two items, calls are made in order in
+            the calling thread.
+
+    Returns:
+        List of results in the order of items.
+    """
+
+    if len(items) < 2 or workers <= 1:
+        return [func(item) for item in items]
+    threads = ThreadPool(min(workers, len(items)))
+    try:
+        return threads.map(func, items)
+    finally:
+        threads.close()
+        threads.join()
+
+
+def ttl_for_date(date):
+    """Chooses how long to cache the listing for a simulation date.
+
+    Folders for dates before yesterday (UTC) are complete and never
+    change, so they are cached forever. Yesterday's folder can still
+    receive files from late cycles, so it expires like today's.
+
+    Args:
+        date: Simulation date as a yyyymmdd string or date object, or
+            None for listings not tied to a date.
+
+    Returns:
+        Time-to-live in seconds, or None for forever.
+    """
+
+    if not date:
+        return RECENT_TTL
+    if not isinstance(date, datetime.date):
+        date = date_parser.parse(str(date))
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    yesterday = datetime.datetime.utcnow().date() - datetime.timedelta(days=1)
+    return None if date < yesterday else RECENT_TTL
@@ -0,0 +1,131 @@
+#!/usr/bin/python2
+"""Downloads National Water Model files from NOAA."""
+
+from multiprocessing.pool import ThreadPool
+import os
+import posixpath
+import urlparse
+
+from pynwm.connection_pool import get_default_pool, raise_for_status
+
+# Bytes read from the network at a time
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _content_total(response, offset):
+    """Gets the full file size from a 200 or 206 response, if known."""
+
+    content_range = response.getheader('content-range')
+    if response.status == 206 and content_range:
+        total = content_range.rsplit('/', 1)[-1]
+        return int(total) if total.isdigit() else None
+    length = response.getheader('content-length')
+    if length is None:
+        return None
+    return int(length) + (offset if response.status == 206 else 0)
+
+
+def download_file(link, out_filename, pool=None, progress=None):
+    """Downloads a file, resuming a partial download if there is one.
+
+    Data is written to out_filename + '.part' and renamed to
+    out_filename when complete, so out_filename never holds a partial
+    file. If a .part file remains from an interrupted download, only the
+    missing bytes are requested.
+
+    Args:
+        link: URL of the file.
+        out_filename: Filename for the downloaded file.
+        pool: (Optional) ConnectionPool to send the request through.
+            Defaults to the pool shared within this process.
+        progress: (Optional) Function called as data arrives with the
+            output filename, bytes downloaded, and total bytes (None if
+            unknown).
+
+    Raises:
+        HTTPError: The server returned an error status.
+        IOError: The server closed the connection before sending the
+            whole file. The .part file is kept for a later resume.
+    """
+
+    pool = pool or get_default_pool()
+    part_filename = out_filename + '.part'
+    offset = 0
+    if os.path.isfile(part_filename):
+        offset = os.path.getsize(part_filename)
+    headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+    with pool.open(link, headers) as response:
+        if response.status == 416:  # Partial file is not a prefix; restart
+            response.read()
+            os.remove(part_filename)
+            return download_file(link, out_filename, pool, progress)
+        raise_for_status(link, response, (200, 206))
+        if response.status == 200:
+            offset = 0  # Server ignored the range
+        total = _content_total(response, offset)
+        done = offset
+        with open(part_filename, 'ab' if offset else 'wb') as f:
+            while True:
+                data = response.read(_CHUNK_SIZE)
+                if not data:
+                    break
+                f.write(data)
+                done += len(data)
+                if progress:
+                    progress(out_filename, done, total)
+    if total is not None and done != total:
+        m = 'Download of {0} stopped at {1} of {2} bytes'
+        raise IOError(m.format(link, done, total))
+    if os.path.isfile(out_filename):
+        os.remove(out_filename)  # os.rename does not replace on Windows
+    os.rename(part_filename, out_filename)
+
+
+def download_files(links, output_folder, filenames=None, workers=4,
+                   overwrite=False, progress=None, pool=None):
+    """Downloads several files at once over pooled connections.
+
+    Args:
+        links: List of URLs, e.g., the 'links' of a simulation from
+            noaa_list.list_sims.
+        output_folder: Folder in which to save the files.
+        filenames: (Optional) List of output filenames, one per link. If
+            None, the last part of each link is used.
+        workers: (Optional) Most files to download at the same time.
+        overwrite: (Optional) True to download files that already exist
+            in the output folder; False to skip them.
+        progress: (Optional) Function called as data arrives with the
+            output filename, bytes downloaded, and total bytes (None if
+            unknown). It is called from worker threads.
+        pool: (Optional) ConnectionPool to send requests through.
+
+    Returns:
+        List of downloaded filenames in the same order as links.
+
+    Example:
+        >>> sims = noaa_latest.find_latest_simulation('short_range')
+        >>> for key, sim in sims.iteritems():
+        ...     files = noaa_download.download_files(sim['links'], 'data')
+    """
+
+    if filenames is None:
+        filenames = [posixpath.basename(urlparse.urlsplit(link).path)
+                     for link in links]
+    out_filenames = [os.path.join(output_folder, f) for f in filenames]
+    if not os.path.isdir(output_folder):
+        os.makedirs(output_folder)
+    pool = pool or get_default_pool()
+
+    def download(index):
+        out_filename = out_filenames[index]
+        if overwrite or not os.path.isfile(out_filename):
+            download_file(links[index], out_filename, pool, progress)
+
+    if links:
+        threads = ThreadPool(max(1, min(workers, len(links))))
+        try:
+            threads.map(download, range(len(links)))
+        finally:
+            threads.close()
+            threads.join()
+    return out_filenames
@@ -3,6 +3,10 @@
 
 from noaa_list import list_sims, list_dates
 
+# Long range member/cycle groups in a complete day, i.e., 4 members at
+# each of 4 cycles
+_LONG_RANGE_GROUPS = 16
+
 
 def _find_complete_sim(sims):
     for key in reversed(sims):
@@ -12,6 +16,11 @@ def _find_complete_sim(sims):
     return (None, None)
 
 
+def _is_long_range_complete(sims):
+    return (len(sims) == _LONG_RANGE_GROUPS and
+            all(sim['is_complete'] for sim in sims.itervalues()))
+
+
 def find_latest_simulation(product):
     """Identifies files for the most recent complete simulation.
 
@@ -24,6 +33,11 @@ def find_latest_simulation(product):
      'files': ['nwm...f006.conus.nc', 'nwm...f012.conus.nc', ...],
      'links': ['http...', ...]}
 
+    Date folders are searched from newest to oldest, and the search
+    stops at the first date with a complete simulation, so older folders
+    are never listed. For long_range, a date counts only when all of its
+    member/cycle groups are complete.
+
     Args:
         product: String product name, e.g., 'short_range'.
 
@@ -34,19 +48,13 @@ def find_latest_simulation(product):
     """
 
     sims = {}
-    dates = reversed(list_dates(product))
-    for date in dates:
+    for date in reversed(list_dates()):
         date_sims = list_sims(product, date)
-        if product == 'long_range' and len(date_sims) == 16:
-            is_complete = True
-            for key, sim in date_sims.iteritems():
-                if not sim['is_complete']:
-                    is_complete = False
-                    break
-            if is_complete:
+        if product == 'long_range':
+            if _is_long_range_complete(date_sims):
                 sims = date_sims
                 break
-        elif product != 'long_range':
+        else:
             key, sim = _find_complete_sim(date_sims)
             if key:
                 sims[key] = sim
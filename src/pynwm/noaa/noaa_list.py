@@ -5,46 +5,63 @@ import collections
 import re
 import urllib2
 
-from bs4 import BeautifulSoup
-
-from pynwm.constants import PRODUCTSv2_0 as PRODUCTS
+from pynwm import catalog
 from pynwm.filenames import group_simulations
+from pynwm.listing_cache import (LIST_WORKERS, RECENT_TTL, fetch_listing,
+                                 map_concurrent, ttl_for_date)
 
 _URI_ROOT = 'https://nomads.ncep.noaa.gov/pub/data/nccf/com/nwm/prod/'
 
+_LINK_PATTERN = re.compile(r'<a\s[^>]*?href="([^"]*)"[^>]*>([^<]*)</a>',
+                           re.IGNORECASE)
+_DATE_PATTERN = re.compile(r'\d{8}')
+
+_PRODUCTS = catalog.CATALOG.products()  # Folders of the current version
+
+
+def _parse_links(html):
+    """Extracts link targets from a directory listing page.
+
+    Links whose text starts with 'Parent', i.e., to the parent
+    directory, are skipped.
+    """
+
+    return [href for href, text in _LINK_PATTERN.findall(html)
+            if text.strip()[:6] != 'Parent']
+
 
-def _get_links(uri):
-    f = urllib2.urlopen(uri)
-    soup = BeautifulSoup(f.read(), 'html.parser')
-    links = [a.get('href') for a in soup.find_all('a')
-             if a.text[:6] != 'Parent']
-    return links
+def _get_links(uri, ttl=RECENT_TTL):
+    return _parse_links(fetch_listing(uri, ttl))
 
 
-def list_dates(product=None):
+def list_dates(product=None, workers=LIST_WORKERS):
     """Lists available dates in yyyymmdd format.
 
     If no product is supplied, a folder for any product counts.
 
     Args:
         product: (Optional) String indicating product, e.g., 'short_range'.
+        workers: (Optional) Most date folders to list at the same time
+            when checking for the product.
 
     Returns:
         Sorted list of dates in yyyymmdd format.
     """
 
-    date_folders = _get_links(_URI_ROOT)
+    date_folders = [d for d in _get_links(_URI_ROOT)
+                    if _DATE_PATTERN.search(d)]
     if product:
-        dates = []
-        for date_folder in date_folders:
-            uri = '{0}/{1}'.format(_URI_ROOT, date_folder)
-            products = [p[:-1] for p in _get_links(uri)]  # remove slash
-            for available_product in products:
-                if product in available_product:
-                    dates.append(re.findall('\d{8}', date_folder)[0])
-        dates = list(set(dates))
+        def has_product(date_folder):
+            uri = _URI_ROOT + date_folder
+            ttl = ttl_for_date(_DATE_PATTERN.search(date_folder).group(0))
+            products = [p[:-1] for p in _get_links(uri, ttl)]  # remove slash
+            return any(product in p for p in products)
+
+        found = map_concurrent(has_product, date_folders, workers)
+        dates = list(set(_DATE_PATTERN.search(d).group(0)
+                         for d, has in zip(date_folders, found) if has))
     else:
-        dates = [re.findall('\d{8}', d)[0] for d in date_folders]
+        dates = [_DATE_PATTERN.search(d).group(0) for d in date_folders]
     return sorted(dates)
 
 
@@ -54,7 +71,8 @@ def _list_files(product, yyyymmdd):
     datefolder = 'nwm.' + str(yyyymmdd)
     uri = '{0}{1}/{2}/'.format(_URI_ROOT, datefolder, product)
     try:
-        matches = [m for m in _get_links(uri) if 'channel' in m]
+        links = _get_links(uri, ttl_for_date(yyyymmdd))
+        matches = [m for m in links if 'channel' in m]
         links = ['{0}{1}'.format(uri, m) for m in matches]
         files = [re.findall('nwm\.t.+', f)[0] for f in links]
     except urllib2.HTTPError as ex:
@@ -68,7 +86,34 @@ def _list_files(product, yyyymmdd):
     return files, links
 
 
-def list_sims(product=None, yyyymmdd=None):
+def _list_products(yyyymmdd):
+    """Lists product folders in a date folder, or [] if it is missing."""
+
+    uri = '{0}nwm.{1}/'.format(_URI_ROOT, yyyymmdd)
+    try:
+        return [p.rstrip('/') for p in _get_links(uri, ttl_for_date(yyyymmdd))]
+    except urllib2.HTTPError as ex:
+        if ex.code == 404:
+            return []
+        raise
+
+
+def _match_products(product):
+    """Gets product folder names to list for a product argument.
+
+    A product that is not a folder name itself, e.g., 'long_range',
+    matches all of its ensemble members.
+    """
+
+    if product is None:
+        return list(_PRODUCTS)
+    if product in _PRODUCTS:
+        return [product]
+    members = sorted(p for p in _PRODUCTS if p.startswith(product + '_'))
+    return members or [product]
+
+
+def list_sims(product=None, yyyymmdd=None, workers=LIST_WORKERS):
     """List available simulation results.
 
     Each simulation is represented as a dictionary describing product
@@ -80,24 +125,36 @@ def list_sims(product=None, yyyymmdd=None):
      'files': ['nwm...f006.conus.nc', 'nwm...f012.conus.nc', ...],
      'links': ['http...', ...]}
 
+    Each date folder is listed first, so only product folders that
+    exist are requested. Listings are requested concurrently.
+
     Args:
         product: (Optional) String product name, e.g., 'short_range'.
-            If None, then all products are returned.
+            If None, then all products are returned. 'long_range'
+            returns all long range ensemble members.
         yyyymmdd: String date of the simulation in yyyymmdd format.
             If None, then all available dates are used.
+        workers: (Optional) Most listing pages to request at the same
+            time.
 
     Returns:
         An ordered dictionary of simulation dictionaries, indexed by
         product and date, e.g., 'long_range_mem1_20170401t06-00'
     """
 
-    dates = [yyyymmdd] if yyyymmdd else list_dates()
-    products = [product] if product else [k for k in PRODUCTS]
+    dates = [str(yyyymmdd)] if yyyymmdd else list_dates()
+    products = _match_products(product)
+    date_products = map_concurrent(_list_products, dates, workers)
+    folders = [(date, p) for date, present in zip(dates, date_products)
+               for p in products if p in present]
+
+    def list_folder(folder):
+        date, product = folder
+        files, links = _list_files(product, date)
+        return group_simulations(files, date, links)
+
     all_sims = {}
-    for date in dates:
-        for product in products:
-            files, links = _list_files(product, yyyymmdd)
-            sims = group_simulations(files, date, links)
-            all_sims.update(sims)
+    for sims in map_concurrent(list_folder, folders, workers):
+        all_sims.update(sims)
     all_sims = collections.OrderedDict(sorted(all_sims.items()))
     return all_sims
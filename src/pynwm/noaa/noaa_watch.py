@@ -0,0 +1,175 @@
+#!/usr/bin/python2
+"""Watches NOAA for newly completed National Water Model simulations."""
+
+import collections
+import os
+import shutil
+import tempfile
+import threading
+
+from pynwm.noaa import noaa_download
+from pynwm.noaa.noaa_list import list_dates, list_sims
+from pynwm.nwm_subset import combine_files
+
+# Polls in which handling a simulation may fail before it is skipped
+_MAX_ATTEMPTS = 3
+
+
+class SimulationWatcher(object):
+    """Polls recent NOAA listings and reports simulations as they complete.
+
+    Each poll lists only the most recent date folders and compares the
+    simulations found with those of the previous poll. A simulation is
+    reported once, on the first poll in which filenames.is_sim_complete
+    finds all of its files. If handling a simulation fails, e.g., a
+    download is interrupted, the error is printed, later simulations are
+    still handled, and the failed one is tried again on the next poll.
+    After max_attempts failures the simulation is skipped.
+
+    Listings pass through the listing cache, so polling more often than
+    listing_cache.RECENT_TTL does not see changes any sooner.
+
+    Attributes:
+        product: Product to watch, e.g., 'short_range', or None for all.
+        on_complete: Function called with the simulation key, simulation
+            dictionary, and output (see below) for each newly completed
+            simulation.
+        interval: Seconds between polls when running.
+        num_dates: Number of most recent date folders to list.
+        output_folder: Folder for results, or None to only report
+            simulations. Without river_ids, the simulation's files are
+            downloaded to this folder and the output is the list of
+            downloaded filenames. With river_ids, files are downloaded to
+            a temporary folder and combined into <key>.nc here, which is
+            the output.
+        river_ids: Identifiers of rivers to keep when combining files.
+        include_existing: True to report simulations already complete at
+            the first poll; False to only report those completed later.
+        max_attempts: Polls in which a simulation may fail to be handled
+            before it is skipped.
+    """
+
+    def __init__(self, product=None, on_complete=None, interval=300,
+                 num_dates=2, output_folder=None, river_ids=None,
+                 include_existing=False, max_attempts=_MAX_ATTEMPTS):
+        self.product = product
+        self.on_complete = on_complete
+        self.interval = interval
+        self.num_dates = num_dates
+        self.output_folder = output_folder
+        self.river_ids = river_ids
+        self.include_existing = include_existing
+        self.max_attempts = max_attempts
+        self._reported = None
+        self._failures = {}  # Simulation key -> failed attempts
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _list_recent_sims(self):
+        sims = {}
+        for date in list_dates()[-self.num_dates:]:
+            sims.update(list_sims(self.product, date))
+        return sims
+
+    def _handle(self, key, sim):
+        """Downloads and combines a simulation's files as configured."""
+
+        if not self.output_folder:
+            return None
+        if self.river_ids is None:
+            return noaa_download.download_files(
+                sim['links'], self.output_folder, sim['files'])
+        tmpdir = tempfile.mkdtemp()
+        try:
+            dl_files = noaa_download.download_files(sim['links'], tmpdir,
+                                                    sim['files'])
+            if not os.path.isdir(self.output_folder):
+                os.makedirs(self.output_folder)
+            out_filename = os.path.join(self.output_folder, key + '.nc')
+            combine_files(dl_files, out_filename, self.river_ids)
+        finally:
+            shutil.rmtree(tmpdir)
+        return out_filename
+
+    def poll(self):
+        """Lists recent simulations once and handles newly completed ones.
+
+        Returns:
+            An ordered dictionary of the newly completed simulation
+            dictionaries, indexed by product and date.
+        """
+
+        sims = self._list_recent_sims()
+        complete = set(k for k, sim in sims.iteritems() if sim['is_complete'])
+        if self._reported is None and not self.include_existing:
+            self._reported = complete
+        # Forget simulations whose date folders are no longer listed
+        reported = (self._reported or set()) & complete
+        self._failures = dict((k, n) for k, n in self._failures.iteritems()
+                              if k in complete)
+        new_sims = collections.OrderedDict()
+        try:
+            for key in sorted(complete - reported):
+                if self._handle_new(key, sims[key]):
+                    new_sims[key] = sims[key]
+                if key in new_sims or key not in self._failures:
+                    reported.add(key)  # Handled or skipped
+        finally:
+            self._reported = reported
+        return new_sims
+
+    def _handle_new(self, key, sim):
+        """Handles a newly completed simulation, printing any error.
+
+        Returns:
+            True if the simulation was handled; False if it failed.
+        """
+
+        try:
+            output = self._handle(key, sim)
+            if self.on_complete:
+                self.on_complete(key, sim, output)
+        except Exception as ex:
+            attempts = self._failures.get(key, 0) + 1
+            if attempts < self.max_attempts:
+                self._failures[key] = attempts
+                m = 'Warning: handling {0} failed, will retry -- {1}'
+            else:
+                self._failures.pop(key, None)
+                m = 'Warning: handling {0} failed, skipping it -- {1}'
+            print(m.format(key, ex))
+            return False
+        self._failures.pop(key, None)
+        return True
+
+    def run(self):
+        """Polls every interval seconds until stop is called.
+
+        Errors during a poll are printed and the poll is tried again
+        after the interval.
+        """
+
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as ex:
+                print('Warning: poll for new simulations failed -- {0}'
+                      .format(ex))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Runs the watcher in a background thread."""
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the watcher, waiting for a poll in progress to finish."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,38 +1,465 @@
 #!/usr/bin/python2
 """Reads data from a National Water Model file."""
 
+import collections
+import contextlib
+import functools
+import gzip
+import hashlib
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import Queue
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+
 import numpy as np
 from dateutil import parser as date_parser
 import pytz
-from netCDF4 import Dataset, num2date
+from netCDF4 import Dataset, date2num, default_fillvals, num2date
 
-import pynwm.constants as constants
+from pynwm import catalog
 
 
-def get_schema(nc_dataset):
-    v1_0_dim = constants.SCHEMAv1_0['id_dim']
-    if v1_0_dim in nc_dataset.dimensions:
-        schema = constants.SCHEMAv1_0
+# Bytes decompressed at a time when reading gzipped model files
+_GZIP_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _gzip_size(gz_filename):
+    """Reads the uncompressed size from a gzip file's trailer.
+
+    The trailer stores the size modulo 2**32 of the last gzip member, so
+    it is a starting size for the decompression buffer, not a limit.
+    """
+
+    with open(gz_filename, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack('<I', f.read(4))[0]
+
+
+def _gunzip_to_memory(gz_filename, chunk_size=_GZIP_CHUNK_SIZE):
+    buf = bytearray(_gzip_size(gz_filename))
+    view = memoryview(buf)
+    size = 0
+    with gzip.open(gz_filename, 'rb') as z:
+        while True:
+            if size < len(buf):
+                count = z.readinto(view[size:size + chunk_size])
+            else:
+                view = None  # Release the buffer so it can grow
+                chunk = z.read(chunk_size)  # Trailer size was too small
+                buf.extend(chunk)
+                view = memoryview(buf)
+                count = len(chunk)
+            if not count:
+                break
+            size += count
+    view = None
+    del buf[size:]
+    return buf
+
+
+def gunzip(gz_filename, out_filename, chunk_size=_GZIP_CHUNK_SIZE):
+    """Decompresses a gzip file in fixed-size chunks.
+
+    Only chunk_size bytes of decompressed data are held in memory at a
+    time, however large the file. The output is written to a temporary
+    file first and renamed when complete.
+
+    Args:
+        gz_filename: Gzipped input filename, e.g., 'nwm...conus.nc.gz'.
+        out_filename: Filename for the decompressed output.
+        chunk_size: (Optional) Bytes to decompress at a time.
+    """
+
+    tmp_filename = '{0}.{1}.tmp'.format(out_filename, os.getpid())
+    try:
+        with gzip.open(gz_filename, 'rb') as z, open(tmp_filename, 'wb') as f:
+            shutil.copyfileobj(z, f, chunk_size)
+        os.rename(tmp_filename, out_filename)
+    finally:
+        if os.path.isfile(tmp_filename):
+            os.remove(tmp_filename)
+
+
+@contextlib.contextmanager
+def open_dataset(nc_filename, in_memory=True):
+    """Opens a model file for reading, decompressing gzipped files.
+
+    Files ending in '.gz' are decompressed in fixed-size chunks. By
+    default the decompressed file is opened from memory with no
+    temporary file. Set in_memory to False to decompress to a temporary
+    file instead, which keeps memory use to one chunk at the cost of a
+    disk round trip.
+
+    Args:
+        nc_filename: NetCDF filename, optionally gzipped.
+        in_memory: (Optional) True to decompress gzipped files into
+            memory; False to use a temporary file.
+
+    Yields:
+        An open netCDF4 Dataset.
+
+    Example:
+        >>> with nwm_data.open_dataset('nwm...conus.nc.gz') as nc:
+        ...     print(nwm_data.time_from_dataset(nc))
+    """
+
+    if not nc_filename.endswith('.gz'):
+        with Dataset(nc_filename, 'r') as nc:
+            yield nc
+    elif in_memory:
+        memory = _gunzip_to_memory(nc_filename)
+        name = os.path.basename(nc_filename[:-3])
+        with Dataset(name, 'r', memory=memory) as nc:
+            yield nc
     else:
-        schema = constants.SCHEMAv1_1
-    return schema
+        tmp_fd, tmp_filename = tempfile.mkstemp(suffix='.nc')
+        os.close(tmp_fd)
+        try:
+            gunzip(nc_filename, tmp_filename)
+            with Dataset(tmp_filename, 'r') as nc:
+                yield nc
+        finally:
+            if os.path.isfile(tmp_filename):
+                os.remove(tmp_filename)
+
+
+def get_schema(nc_dataset):
+    v1_0_schema = catalog.CATALOG.schema('1.0')
+    if v1_0_schema['id_dim'] in nc_dataset.dimensions:
+        return v1_0_schema
+    return catalog.CATALOG.schema('1.1')
+
+
+_MAX_CACHED_ID_INDICES = 4
+_MAX_CACHED_LOOKUPS = 16  # Per IdIndex
+_id_index_cache = collections.OrderedDict()
+_id_index_lock = threading.Lock()
+
+
+class IdIndex(object):
+    """Sorted lookup of the river identifiers in a model file.
+
+    Sorting the roughly 2.7 million identifiers in a CONUS file is the
+    most expensive part of finding rivers by identifier. An IdIndex
+    keeps the sort order so that it can be reused for every file with
+    the same identifier layout, and remembers the indices found for
+    the most recently requested sets of identifiers. Lookups may run
+    from several threads at once.
+
+    Attributes:
+        key: Hash of the identifier array.
+        sorted_index: Indices that sort the identifier array.
+        sorted_ids: The identifier array in sorted order.
+    """
+
+    def __init__(self, all_ids, key=None, sorted_index=None):
+        all_ids = np.asarray(all_ids)
+        if key is None:
+            key = _hash_array(all_ids)
+        if sorted_index is None:
+            sorted_index = all_ids.argsort(kind='mergesort')
+        self.key = key
+        self.sorted_index = sorted_index
+        self.sorted_ids = _as_id_array(all_ids[sorted_index])
+        self._lookups = collections.OrderedDict()
+        self._lock = threading.Lock()  # Lookups may run in many threads
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def lookup(self, find_ids):
+        """Finds the position of each identifier in the original array.
+
+        Each requested identifier is found with a binary search, so
+        looking up k identifiers costs O(k log n).
+
+        Args:
+            find_ids: List or numpy array of integer identifiers.
+
+        Returns:
+            Tuple consisting of:
+                index array (int64) into the original identifier array,
+                    in the same order as find_ids. Identifiers that
+                    were not found have an index of -1.
+                found array (bool), True where the identifier exists.
+            Both arrays are shared between calls and are read-only.
+        """
+
+        find_ids = _as_id_array(find_ids)
+        lookup_key = _hash_array(find_ids)
+        with self._lock:
+            result = self._lookups.pop(lookup_key, None)
+            if result is not None:
+                self._lookups[lookup_key] = result  # Most recently used last
+        if result is None:
+            positions = np.searchsorted(self.sorted_ids, find_ids)
+            if len(self.sorted_ids):
+                np.minimum(positions, len(self.sorted_ids) - 1, out=positions)
+                found = self.sorted_ids[positions] == find_ids
+            else:
+                found = np.zeros(len(find_ids), dtype=bool)
+            index = self.sorted_index[positions].astype(np.int64)
+            index[~found] = -1
+            index.flags.writeable = False
+            found.flags.writeable = False
+            result = (index, found)
+            with self._lock:
+                self._lookups[lookup_key] = result
+                while len(self._lookups) > _MAX_CACHED_LOOKUPS:
+                    self._lookups.popitem(last=False)
+        return result
+
+    def indices(self, find_ids):
+        """Finds the position of each identifier in the original array.
+
+        Args:
+            find_ids: List or numpy array of integer identifiers.
+
+        Returns:
+            Read-only numpy array of indices into the original
+            identifier array, in the same order as find_ids.
+
+        Raises:
+            IndexError: One or more identifiers were not found.
+        """
+
+        index, found = self.lookup(find_ids)
+        if not found.all():
+            missing = _as_id_array(find_ids)[~found]
+            shown = ', '.join(str(x) for x in missing[:10])
+            if len(missing) > 10:
+                shown += ', ...'
+            m = '{0} river identifier(s) not found: {1}'
+            raise IndexError(m.format(len(missing), shown))
+        return index
+
+
+def _as_id_array(ids):
+    """Converts identifiers to an int64 array, copying only if needed."""
+
+    ids = np.asarray(ids)
+    if ids.dtype.kind in 'SU':  # Identifiers given as strings
+        return ids.astype(np.int64)
+    return np.asarray(ids, dtype=np.int64)
+
+
+def _hash_array(values):
+    values = np.ascontiguousarray(values)
+    digest = hashlib.sha1(values.view(np.uint8))
+    digest.update(str(values.dtype))
+    return digest.hexdigest()
+
+
+def get_id_index(all_ids, cache_dir=None):
+    """Gets a reusable sorted index of the identifiers in a model file.
+
+    Indexes are cached in memory by a hash of the identifier array, so
+    files sharing the same identifier layout are only sorted once. If a
+    cache folder is provided, the sort order is also saved there as a
+    .npy file and loaded by later processes instead of sorting again.
+
+    Args:
+        all_ids: List or numpy array of all identifiers in the file.
+        cache_dir: (Optional) Folder for .npy files storing sort orders.
+
+    Returns:
+        IdIndex for the identifiers.
+    """
+
+    all_ids = np.asarray(all_ids)
+    key = _hash_array(all_ids)
+    with _id_index_lock:
+        id_index = _id_index_cache.pop(key, None)
+        if id_index is not None:
+            _id_index_cache[key] = id_index  # Most recently used last
+            return id_index
+
+    sorted_index = None
+    if cache_dir:
+        npy_file = os.path.join(cache_dir, 'id_index_{0}.npy'.format(key))
+        if os.path.isfile(npy_file):
+            sorted_index = np.load(npy_file)
+            if len(sorted_index) != len(all_ids):
+                sorted_index = None
+    id_index = IdIndex(all_ids, key, sorted_index)
+    if cache_dir and sorted_index is None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_file = '{0}.{1}.tmp.npy'.format(npy_file[:-4], os.getpid())
+        np.save(tmp_file, id_index.sorted_index)
+        os.rename(tmp_file, npy_file)  # Readers never see a partial file
+
+    with _id_index_lock:
+        _id_index_cache[key] = id_index
+        while len(_id_index_cache) > _MAX_CACHED_ID_INDICES:
+            _id_index_cache.popitem(last=False)
+    return id_index
+
+
+def clear_id_index_cache():
+    """Removes all identifier indexes cached in memory."""
+
+    with _id_index_lock:
+        _id_index_cache.clear()
+
+
+def get_id_indices(find_ids, all_ids, cache_dir=None, return_found=False):
+    """Finds the position of each identifier within all identifiers.
+
+    Args:
+        find_ids: List or numpy array of integer identifiers to find.
+        all_ids: List or numpy array of all identifiers in the file.
+        cache_dir: (Optional) Folder for .npy files storing sort orders.
+            See get_id_index.
+        return_found: (Optional) True to return a mask of which
+            identifiers were found instead of raising an error for
+            missing identifiers.
+
+    Returns:
+        Numpy array of indices into all_ids in the same order as
+        find_ids. If return_found is True, returns a tuple of the index
+        array and a boolean array that is False for identifiers not in
+        all_ids, whose index is -1.
+
+    Raises:
+        IndexError: One or more identifiers were not found and
+            return_found is False.
+    """
+
+    id_index = get_id_index(all_ids, cache_dir)
+    if return_found:
+        return id_index.lookup(find_ids)
+    return id_index.indices(find_ids)
+
+
+# Number of values that can be read in about the time it takes to make
+# one more read call. Gaps shorter than this are read through rather than
+# starting a new block.
+_READ_CALL_COST = 8192
+_READ_STRATEGIES = ['auto', 'full', 'blocks', 'points']
+
+
+def _coalesce_indices(unique, call_cost=_READ_CALL_COST, chunk_len=1):
+    """Groups sorted, unique indices into contiguous (start, stop) blocks.
+
+    Neighboring indices are merged into one block when the values
+    between them are cheaper to read through than to skip with another
+    read call. Values sharing a storage chunk are always merged since
+    the whole chunk is read either way.
+    """
+
+    if not len(unique):
+        return []
+    chunk_ids = unique // chunk_len
+    skipped = (np.diff(chunk_ids) - 1).clip(0) * chunk_len
+    if chunk_len == 1:
+        skipped = np.diff(unique) - 1
+    breaks = np.nonzero(skipped > call_cost)[0]
+    starts = np.concatenate(([unique[0]], unique[breaks + 1]))
+    stops = np.concatenate((unique[breaks], [unique[-1]])) + 1
+    return zip(starts.tolist(), stops.tolist())
+
+
+def _plan_reads(indices, size, call_cost=_READ_CALL_COST, chunk_len=1):
+    """Plans how to read scattered values from a 1D variable.
+
+    Sorted indices are coalesced into contiguous blocks. Each block
+    costs the values in the storage chunks it touches plus call_cost
+    for the read call itself. The plan reads the whole variable instead
+    when that costs no more than reading the blocks.
+
+    Args:
+        indices: Array of indices to read.
+        size: Length of the variable.
+        call_cost: (Optional) Cost of one read call, in values.
+        chunk_len: (Optional) Length of the variable's storage chunks,
+            or 1 if the variable is not chunked.
+
+    Returns:
+        Tuple consisting of:
+            strategy: 'full', 'blocks', or 'points'. Points are blocks
+                of a single value.
+            blocks: List of (start, stop) tuples in ascending order.
+    """
+
+    unique = np.unique(indices)
+    blocks = _coalesce_indices(unique, call_cost, chunk_len)
+    chunks_read = sum((stop - 1) // chunk_len - start // chunk_len + 1
+                      for start, stop in blocks)
+    block_cost = chunks_read * chunk_len + len(blocks) * call_cost
+    full_cost = -(-size // chunk_len) * chunk_len + call_cost
+    if blocks and full_cost <= block_cost:
+        return 'full', [(0, size)]
+    if len(blocks) == len(unique):
+        return 'points', blocks
+    return 'blocks', blocks
+
 
+def _chunk_len(var):
+    chunking = var.chunking()
+    if isinstance(chunking, list):
+        return chunking[0]
+    return 1  # Contiguous or netCDF-3
 
-def get_id_indices(find_ids, all_ids):
-    if len(find_ids) and type(find_ids[0]) is str:
-        find_ids = [int(x) for x in find_ids]
-    if type(find_ids) != 'numpy.ndarray':
-        find_ids = np.array(find_ids)
-    if type(all_ids) != 'numpy.ndarray':
-        all_ids = np.array(all_ids)
-    sorted_index = all_ids.argsort()
-    sorted_nc_comids = all_ids[sorted_index]
-    found_index_sorted = np.searchsorted(sorted_nc_comids, find_ids)
-    index = sorted_index[found_index_sorted]
-    return index
 
+def read_indices(var, indices, strategy='auto'):
+    """Reads values at the given indices of a 1D netCDF variable.
 
-def read_streamflow(nc_filename, river_ids):
+    Reading a netCDF variable with an unsorted index array results in
+    many small reads. Instead, indices are sorted and read as planned
+    by _plan_reads, and the results are put back in the input order.
+
+    Args:
+        var: 1D netCDF variable.
+        indices: Array of indices to read.
+        strategy: (Optional) 'auto' to choose from the read plan, or
+            force 'full', 'blocks', or 'points'.
+
+    Returns:
+        Array of values in the same order as indices, masked if the
+        variable returns masked arrays.
+    """
+
+    if strategy not in _READ_STRATEGIES:
+        m = 'Invalid read strategy: {0}. Valid strategies include {1}.'
+        raise ValueError(m.format(strategy, ', '.join(_READ_STRATEGIES)))
+    indices = np.asarray(indices)
+    if not len(indices):
+        return var[0:0]
+    unique, inverse = np.unique(indices, return_inverse=True)
+    if strategy == 'auto':
+        strategy, blocks = _plan_reads(unique, len(var),
+                                       chunk_len=_chunk_len(var))
+    elif strategy == 'blocks':
+        blocks = _coalesce_indices(unique, chunk_len=_chunk_len(var))
+    if strategy == 'full':
+        return var[:][indices]
+    if strategy == 'points':
+        return var[unique][inverse]
+
+    parts = [var[start:stop] for start, stop in blocks]
+    if any(isinstance(part, np.ma.MaskedArray) for part in parts):
+        values = np.ma.concatenate(parts)
+        masked_parts = [part for part in parts if np.ma.is_masked(part)]
+        if masked_parts:
+            values.fill_value = masked_parts[0].fill_value
+    else:
+        values = np.concatenate(parts)
+    starts = np.array([block[0] for block in blocks])
+    lengths = np.array([block[1] - block[0] for block in blocks])
+    offsets = np.concatenate(([0], lengths.cumsum()[:-1]))
+    block_ids = np.searchsorted(starts, unique, side='right') - 1
+    positions = offsets[block_ids] + unique - starts[block_ids]
+    return values[positions][inverse]
+
+
+def read_streamflow(nc_filename, river_ids, id_cache_dir=None,
+                    read_strategy='auto', in_memory=True):
     """Reads streamflow for a set of river identifiers in a given file.
 
     Reads streamflow in cubic meters per second for a set of rivers
@@ -44,6 +471,17 @@ def read_streamflow(nc_filename, river_ids):
             identifiers for the rivers whose streamflow value is to be
             returned. These are NHD COMIDs for U.S. rivers, and
             arbitrary identifiers for other rivers.
+        id_cache_dir: (Optional) Folder for saving identifier sort
+            orders so they can be reused across processes. See
+            get_id_index.
+        read_strategy: (Optional) How to read values from the file.
+            'auto' picks the cheapest of reading the whole variable,
+            reading contiguous blocks around the rivers, or reading
+            each river individually. Use 'full', 'blocks', or 'points'
+            to force one of these.
+        in_memory: (Optional) True to decompress gzipped files into
+            memory; False to decompress them to a temporary file, which
+            keeps memory use bounded. See open_dataset.
 
     Returns:
         A dictionary with a 'flows' array of streamflow values in
@@ -65,14 +503,14 @@ def read_streamflow(nc_filename, river_ids):
     result = {}
     qs = {}
 
-    with Dataset(nc_filename, 'r') as nc:
+    with open_dataset(nc_filename, in_memory) as nc:
         schema = get_schema(nc)
         date = time_from_dataset(nc)
         result['datetime'] = date
         nc_ids = nc.variables[schema['id_var']][:]
         nc_q = nc.variables['streamflow']
-        indices = get_id_indices(river_ids, nc_ids)
-        result['flows'] = nc_q[indices]
+        indices = get_id_indices(river_ids, nc_ids, id_cache_dir)
+        result['flows'] = read_indices(nc_q, indices, read_strategy)
     return result
 
 
@@ -92,7 +530,477 @@ def time_from_dataset(nc_dataset):
     return date
 
 
-def build_streamflow_cube(nc_files, river_ids=None, consistent_id_order=True):
+def raw_time_from_dataset(nc_dataset):
+    """Reads the model output time without converting it to a date.
+
+    Pass the raw times of several files to raw_times_to_datetime64 to
+    convert them all at once.
+
+    Args:
+        nc_dataset: netCDF4 Dataset of model results.
+
+    Returns:
+        Tuple of time value and units, e.g., (24802440, 'minutes since
+        1970-01-01 00:00:00 UTC'). Files without a time variable give
+        the model_output_valid_time string and None for units.
+
+    Raises:
+        ValueError: No time is found in the dataset.
+    """
+
+    if 'time' in nc_dataset.variables:
+        var = nc_dataset.variables['time']
+        return var[0].item(), var.units
+    elif 'model_output_valid_time' in nc_dataset.ncattrs():
+        return nc_dataset.model_output_valid_time, None
+    raise ValueError('Could not find model output time in netCDF dataset.')
+
+
+# Seconds in each time unit of CF time units strings
+_UNIT_SECONDS = {'second': 1, 'seconds': 1, 'sec': 1, 'secs': 1, 's': 1,
+                 'minute': 60, 'minutes': 60, 'min': 60, 'mins': 60,
+                 'hour': 3600, 'hours': 3600, 'hr': 3600, 'hrs': 3600,
+                 'h': 3600, 'day': 86400, 'days': 86400, 'd': 86400}
+
+# Time units string -> (seconds per unit, datetime64[s] reference time)
+_parsed_units = {}
+
+
+def _parse_time_units(units):
+    """Splits time units into seconds per unit and reference time.
+
+    Returns:
+        Tuple of seconds per unit and datetime64[s] reference time in
+        UTC, or None if the units are not a fixed number of seconds
+        since a date.
+    """
+
+    if units not in _parsed_units:
+        parsed = None
+        parts = units.split(' since ', 1)
+        step = _UNIT_SECONDS.get(parts[0].strip().lower())
+        if step is not None and len(parts) == 2:
+            ref = date_parser.parse(parts[1])
+            if ref.tzinfo is not None:
+                ref = ref.astimezone(pytz.utc).replace(tzinfo=None)
+            parsed = (step, np.datetime64(ref, 's'))
+        _parsed_units[units] = parsed
+    return _parsed_units[units]
+
+
+def _parse_valid_time(valid_time):
+    date = date_parser.parse(valid_time.replace('_', ' '))
+    if date.tzinfo is not None:
+        date = date.astimezone(pytz.utc).replace(tzinfo=None)
+    return date
+
+
+def _valid_times_to_datetime64(valid_times):
+    try:
+        return np.array([t.replace('_', 'T') for t in valid_times],
+                        dtype='datetime64[s]')
+    except ValueError:  # Not ISO 8601, so parse each string
+        return np.array([_parse_valid_time(t) for t in valid_times],
+                        dtype='datetime64[s]')
+
+
+def raw_times_to_datetime64(raw_times):
+    """Converts raw model output times to dates in one step.
+
+    Times sharing the same units are converted together with integer
+    arithmetic, so no datetime objects are made for each time.
+
+    Args:
+        raw_times: List of (value, units) tuples from
+            raw_time_from_dataset.
+
+    Returns:
+        numpy datetime64[s] array of naive UTC times.
+
+    Example:
+        >>> raw = []
+        >>> for nc_file in nc_files:
+        ...     with nwm_data.open_dataset(nc_file) as nc:
+        ...         raw.append(nwm_data.raw_time_from_dataset(nc))
+        >>> times = nwm_data.raw_times_to_datetime64(raw)
+    """
+
+    out = np.empty(len(raw_times), dtype='datetime64[s]')
+    if not len(raw_times):
+        return out
+    values, units = zip(*raw_times)
+    units = np.array(units, dtype=object)
+    for unit in set(units):
+        where = np.flatnonzero(units == unit)
+        group = [values[i] for i in where]
+        if unit is None:
+            out[where] = _valid_times_to_datetime64(group)
+            continue
+        parsed = _parse_time_units(unit)
+        if parsed is None:  # E.g., months, which vary in length
+            dates = [d.replace(tzinfo=None) for d in num2date(group, unit)]
+            out[where] = np.array(dates, dtype='datetime64[s]')
+            continue
+        step, ref = parsed
+        secs = np.rint(np.asarray(group, dtype='f8') * step).astype('i8')
+        out[where] = ref + secs.astype('timedelta64[s]')
+    return out
+
+
+def datetime64_to_times(dates, units):
+    """Converts dates to values in netCDF time units in one step.
+
+    This is the inverse of raw_times_to_datetime64 and works like
+    netCDF4.date2num for naive UTC dates, rounded to whole units.
+
+    Args:
+        dates: numpy datetime64 array of naive UTC times.
+        units: Time units, e.g., 'minutes since 1970-01-01 00:00:00 UTC'.
+
+    Returns:
+        numpy int64 array of times.
+    """
+
+    dates = np.asarray(dates, dtype='datetime64[s]')
+    parsed = _parse_time_units(units)
+    if parsed is None:
+        return np.rint(date2num(dates.tolist(), units)).astype('i8')
+    step, ref = parsed
+    secs = (dates - ref).astype('i8')
+    return np.rint(secs / float(step)).astype('i8')
+
+
+def _datetime64_to_utc(dates):
+    """Converts a datetime64 array to a list of UTC datetime objects."""
+
+    return [d.replace(tzinfo=pytz.utc) for d in dates.tolist()]
+
+
+# Per-process arguments for reading cube time steps in a process pool
+_cube_worker_args = {}
+
+
+def _init_cube_worker(river_ids, indices, id_cache_dir, dtype, in_memory):
+    _cube_worker_args['river_ids'] = river_ids
+    _cube_worker_args['indices'] = indices
+    _cube_worker_args['id_cache_dir'] = id_cache_dir
+    _cube_worker_args['dtype'] = dtype
+    _cube_worker_args['in_memory'] = in_memory
+
+
+def _check_cube_dtype(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f' or (dtype.kind == 'i' and dtype.itemsize >= 4):
+        return dtype
+    m = 'Invalid cube dtype: {0}. Use a float or an int32 or larger.'
+    raise ValueError(m.format(dtype))
+
+
+def _to_cube_dtype(q, dtype):
+    """Converts float streamflow with fill values to the cube dtype.
+
+    Integer dtypes hold streamflow packed the same way as in the model
+    files, i.e., in hundredths of cubic meters per second with a fill
+    value of fill_val_int.
+    """
+
+    if dtype.kind == 'f':
+        return q.astype(dtype, copy=False)
+    schema = catalog.CATALOG.schema('1.1')
+    scale_factor = dict(schema['flow_attrs'])['scale_factor']
+    packed = np.round(q / scale_factor).astype(dtype)
+    packed[q <= schema['fill_val_float']] = schema['fill_val_int']
+    return packed
+
+
+def _missing_mask(var, raw):
+    """Flags raw values that netCDF4 would mask on read."""
+
+    attrs = var.ncattrs()
+    if '_FillValue' in attrs:
+        fill_values = [var.getncattr('_FillValue')]
+    else:
+        fill_values = [default_fillvals.get(var.dtype.str[1:])]
+    if 'missing_value' in attrs:
+        fill_values.extend(np.atleast_1d(var.getncattr('missing_value')))
+    missing = np.zeros(raw.shape, dtype=bool)
+    for fill_value in fill_values:
+        if fill_value is not None:
+            missing |= raw == fill_value
+    if 'valid_range' in attrs:
+        valid_min, valid_max = var.getncattr('valid_range')
+    else:
+        valid_min = getattr(var, 'valid_min', None)
+        valid_max = getattr(var, 'valid_max', None)
+    if valid_min is not None:
+        missing |= raw < valid_min
+    if valid_max is not None:
+        missing |= raw > valid_max
+    return missing
+
+
+def read_flows(var, indices, dtype):
+    """Reads streamflow in the cube dtype with fill values applied.
+
+    Masking and scaling are turned off in netCDF4 so that packed values
+    are read as stored. Packed integers are copied straight into integer
+    cubes, and otherwise scaled once in the output float precision
+    rather than through float64 masked arrays.
+
+    Args:
+        var: Streamflow variable. Any object with the parts of the
+            netCDF4 variable interface used here works, e.g.,
+            nwm_remote's adapter for h5py datasets.
+        indices: Array of indices of the rivers to read.
+        dtype: Numpy dtype of the result. See build_streamflow_cube.
+
+    Returns:
+        Array of streamflow in the order of indices, with missing values
+        set to the schema's fill value.
+    """
+
+    var.set_auto_maskandscale(False)
+    raw = read_indices(var, indices)
+    missing = _missing_mask(var, raw)
+    scale_factor = getattr(var, 'scale_factor', None)
+    add_offset = getattr(var, 'add_offset', 0.0)
+
+    schema = catalog.CATALOG.schema('1.1')
+    packed_scale = dict(schema['flow_attrs'])['scale_factor']
+    # Model files store scale_factor as float32, so compare in float32
+    if (dtype.kind == 'i' and raw.dtype.kind == 'i' and
+            scale_factor is not None and
+            np.float32(scale_factor) == np.float32(packed_scale) and
+            add_offset == 0):
+        q = raw.astype(dtype, copy=False)
+        # Assume values <= fill value are fills
+        missing |= q <= schema['fill_val_int']
+        q[missing] = schema['fill_val_int']
+        return q
+
+    float_dtype = dtype if dtype.kind == 'f' else np.dtype('f8')
+    q = raw.astype(float_dtype)
+    if scale_factor is not None:
+        q *= float_dtype.type(scale_factor)
+    if add_offset:
+        q += float_dtype.type(add_offset)
+    fill_value = schema['fill_val_float']
+    # Assume values <= fill_value are fills
+    missing |= q <= fill_value
+    q[missing] = fill_value
+    return _to_cube_dtype(q, dtype)
+
+
+def _step_indices(nc, river_ids, indices, id_cache_dir):
+    """Returns indices of the rivers in a file, finding them if None."""
+
+    if indices is None:
+        schema = get_schema(nc)
+        nc_ids = nc.variables[schema['id_var']][:]
+        indices = get_id_indices(river_ids, nc_ids, id_cache_dir)
+    return indices
+
+
+def _read_cube_step(nc_file, river_ids, indices=None, id_cache_dir=None,
+                    dtype=np.dtype('f8'), in_memory=True):
+    """Reads the time and streamflow for one file of a cube.
+
+    Args:
+        nc_file: NetCDF filename.
+        river_ids: Array of river identifiers to read.
+        indices: (Optional) Indices of the rivers in the file. If None,
+            indices are found from the identifiers in the file.
+        id_cache_dir: (Optional) Folder for saving identifier sort
+            orders.
+        dtype: (Optional) Numpy dtype of the returned streamflow.
+        in_memory: (Optional) See open_dataset.
+
+    Returns:
+        Tuple of raw time as in raw_time_from_dataset, streamflow array,
+        and river indices used.
+    """
+
+    with open_dataset(nc_file, in_memory) as nc:
+        date = raw_time_from_dataset(nc)
+        indices = _step_indices(nc, river_ids, indices, id_cache_dir)
+        q = read_flows(nc.variables['streamflow'], indices, dtype)
+    return date, q, indices
+
+
+def _read_cube_step_in_worker(nc_file):
+    date, q, indices = _read_cube_step(nc_file, **_cube_worker_args)
+    return date, q
+
+
+def _read_cube_steps_in_pool(out_q, out_t, nc_files, river_ids, indices,
+                             id_cache_dir, dtype, workers, use_threads,
+                             in_memory):
+    """Reads all but the first file of a cube in a worker pool.
+
+    Each file's streamflow is written to its row of out_q and its raw
+    time appended to out_t in file order.
+    """
+
+    num_workers = min(workers, len(nc_files) - 1)
+    if use_threads:
+        pool = ThreadPool(num_workers)
+        read_step = functools.partial(_read_cube_step, river_ids=river_ids,
+                                      indices=indices,
+                                      id_cache_dir=id_cache_dir, dtype=dtype,
+                                      in_memory=in_memory)
+    else:
+        # Worker processes receive the ids and indices once, not per file
+        pool = multiprocessing.Pool(
+            num_workers, _init_cube_worker,
+            (river_ids, indices, id_cache_dir, dtype, in_memory))
+        read_step = _read_cube_step_in_worker
+    try:
+        steps = pool.imap(read_step, nc_files[1:])
+        for i, step in enumerate(steps, 1):
+            out_t.append(step[0])
+            out_q[i] = step[1]
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _all_river_ids(nc_file, in_memory=True):
+    with open_dataset(nc_file, in_memory) as nc:
+        schema = get_schema(nc)
+        return nc.variables[schema['id_var']][:]
+
+
+def _iter_steps(nc_files, river_ids, consistent_id_order, id_cache_dir,
+                dtype, chunk_size, raw_times=False, in_memory=True):
+    read_time = raw_time_from_dataset if raw_times else time_from_dataset
+    indices = None
+    for nc_file in nc_files:
+        with open_dataset(nc_file, in_memory) as nc:
+            date = read_time(nc)
+            if not consistent_id_order:
+                indices = None
+            indices = _step_indices(nc, river_ids, indices, id_cache_dir)
+            var = nc.variables['streamflow']
+            if chunk_size is None:
+                yield date, read_flows(var, indices, dtype)
+                continue
+            for start in range(0, len(indices), chunk_size):
+                chunk = slice(start, start + chunk_size)
+                yield date, chunk, read_flows(var, indices[chunk], dtype)
+
+
+def _prefetch(iterator, count=1):
+    """Runs an iterator in a background thread, up to count items ahead.
+
+    Exceptions raised by the iterator are raised again in the caller.
+    If the caller stops early, the background iterator is closed.
+    """
+
+    items = Queue.Queue(count)
+    stop = threading.Event()
+    done = object()
+
+    def put(entry):
+        """Queues an entry unless the caller has stopped reading."""
+
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    iterator.close()
+                    return
+            put((done, None))
+        except Exception:
+            put((done, sys.exc_info()))  # Raised in the caller
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error:
+                raise error[0], error[1], error[2]  # Keep the traceback
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_streamflow(nc_files, river_ids=None, consistent_id_order=True,
+                    id_cache_dir=None, dtype='f8', chunk_size=None,
+                    prefetch=False, in_memory=True):
+    """Reads streamflow from several NWM files one time step at a time.
+
+    This is a generator version of build_streamflow_cube. It yields the
+    streamflow in each file as the file is read, so memory use stays
+    near one time step no matter how many files are read. Use it for
+    running statistics, threshold checks, or database inserts.
+
+    Args:
+        nc_files: List of netCDF filenames.
+        river_ids: (Optional) List or numpy array of integer identifiers
+            for the rivers whose streamflow value is to be returned. If
+            None, all rivers are used in the same order as the first file
+            provided.
+        consistent_id_order: (Optional) True if the order of Ids in all
+            files is the same; False otherwise. If True, river indices
+            found in the first file are reused for all files.
+        id_cache_dir: (Optional) Folder for saving identifier sort
+            orders so they can be reused across processes. See
+            get_id_index.
+        dtype: (Optional) Numpy dtype of the streamflow arrays. See
+            build_streamflow_cube.
+        chunk_size: (Optional) Number of rivers to read at a time. If
+            given, each file is read in chunks of rivers.
+        prefetch: (Optional) True to read the next file in a background
+            thread while the current one is being processed.
+        in_memory: (Optional) True to decompress gzipped files into
+            memory; False to decompress them to a temporary file, which
+            keeps memory use bounded. See open_dataset.
+
+    Yields:
+        Tuple of (date, streamflow array) for each file in order, with
+        streamflow in the same order as river_ids. If chunk_size is
+        given, yields (date, river slice, streamflow array) for each
+        chunk instead, where the slice gives the positions in river_ids
+        of the rivers in the chunk.
+
+    Example:
+        >>> peak = None
+        >>> for date, q in nwm_data.iter_streamflow(files, comids):
+        ...     peak = q if peak is None else np.maximum(peak, q)
+    """
+
+    if not len(nc_files):
+        return
+    if river_ids is None or not len(river_ids):
+        river_ids = _all_river_ids(nc_files[0], in_memory)
+    steps = _iter_steps(nc_files, river_ids, consistent_id_order,
+                        id_cache_dir, _check_cube_dtype(dtype), chunk_size,
+                        in_memory=in_memory)
+    if prefetch:
+        steps = _prefetch(steps)
+    for step in steps:
+        yield step
+
+
+def build_streamflow_cube(nc_files, river_ids=None, consistent_id_order=True,
+                          id_cache_dir=None, workers=None, use_threads=False,
+                          dtype='f8', out_filename=None, as_datetime64=False,
+                          in_memory=True):
     """Reads streamflow from several NWM files into a single array.
 
     Reads streamflow from several files into a single array. Each file
@@ -110,14 +1018,42 @@ def build_streamflow_cube(nc_files, river_ids=None, consistent_id_order=True):
             provided.
         consistent_id_order: (Optional) True if the order of Ids in all
             files is the same; False otherwise. If True, this speeds up
-            processing a bit.
+            processing a bit. If False, files sharing the same Id
+            order still reuse a cached identifier index.
+        id_cache_dir: (Optional) Folder for saving identifier sort
+            orders so they can be reused across processes. See
+            get_id_index.
+        workers: (Optional) Number of files to read at the same time.
+            If None or 1, files are read one after another.
+        use_threads: (Optional) True to read files in a thread pool
+            instead of a process pool. Only use threads if your netCDF
+            and HDF5 libraries are built to be thread-safe.
+        dtype: (Optional) Numpy dtype of the streamflow array. Use
+            'f4' to halve memory use, or 'i4' for streamflow packed
+            as in the model files, in hundredths of cubic meters per
+            second with a fill value of -999900. Packed files are read
+            without netCDF4 masking and scaling, so 'i4' copies the
+            stored values directly.
+        out_filename: (Optional) File in which to store the streamflow
+            array as a numpy.memmap instead of in memory. Each time step
+            is written to the file as it is read, so memory use stays
+            near one time step even for all 2.7 million rivers.
+        as_datetime64: (Optional) True to return times as a numpy
+            datetime64[s] array of naive UTC times instead of a list of
+            datetime objects.
+        in_memory: (Optional) True to decompress gzipped files into
+            memory; False to decompress them to a temporary file, which
+            keeps memory use bounded. See open_dataset.
 
     Returns:
         Tuple consisting of:
-            streamflow array (float)
+            streamflow array (float by default)
             time array (date)
         The streamflow array is sized by (number of time steps, number
-        of rivers) and the time array is sized by (number of files). 
+        of rivers) and the time array is sized by (number of files).
+        Times are read from all files first and converted together, see
+        raw_times_to_datetime64.
+        The streamflow array is a numpy.memmap if out_filename is given.
 
     Example:
         >>> file_pattern = 'nwm.t00z.short_range.channel_rt.f00{0}.conus.nc.gz'
@@ -128,32 +1064,39 @@ def build_streamflow_cube(nc_files, river_ids=None, consistent_id_order=True):
 
     if not len(nc_files):
         return
-    if river_ids is not None and len(river_ids) > 0:
-        num_rivers = len(river_ids)
-    else:
-        nc_file = nc_files[0]
-        with Dataset(nc_files[0], 'r') as nc:
-            num_rivers = len(nc.variables['streamflow'])
-            schema = get_schema(nc)
-            river_ids = nc.variables[schema['id_var']][:]
+    if river_ids is None or not len(river_ids):
+        river_ids = _all_river_ids(nc_files[0], in_memory)
+    num_rivers = len(river_ids)
 
-    indices = None
-    #out_q = np.zeros((len(nc_files), num_rivers))
-    out_q = np.empty((len(nc_files), num_rivers))
+    dtype = _check_cube_dtype(dtype)
+    shape = (len(nc_files), num_rivers)
+    if out_filename:
+        out_q = np.memmap(out_filename, dtype=dtype, mode='w+', shape=shape)
+    else:
+        out_q = np.empty(shape, dtype=dtype)
     out_t = []
 
-    fill_value = constants.SCHEMAv1_1['fill_val_float']
-    for i, nc_file in enumerate(nc_files):
-        with Dataset(nc_file, 'r') as nc:
-            schema = get_schema(nc)
-            out_t.append(time_from_dataset(nc))
-            if indices is None or not consistent_id_order:
-                nc_ids = nc.variables[schema['id_var']][:]
-                indices = get_id_indices(river_ids, nc_ids)
-            q = nc.variables['streamflow'][indices]
-            if isinstance(q, np.ma.MaskedArray):
-                q = q.filled()  # Turns masked values into fill values
-            # Assume values <= fill_value are fills
-            q[q <= fill_value] = fill_value
+    if workers is None or workers <= 1 or len(nc_files) < 3:
+        steps = _iter_steps(nc_files, river_ids, consistent_id_order,
+                            id_cache_dir, dtype, None, raw_times=True,
+                            in_memory=in_memory)
+        for i, (date, q) in enumerate(steps):
             out_q[i] = q
+            out_t.append(date)
+    else:
+        # The first file finds the indices that consistent files share
+        date, out_q[0], indices = _read_cube_step(
+            nc_files[0], river_ids, id_cache_dir=id_cache_dir, dtype=dtype,
+            in_memory=in_memory)
+        out_t.append(date)
+        if not consistent_id_order:
+            indices = None
+        _read_cube_steps_in_pool(out_q, out_t, nc_files, river_ids, indices,
+                                 id_cache_dir, dtype, workers, use_threads,
+                                 in_memory)
+    if out_filename:
+        out_q.flush()
+    out_t = raw_times_to_datetime64(out_t)
+    if not as_datetime64:
+        out_t = _datetime64_to_utc(out_t)
     return out_q, out_t
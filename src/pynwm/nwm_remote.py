@@ -0,0 +1,269 @@
+#!/usr/bin/python2
+"""Reads streamflow from remote National Water Model files.
+
+Only the parts of a remote file needed for the requested rivers are
+downloaded, using HTTP range requests. Reading requires h5py, since
+model files since version 1.1 are netCDF4 files stored in HDF5 format.
+"""
+
+import collections
+import urllib2
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from pynwm import catalog
+from pynwm.connection_pool import get_default_pool, raise_for_status
+from pynwm.nwm_data import (get_id_indices, get_schema, read_flows,
+                             time_from_dataset)
+
+# Bytes fetched at a time. HDF5 metadata is read in many small pieces,
+# so each request fetches at least one block around the bytes needed.
+_BLOCK_SIZE = 128 * 1024
+
+# Most blocks kept in memory per file
+_MAX_BLOCKS = 512
+
+
+def _total_size(url, response):
+    """Gets the file size from the Content-Range header of a response."""
+
+    content_range = response.getheader('content-range', '')
+    total = content_range.rsplit('/', 1)[-1]
+    if not total.isdigit():
+        m = 'Range response without file size: {0!r}'.format(content_range)
+        raise urllib2.HTTPError(url, response.status, m, response.msg, None)
+    return int(total)
+
+
+class RangeFile(object):
+    """Read-only file object that fetches data with HTTP range requests.
+
+    Data is fetched in blocks, and recently read blocks are kept in
+    memory. A read spanning several missing blocks fetches them in one
+    request.
+
+    Attributes:
+        url: URL of the file.
+        size: File size in bytes.
+        bytes_fetched: Bytes downloaded so far.
+        requests: Number of range requests sent so far.
+    """
+
+    def __init__(self, url, block_size=_BLOCK_SIZE, max_blocks=_MAX_BLOCKS,
+                 pool=None):
+        self.url = url
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.size = None
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._pool = pool or get_default_pool()
+        self._blocks = collections.OrderedDict()
+        self._pos = 0
+        self._fetch(0, 0)
+
+    def _fetch(self, first, last):
+        """Fetches blocks first through last in one request."""
+
+        start = first * self.block_size
+        stop = (last + 1) * self.block_size
+        if self.size is not None:
+            stop = min(stop, self.size)
+        headers = {'Range': 'bytes={0}-{1}'.format(start, stop - 1)}
+        with self._pool.open(self.url, headers) as response:
+            # Checked before reading, so a server ignoring Range does
+            # not send the whole file. The unread response closes the
+            # connection instead of returning it to the pool.
+            raise_for_status(self.url, response, (206,))
+            if self.size is None:
+                self.size = _total_size(self.url, response)
+            data = response.read()
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        for block in range(first, last + 1):
+            offset = (block - first) * self.block_size
+            self._blocks[block] = data[offset:offset + self.block_size]
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+    def _get_block(self, block):
+        data = self._blocks.pop(block)
+        self._blocks[block] = data  # Mark as recently used
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._pos
+        stop = min(self._pos + size, self.size)
+        if stop <= self._pos:
+            return b''
+        first = self._pos // self.block_size
+        last = (stop - 1) // self.block_size
+        block = first
+        while block <= last:  # Fetch runs of missing blocks
+            if block in self._blocks:
+                block += 1
+                continue
+            run_end = block
+            while run_end < last and run_end + 1 not in self._blocks:
+                run_end += 1
+            self._fetch(block, run_end)
+            block = run_end + 1
+        data = b''.join(self._get_block(b) for b in range(first, last + 1))
+        offset = self._pos - first * self.block_size
+        data = data[offset:offset + stop - self._pos]
+        self._pos = stop
+        return data
+
+    def readinto(self, buf):
+        data = self.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self.size
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self._blocks.clear()
+
+
+class _H5Variable(object):
+    """Gives an h5py dataset the parts of the netCDF4 variable interface
+    used by nwm_data for reading.
+    """
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+        self.dtype = dataset.dtype
+        self.shape = dataset.shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        return self._dataset[key]
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name not in self._dataset.attrs:
+            raise AttributeError(name)
+        return self.getncattr(name)
+
+    def chunking(self):
+        chunks = self._dataset.chunks
+        return list(chunks) if chunks else 'contiguous'
+
+    def ncattrs(self):
+        return list(self._dataset.attrs)
+
+    def getncattr(self, name):
+        value = self._dataset.attrs[name]
+        if isinstance(value, np.ndarray) and value.size == 1:
+            value = value[0]
+        return value
+
+    def set_auto_maskandscale(self, value):
+        pass  # h5py never masks or scales
+
+
+class _H5Dataset(object):
+    """Gives an open h5py file the parts of the netCDF4 Dataset interface
+    used by nwm_data.get_schema and nwm_data.time_from_dataset.
+    """
+
+    def __init__(self, h5):
+        self._h5 = h5
+        self.variables = dict((name, _H5Variable(h5[name])) for name in h5
+                              if isinstance(h5[name], h5py.Dataset))
+        # netCDF4 stores each dimension as a dataset of the same name
+        self.dimensions = list(self.variables)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._h5.attrs:
+            raise AttributeError(name)
+        return self.getncattr(name)
+
+    def ncattrs(self):
+        return list(self._h5.attrs)
+
+    def getncattr(self, name):
+        value = self._h5.attrs[name]
+        if isinstance(value, np.ndarray) and value.size == 1:
+            value = value[0]
+        return value
+
+
+def read_streamflow(url, river_ids, id_cache_dir=None, all_ids=None,
+                    pool=None, block_size=_BLOCK_SIZE):
+    """Reads streamflow for a set of rivers from a remote file.
+
+    Works like nwm_data.read_streamflow, but only downloads the file's
+    metadata, its identifiers, and the streamflow chunks holding the
+    requested rivers. The file must be an uncompressed (not gzipped)
+    netCDF4 file on a server that supports range requests.
+
+    Args:
+        url: URL of the netCDF file of model results, e.g., a link from
+            noaa_list.list_sims.
+        river_ids: List or numpy array of integer identifiers for the
+            rivers whose streamflow value is to be returned.
+        id_cache_dir: (Optional) Folder for saving identifier sort
+            orders. See nwm_data.get_id_index.
+        all_ids: (Optional) Identifiers of every river in the file, in
+            file order, e.g., from an earlier file of the same model
+            version. Skips downloading the file's identifiers.
+        pool: (Optional) ConnectionPool to send requests through.
+        block_size: (Optional) Bytes fetched at a time.
+
+    Returns:
+        A dictionary with a masked 'flows' array of streamflow values in
+        cubic meters per second in the same order as the input river
+        identifiers along with 'datetime' providing the date associated
+        with the streamflow values.
+
+    Raises:
+        ImportError: h5py is not installed.
+        HTTPError: The server does not support range requests or
+            returned an error status.
+        ValueError: all_ids does not match the number of rivers in the
+            file.
+
+    Example:
+        >>> sims = noaa_latest.find_latest_simulation('short_range')
+        >>> sim = sims.values()[0]
+        >>> result = nwm_remote.read_streamflow(sim['links'][0], [5671187])
+    """
+
+    if h5py is None:
+        raise ImportError('h5py is required to read remote files.')
+    remote_file = RangeFile(url, block_size, pool=pool)
+    try:
+        with h5py.File(remote_file, 'r') as h5:
+            nc = _H5Dataset(h5)
+            q_var = nc.variables['streamflow']
+            if all_ids is None:
+                all_ids = nc.variables[get_schema(nc)['id_var']][:]
+            elif len(all_ids) != len(q_var):
+                m = 'all_ids has {0} rivers but {1} has {2}.'
+                raise ValueError(m.format(len(all_ids), url, len(q_var)))
+            indices = get_id_indices(river_ids, all_ids, id_cache_dir)
+            q = read_flows(q_var, indices, np.dtype('f8'))
+            date = time_from_dataset(nc)
+    finally:
+        remote_file.close()
+    fill_value = catalog.CATALOG.schema('1.1')['fill_val_float']
+    flows = np.ma.masked_equal(q, fill_value)
+    flows.fill_value = fill_value
+    return {'flows': flows, 'datetime': date}
@@ -3,16 +3,18 @@
 
 import os
 
-from netCDF4 import Dataset, date2num
+from netCDF4 import Dataset
 import numpy as np
 import pytz
 
+from pynwm import catalog
 import pynwm.constants as constants
 import pynwm.nwm_data as nwm_data
 
 
 def subset_channel_file(in_nc_filename, out_nc_filename, river_ids,
-                        just_streamflow=False):
+                        just_streamflow=False, id_cache_dir=None,
+                        in_memory=True):
     """Extracts data from an input channel file to a new file.
 
     A National Water Model channel file contains data related to river
@@ -29,9 +31,15 @@ def subset_channel_file(in_nc_filename, out_nc_filename, river_ids,
         just_streamflow: (Optional) True if other hydrologic variables
             such as velocity and channel inflow should be excluded.
             False if all variables should be included.
+        id_cache_dir: (Optional) Folder for saving identifier sort
+            orders so they can be reused across processes. See
+            nwm_data.get_id_index.
+        in_memory: (Optional) True to decompress a gzipped input file
+            into memory; False to decompress it to a temporary file,
+            which keeps memory use bounded. See nwm_data.open_dataset.
     """
 
-    with Dataset(in_nc_filename, 'r') as in_nc:
+    with nwm_data.open_dataset(in_nc_filename, in_memory) as in_nc:
         schema = nwm_data.get_schema(in_nc)
         if just_streamflow:
             vars_to_include = ['streamflow', schema['id_var'],
@@ -41,7 +49,7 @@ def subset_channel_file(in_nc_filename, out_nc_filename, river_ids,
         nc_ids = in_nc.variables[schema['id_var']][:]
         if river_ids is None:
             river_ids = nc_ids[:]
-        index = nwm_data.get_id_indices(river_ids, nc_ids)
+        index = nwm_data.get_id_indices(river_ids, nc_ids, id_cache_dir)
         with Dataset(out_nc_filename, 'w', format=in_nc.data_model) as out_nc:
             out_nc.setncatts({k: in_nc.getncattr(k) for k in in_nc.ncattrs()})
 
@@ -60,7 +68,7 @@ def subset_channel_file(in_nc_filename, out_nc_filename, river_ids,
                     out_var.setncatts(attributes)
                     dims = var.dimensions
                     if len(dims) == 1 and dims[0] == schema['id_dim']:
-                        out_var[:] = var[index]
+                        out_var[:] = nwm_data.read_indices(var, index)
                     else:
                         out_var[:] = var[:]
 
@@ -103,8 +111,198 @@ def _dates_to_naive_utc(date_objects):
     return naive_dates
 
 
+# Values per streamflow chunk for the chunking presets, about 1 MB of int32
+_CHUNK_VALUES = 2 ** 18
+_CHUNKINGS = ['time_series', 'map']
+
+
+def _streamflow_chunksizes(chunking, num_times, num_rivers):
+    """Chooses the (time, river) chunk shape for combined streamflow.
+
+    Args:
+        chunking: None for netCDF default chunking, 'time_series' for
+            chunks holding every time step for a block of rivers,
+            'map' for chunks holding many rivers at one time step, or a
+            (time, river) tuple.
+        num_times: Number of time steps.
+        num_rivers: Number of rivers.
+
+    Returns:
+        Tuple of chunk lengths, or None for default chunking.
+    """
+
+    if chunking is None:
+        return None
+    if chunking == 'time_series':
+        rivers_per_chunk = max(1, _CHUNK_VALUES // max(num_times, 1))
+        return (max(num_times, 1), min(num_rivers, rivers_per_chunk))
+    if chunking == 'map':
+        return (1, min(num_rivers, _CHUNK_VALUES))
+    if isinstance(chunking, (tuple, list)) and len(chunking) == 2:
+        return (min(chunking[0], max(num_times, 1)),
+                min(chunking[1], num_rivers))
+    m = 'Invalid chunking: {0}. Use None, {1}, or a (time, river) tuple.'
+    raise ValueError(m.format(chunking, ', '.join(_CHUNKINGS)))
+
+
+def _dates_to_minutes(dates, time_units):
+    """Converts datetime objects or a datetime64 array to time values."""
+
+    if not isinstance(dates, np.ndarray):
+        dates = np.array(_dates_to_naive_utc(dates), dtype='datetime64[s]')
+    return nwm_data.datetime64_to_times(dates, time_units)
+
+
+def _check_append_ids(nc, river_ids):
+    """Returns the ids in an existing combined file after checking them.
+
+    Raises:
+        ValueError: The river identifiers are not the same set as the
+            identifiers already in the file.
+    """
+
+    schema = nwm_data.get_schema(nc)
+    existing_ids = nc.variables[schema['id_var']][:]
+    if river_ids is not None:
+        river_ids = np.asarray(river_ids)
+        if (len(river_ids) != len(existing_ids) or
+                not np.array_equal(np.sort(river_ids),
+                                   np.sort(existing_ids))):
+            m = 'River identifiers do not match those in {0}.'
+            raise ValueError(m.format(nc.filepath()))
+    return existing_ids
+
+
+def _source_key(nc_file):
+    """Identifies an input file by absolute path and modification time."""
+
+    return os.path.abspath(nc_file), os.path.getmtime(nc_file)
+
+
+def _combined_source_keys(nc):
+    """Lists the source keys of the files already in a combined file."""
+
+    if 'source_file' not in nc.variables:  # Made before sources were kept
+        return set()
+    paths = nc.variables['source_file'][:]
+    mtimes = nc.variables['source_mtime'][:]
+    return set(zip(paths.tolist(), mtimes.tolist()))
+
+
+def _new_time_step_files(nc, nc_files, in_memory=True):
+    """Finds files whose time steps are not yet in a combined file.
+
+    Files recorded as sources of the combined file, and not modified
+    since, are skipped without being opened. The others are opened to
+    read their time.
+
+    Returns:
+        List of files with new time steps, sorted by time. Of several
+        files with the same time, only the first is kept.
+
+    Raises:
+        ValueError: A new time step is earlier than the last time step
+            in the combined file, so appending it would put the times
+            out of order.
+    """
+
+    time_var = nc.variables['time']
+    times = time_var[:].tolist()
+    seen = set(times)
+    last = max(times) if times else None
+    known = _combined_source_keys(nc)
+    candidates = [f for f in nc_files if _source_key(f) not in known]
+    raw_times = []
+    for nc_file in candidates:
+        with nwm_data.open_dataset(nc_file, in_memory) as in_nc:
+            raw_times.append(nwm_data.raw_time_from_dataset(in_nc))
+    dates = nwm_data.raw_times_to_datetime64(raw_times)
+    new_files = []
+    for minutes, nc_file in zip(
+            _dates_to_minutes(dates, time_var.units).tolist(), candidates):
+        if minutes in seen:
+            continue
+        if last is not None and minutes < last:
+            m = ('{0} is earlier than the last time step in {1}. Time steps '
+                 'can only be appended after the last one.')
+            raise ValueError(m.format(nc_file, nc.filepath()))
+        seen.add(minutes)
+        new_files.append((minutes, nc_file))
+    return [nc_file for minutes, nc_file in sorted(new_files)]
+
+
+def _create_combined_vars(nc, river_ids, num_times, zlib, complevel,
+                          shuffle, chunking):
+    out_schema = catalog.CATALOG.schema('1.1')
+    id_dim = out_schema['id_dim']
+    num_rivers = len(river_ids)
+    nc.createDimension('time', None)  # Unlimited so files can be appended
+    nc.createDimension(id_dim, num_rivers)
+
+    time_var = nc.createVariable('time', 'i', ('time',))
+    for name_value in out_schema['time_attrs']:
+        time_var.setncattr(name_value[0], name_value[1])
+    time_var.units = 'minutes since {0}'.format(constants.SINCE_DATE)
+
+    id_var = nc.createVariable(out_schema['id_var'], 'i', (id_dim,),
+                               zlib=zlib, complevel=complevel,
+                               shuffle=shuffle)
+    for name_value in out_schema['id_attrs']:
+        id_var.setncattr(name_value[0], name_value[1])
+    id_var[:] = river_ids
+
+    chunksizes = _streamflow_chunksizes(chunking, num_times, num_rivers)
+    q_var = nc.createVariable('streamflow', out_schema['flow_dtype'],
+                              ('time', id_dim),
+                              fill_value=out_schema['fill_val_int'],
+                              zlib=zlib, complevel=complevel,
+                              shuffle=shuffle, chunksizes=chunksizes)
+    for name_value in out_schema['flow_attrs']:
+        q_var.setncattr(name_value[0], name_value[1])
+
+    # Lets appending skip input files that were already combined
+    source_var = nc.createVariable('source_file', str, ('time',))
+    source_var.long_name = 'Absolute path of the input file'
+    mtime_var = nc.createVariable('source_mtime', 'f8', ('time',))
+    mtime_var.long_name = 'Modification time of the input file'
+    mtime_var.units = 'seconds since {0}'.format(constants.SINCE_DATE)
+
+
+def _write_time_steps(nc, q, t, nc_files):
+    """Writes streamflow and times after the last time step in a file."""
+
+    time_var = nc.variables['time']
+    start = len(nc.dimensions['time'])
+    stop = start + len(t)
+    time_var[start:stop] = _dates_to_minutes(t, time_var.units)
+    nc.variables['streamflow'][start:stop] = q
+    if 'source_file' in nc.variables:
+        paths, mtimes = zip(*[_source_key(f) for f in nc_files])
+        nc.variables['source_file'][start:stop] = np.array(paths,
+                                                            dtype=object)
+        nc.variables['source_mtime'][start:stop] = mtimes
+
+
+def _stream_time_steps(nc, nc_files, river_ids, consistent_id_order,
+                       id_cache_dir, workers, in_memory):
+    """Writes each file's streamflow to nc as soon as it is read.
+
+    Only about one time step of streamflow is in memory at a time, so
+    files with every river in the domain can be combined without a cube
+    of all time steps.
+    """
+
+    steps = nwm_data.iter_streamflow(
+        nc_files, river_ids, consistent_id_order, id_cache_dir,
+        prefetch=workers is not None and workers > 1, in_memory=in_memory)
+    for nc_file, (date, q) in zip(nc_files, steps):
+        _write_time_steps(nc, q[np.newaxis], [date], [nc_file])
+
+
 def combine_files(nc_files, output_file, river_ids=None,
-                  consistent_id_order=True):
+                  consistent_id_order=True, id_cache_dir=None, workers=None,
+                  zlib=False, complevel=4, shuffle=True, chunking=None,
+                  append=False, in_memory=True):
     """Combines streamflow from several files into a single netCDF file.
 
     Each file from the National Water Model represents a single time
@@ -123,6 +321,41 @@ def combine_files(nc_files, output_file, river_ids=None,
         consistent_id_order: (Optional) True if the order of Ids in all
             files can be safely assumed to be the same; False otherwise.
             If True, this speeds up processing a bit.
+        id_cache_dir: (Optional) Folder for saving identifier sort
+            orders so they can be reused across processes. See
+            nwm_data.get_id_index.
+        workers: (Optional) Number of input files to read at the same
+            time in a process pool. If None or 1, files are read one
+            after another. Without river_ids, files are written one
+            time step at a time instead, and workers greater than 1
+            reads the next file in a background thread.
+        zlib: (Optional) True to compress streamflow and identifiers.
+        complevel: (Optional) Compression level from 1 to 9 when zlib
+            is True. Higher levels make smaller, slower files.
+        shuffle: (Optional) True to apply the HDF5 shuffle filter before
+            compression, which usually helps integer streamflow.
+        chunking: (Optional) Chunk shape of the streamflow variable.
+            'time_series' makes reading all time steps for one river
+            fast, 'map' makes reading all rivers at one time step fast,
+            and a (time, river) tuple sets the shape directly. If None,
+            netCDF default chunking is used.
+        append: (Optional) True to add time steps to output_file if it
+            already exists. Only files with times not already in the
+            output are read, and they are appended in time order. Input
+            files recorded in the output as already combined are not
+            opened again. The
+            river identifiers must match those in the output, which
+            also sets their order. Compression and chunking settings
+            are ignored when appending.
+        in_memory: (Optional) True to decompress gzipped input files
+            into memory; False to decompress each to a temporary file,
+            which keeps memory use bounded. See nwm_data.open_dataset.
+
+    Raises:
+        ValueError: Appending with river identifiers that do not match
+            the output file, to a file without an unlimited time
+            dimension, or a time step earlier than the last one in the
+            output file.
 
     Example:
         >>> file_pattern = 'nwm.t00z.short_range.channel_rt.f00{0}.conus.nc'
@@ -134,41 +367,43 @@ def combine_files(nc_files, output_file, river_ids=None,
     nc_files = get_files_exist(nc_files)
     if not nc_files:
         raise Exception('No files to combine')
-    if river_ids is None:
-        with Dataset(nc_files[0], 'r') as nc:
+    if river_ids is not None and len(river_ids) and type(river_ids[0]) is str:
+        river_ids = [int(x) for x in river_ids]
+    full_domain = river_ids is None
+
+    if append and os.path.isfile(output_file):
+        with Dataset(output_file, 'a') as nc:
+            if not nc.dimensions['time'].isunlimited():
+                m = 'Cannot append to {0} since its time dimension is fixed.'
+                raise ValueError(m.format(output_file))
+            river_ids = _check_append_ids(nc, river_ids)
+            nc_files = _new_time_step_files(nc, nc_files, in_memory)
+            if nc_files and full_domain:
+                _stream_time_steps(nc, nc_files, river_ids,
+                                   consistent_id_order, id_cache_dir, workers,
+                                   in_memory)
+            elif nc_files:
+                q, t = nwm_data.build_streamflow_cube(
+                    nc_files, river_ids, consistent_id_order, id_cache_dir,
+                    workers, as_datetime64=True, in_memory=in_memory)
+                _write_time_steps(nc, q, t, nc_files)
+        return
+
+    if full_domain:
+        with nwm_data.open_dataset(nc_files[0], in_memory) as nc:
             schema = nwm_data.get_schema(nc)
             river_ids = nc.variables[schema['id_var']][:]
-    elif len(river_ids) and type(river_ids[0]) is str:
-        river_ids = [int(x) for x in river_ids]
+        with Dataset(output_file, 'w') as nc:
+            _create_combined_vars(nc, river_ids, len(nc_files), zlib,
+                                  complevel, shuffle, chunking)
+            _stream_time_steps(nc, nc_files, river_ids, consistent_id_order,
+                               id_cache_dir, workers, in_memory)
+        return
 
     q, t = nwm_data.build_streamflow_cube(
-        nc_files, river_ids, consistent_id_order)
-    t = _dates_to_naive_utc(t)
-    num_rivers = len(q[0])
-
-    out_schema = constants.SCHEMAv1_1
-    id_dim = out_schema['id_dim']
-    id_var = out_schema['id_var']
-    q_type = out_schema['flow_dtype']
-    time_units = 'minutes since {0}'.format(constants.SINCE_DATE)
-    fill_value = out_schema['fill_val_int']
+        nc_files, river_ids, consistent_id_order, id_cache_dir, workers,
+        as_datetime64=True, in_memory=in_memory)
     with Dataset(output_file, 'w') as nc:
-        nc.createDimension('time', len(nc_files))
-        nc.createDimension(id_dim, num_rivers)
-
-        time_var = nc.createVariable('time', 'i', ('time',))
-        for name_value in out_schema['time_attrs']:
-            time_var.setncattr(name_value[0], name_value[1])
-        time_var.units = time_units
-        time_var[:] = [round(d) for d in date2num(t, time_units)]
-
-        id_var = nc.createVariable(id_var, 'i', (id_dim,))
-        for name_value in out_schema['id_attrs']:
-            id_var.setncattr(name_value[0], name_value[1])
-        id_var[:] = river_ids
-
-        q_var = nc.createVariable('streamflow', q_type, ('time', id_dim),
-                                  fill_value=fill_value)
-        for name_value in out_schema['flow_attrs']:
-            q_var.setncattr(name_value[0], name_value[1])
-        q_var[:] = q
+        _create_combined_vars(nc, river_ids, len(t), zlib, complevel,
+                              shuffle, chunking)
+        _write_time_steps(nc, q, t, nc_files)
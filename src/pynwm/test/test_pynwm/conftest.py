@@ -0,0 +1,15 @@
+import pytest
+
+from pynwm import listing_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_listing_cache(monkeypatch):
+    '''Gives each test an empty listing cache.
+
+    Otherwise listings cached by one test, or by an earlier pass within
+    a test, are served in place of requests to the test server.
+    '''
+
+    monkeypatch.setattr(listing_cache, '_listing_cache',
+                        listing_cache.ListingCache())
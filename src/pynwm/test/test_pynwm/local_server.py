@@ -0,0 +1,116 @@
+"""Local HTTP server standing in for remote services in tests."""
+
+import BaseHTTPServer
+import re
+import socket
+import SocketServer
+import threading
+
+
+class _ThreadedHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections alive
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.owner.lock:
+            self.server.owner.connections += 1
+            self.server.owner._sockets.add(self.connection)
+
+    def finish(self):
+        with self.server.owner.lock:
+            self.server.owner._sockets.discard(self.connection)
+        BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        owner = self.server.owner
+        with owner.lock:
+            owner.requests.append((self.path, dict(self.headers)))
+        route = owner.routes.get(self.path.split('?')[0])
+        if route is not None:
+            status, headers, body = route(self)
+            self._respond(status, headers, body)
+            return
+        body = owner.files.get(self.path)
+        if body is None:
+            self._respond(404, {}, 'Not Found')
+            return
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('range', ''))
+        if not match:
+            self._respond(200, {}, body)
+            return
+        start = int(match.group(1))
+        stop = int(match.group(2)) + 1 if match.group(2) else len(body)
+        if start >= len(body):
+            headers = {'Content-Range': 'bytes */{0}'.format(len(body))}
+            self._respond(416, headers, '')
+            return
+        stop = min(stop, len(body))
+        content_range = 'bytes {0}-{1}/{2}'.format(start, stop - 1, len(body))
+        self._respond(206, {'Content-Range': content_range}, body[start:stop])
+
+    def _respond(self, status, headers, body):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LocalServer(object):
+    """Serves in-memory files and custom routes on localhost.
+
+    Files are served with HTTP/1.1 keep-alive and byte range support.
+    Routes map a path to a function taking the request handler and
+    returning a (status, headers, body) tuple.
+
+    Attributes:
+        files: Dictionary of path to file content.
+        routes: Dictionary of path (without query) to route function.
+        requests: List of (path, headers) for each request received.
+        connections: Number of client connections accepted.
+    """
+
+    def __init__(self, files=None, routes=None):
+        self.files = files or {}
+        self.routes = routes or {}
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._sockets = set()
+        self._server = _ThreadedHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.owner = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,))
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def drop_connections(self):
+        """Closes open client connections, as servers do when idle."""
+
+        with self.lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def url(self, path=''):
+        return 'http://127.0.0.1:{0}{1}'.format(self._server.server_port,
+                                                 path)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from pynwm import catalog
+import pynwm.constants as constants
+
+
+def test_version_from_date():
+    '''The model version should follow the simulation date.'''
+
+    assert '1.0' == catalog.get_product('short_range', '20170401t06-00').version
+    assert '1.1' == catalog.get_product('short_range', '20170508t12-00').version
+    assert '1.1' == catalog.get_product('short_range', '20190619t11-00').version
+    assert '2.0' == catalog.get_product('short_range', '20190619t12-00').version
+    assert '2.0' == catalog.get_product('short_range').version
+
+
+def test_matches_constants():
+    '''Catalog entries should match the product descriptions.'''
+
+    for version, products in [('1.0', constants.PRODUCTSv1_0),
+                              ('1.1', constants.PRODUCTSv1_1),
+                              ('2.0', constants.PRODUCTSv2_0)]:
+        assert sorted(products) == catalog.CATALOG.products(version)
+        for product, desc in products.iteritems():
+            info = catalog.get_product(product, version=version)
+            assert desc['steps'] == info.steps == len(info.forecast_hours)
+            assert desc['step_hrs'] == info.step_hrs
+            assert desc['channel'] == info.channel
+
+
+def test_offsets():
+    '''Offset arrays should be precomputed in seconds.'''
+
+    info = catalog.get_product('analysis_assim', version='1.1')
+    assert [-2, -1, 0] == info.forecast_hours.tolist()
+    hour = np.timedelta64(3600, 's')
+    assert [-2 * hour, -hour, 0 * hour] == info.valid_offsets.tolist()
+    assert [3 * hour, 4 * hour] == info.series_offsets_for(2).tolist()
+    assert 10 * hour == info.series_offsets_for(8)[-1]
+    with pytest.raises(ValueError):
+        info.forecast_hours[0] = 5
+
+
+def test_unknown_product():
+    '''Products missing from a version should raise KeyError.'''
+
+    with pytest.raises(KeyError):
+        catalog.get_product('medium_range_mem2', version='1.1')
@@ -0,0 +1,15 @@
+import numpy as np
+
+from pynwm import catalog
+
+
+def test_valid_times():
+    '''Valid times should be offset from the simulation cycle time.'''
+
+    returned = catalog.valid_times('analysis_assim', '20170601t06-00')
+    expected = np.array(['2017-06-01T04', '2017-06-01T05', '2017-06-01T06'],
+                        dtype='datetime64[s]')
+    assert np.array_equal(expected, returned)
+    returned = catalog.valid_times('short_range', '20170601t23-00')
+    assert 18 == len(returned)
+    assert np.datetime64('2017-06-02T17:00:00') == returned[-1]
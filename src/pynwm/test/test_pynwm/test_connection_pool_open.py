@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from pynwm.connection_pool import ConnectionPool
+from pynwm.test.test_pynwm.local_server import LocalServer
+
+
+def _redirect_to(location):
+    return lambda handler: (302, {'Location': location}, '')
+
+
+def test_follows_redirect():
+    '''A redirect should be followed to the file.'''
+
+    server = LocalServer({'/file': 'data'},
+                         {'/old': _redirect_to('/file')}).start()
+    try:
+        status, headers, body = ConnectionPool().fetch(server.url('/old'))
+        assert (200, 'data') == (status, body)
+    finally:
+        server.stop()
+
+
+def test_redirect_loop():
+    '''A redirect loop should raise IOError without reusing connections.'''
+
+    server = LocalServer(routes={'/loop': _redirect_to('/loop')}).start()
+    pool = ConnectionPool()
+    try:
+        with pytest.raises(IOError):
+            with pool.open(server.url('/loop')):
+                pass
+        idle = [conn for conns in pool._idle.values() for conn in conns]
+        assert len(idle) == len(set(id(conn) for conn in idle))
+    finally:
+        pool.close()
+        server.stop()
+
+
+def test_idle_connections_dropped():
+    '''A request should succeed after the server drops idle connections.'''
+
+    server = LocalServer({'/file': 'data'}).start()
+    pool = ConnectionPool()
+    try:
+        with pool.open(server.url('/file')) as first:
+            with pool.open(server.url('/file')) as second:
+                with pool.open(server.url('/file')) as third:
+                    with pool.open(server.url('/file')) as fourth:
+                        for response in [first, second, third, fourth]:
+                            response.read()
+        assert 4 == len(pool._idle.values()[0])
+        server.drop_connections()
+        time.sleep(0.1)  # Let the server finish closing them
+        status, headers, body = pool.fetch(server.url('/file'))
+        assert (200, 'data') == (status, body)
+        assert 5 == server.connections
+    finally:
+        pool.close()
+        server.stop()
@@ -0,0 +1,31 @@
+from pynwm import filenames
+
+
+def test_forecast_hours():
+    '''Forecast hours should start at the offset and step to the end.'''
+
+    returned = filenames.expected_forecast_hours('short_range',
+                                                 '20170601t06-00')
+    assert range(1, 19) == returned
+    returned = filenames.expected_forecast_hours('long_range_mem1',
+                                                 '20170601t06-00')
+    assert range(6, 721, 6) == returned
+
+
+def test_analysis_hours():
+    '''Analysis hours should count back from the cycle hour.'''
+
+    returned = filenames.expected_forecast_hours('analysis_assim',
+                                                 '20170601t06-00')
+    assert [-2, -1, 0] == returned
+    returned = filenames.expected_forecast_hours('analysis_assim',
+                                                 '20170401t06-00')
+    assert [0] == returned
+
+
+def test_member_with_fewer_steps():
+    '''Medium range members 2 to 7 should end before the first member.'''
+
+    returned = filenames.expected_forecast_hours('medium_range_mem2',
+                                                 '20190701t06-00')
+    assert range(3, 205, 3) == returned
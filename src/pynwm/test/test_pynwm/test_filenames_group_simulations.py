@@ -60,13 +60,16 @@ def test_group_return_types():
     key, sim = sims.items()[0]
     assert str == type(key)
     assert dict == type(sim)
-    expected = ['date', 'files', 'is_complete', 'links', 'product']
+    expected = ['date', 'files', 'forecast_hours', 'is_complete', 'links',
+                'missing_steps', 'product']
     assert expected == sorted(list(sim.keys()))
     assert str == type(sim['product'])
     assert str == type(sim['date'])
     assert bool == type(sim['is_complete'])
     assert list == type(sim['files'])
     assert list == type(sim['links'])
+    assert list == type(sim['forecast_hours'])
+    assert list == type(sim['missing_steps'])
 
 
 def test_links_included():
@@ -87,3 +90,57 @@ def test_links_included():
     for i, filename in enumerate(sim['files']):
         expected = file_link_lookup[filename]
         assert expected == returned_links[i]
+
+
+def test_sorted_by_forecast_hour():
+    '''Files and links should be sorted by forecast hour.'''
+
+    files = ['nwm.t00z.short_range.channel_rt.f0{0:02d}.conus.nc'.format(h)
+             for h in [3, 1, 18, 2]]
+    links = ['3', '1', '18', '2']
+    sim = filenames.group_simulations(files, '20170601', links).values()[0]
+    assert [1, 2, 3, 18] == sim['forecast_hours']
+    assert [files[1], files[3], files[0], files[2]] == sim['files']
+    assert ['1', '2', '3', '18'] == sim['links']
+
+
+def test_missing_steps():
+    '''Expected forecast hours without a file should be listed.'''
+
+    files = ['nwm.t00z.short_range.channel_rt.f0{0:02d}.conus.nc'.format(h)
+             for h in range(1, 19) if h not in [4, 17]]
+    sim = filenames.group_simulations(files, '20170601').values()[0]
+    assert [4, 17] == sim['missing_steps']
+    assert not sim['is_complete']
+
+
+def test_duplicates_not_counted():
+    '''A repeated forecast hour should not make up for a missing one.'''
+
+    files = ['nwm.t00z.analysis_assim.channel_rt.tm00.conus.nc',
+             'nwm.t00z.analysis_assim.channel_rt.tm01.conus.nc',
+             'nwm.t00z.analysis_assim.channel_rt.tm01.conus.nc.gz']
+    sim = filenames.group_simulations(files, '20170601').values()[0]
+    assert files[1::-1] == sim['files']
+    assert [-2] == sim['missing_steps']
+    assert not sim['is_complete']
+
+
+def test_unparsed_names_skipped():
+    '''Names not following the model pattern should not break grouping.'''
+
+    files = _assim_files + ['readme.txt', 'nwm.t00z.usgsTimeSlice.txt']
+    sims = filenames.group_simulations(files, '20170601')
+    assert ['analysis_assim_20170601t00-00'] == list(sims)
+    assert 3 == len(sims['analysis_assim_20170601t00-00']['files'])
+
+
+def test_sub_hourly_files_kept():
+    '''Files for each minute of a sub-hourly forecast should be kept.'''
+
+    files = ['nwm.t00z.short_range.channel_rt.f{0:03d}{1:02d}.hawaii.nc'
+             .format(1 + i // 4, 15 * (i % 4)) for i in range(8)]
+    sim = filenames.group_simulations(files, '20200601').values()[0]
+    assert files == sim['files']
+    assert [1, 1, 1, 1, 2, 2, 2, 2] == sim['forecast_hours']
+    assert 3 == sim['missing_steps'][0]
@@ -0,0 +1,57 @@
+import pytest
+
+from pynwm import filenames
+
+_files = ['nwm.t00z.short_range.channel_rt.f008.conus.nc',
+          'nwm.t23z.analysis_assim.channel_rt.tm02.conus.nc',
+          'nwm.t06z.long_range.channel_rt_4.f720.conus.nc.gz',
+          'nwm.t12z.medium_range.channel_rt.f021.conus.nc',
+          'nwm.t18z.medium_range.channel_rt_7.f003.conus.nc',
+          ('short_range-nwm.20170601.t05z.short_range.channel_rt.f001.'
+           'conus.nc_georeferenced.nc')]
+
+
+def test_parts():
+    '''Should extract every part of the filename.'''
+
+    expected = filenames.NwmFilename(cycle_hour=6,
+                                     product='long_range_mem4',
+                                     member=4,
+                                     forecast_hour=720,
+                                     domain='conus')
+    assert expected == filenames.parse_filename(_files[2])
+
+
+def test_analysis_forecast_hour():
+    '''Hours before the cycle (tm##) should be negative.'''
+
+    assert -2 == filenames.parse_filename(_files[1]).forecast_hour
+
+
+def test_matches_single_part_functions():
+    '''Product and hour should match product_ and hour_from_filename.'''
+
+    for filename in _files:
+        parsed = filenames.parse_filename(filename)
+        product = filenames.product_from_filename(filename)
+        hour = filenames.hour_from_filename(filename)
+        assert product == parsed.product
+        assert hour == 't{0:02d}z'.format(parsed.cycle_hour)
+
+
+def test_sub_hourly_lead():
+    '''Five digit leads should give the hour and minute.'''
+
+    parsed = filenames.parse_filename(
+        'nwm.t00z.short_range.channel_rt.f00115.hawaii.nc')
+    assert (1, 15, 'hawaii') == (parsed.forecast_hour,
+                                 parsed.forecast_minute, parsed.domain)
+    parsed = filenames.parse_filename(_files[0])
+    assert (8, 0) == (parsed.forecast_hour, parsed.forecast_minute)
+
+
+def test_not_model_filename():
+    '''Filenames not following the model pattern should raise ValueError.'''
+
+    with pytest.raises(ValueError):
+        filenames.parse_filename('readme.txt')
@@ -0,0 +1,48 @@
+import pytest
+
+from pynwm import filenames
+
+_files = ['nwm.t00z.short_range.channel_rt.f008.conus.nc',
+          'nwm.t23z.analysis_assim.channel_rt.tm02.conus.nc',
+          'nwm.t06z.long_range.channel_rt_4.f720.conus.nc',
+          'nwm.t00z.short_range.channel_rt.f00245.hawaii.nc',
+          'nwm.t12z.medium_range.channel_rt_3.f006.conus.nc',
+          'nwm.t12z.long_range.land_2.f006.conus.nc']
+
+
+def test_columns():
+    '''Each part should be an array with one value per filename.'''
+
+    parsed = filenames.parse_filenames(_files)
+    assert [0, 23, 6, 0, 12, 12] == parsed.cycle_hour.tolist()
+    assert (['short_range', 'analysis_assim', 'long_range_mem4',
+             'short_range', 'medium_range_mem3', 'long_range'] ==
+            parsed.product.tolist())
+    assert [0, 0, 4, 0, 3, 2] == parsed.member.tolist()
+    assert [8, -2, 720, 2, 6, 6] == parsed.forecast_hour.tolist()
+    assert ['conus'] * 3 + ['hawaii'] + ['conus'] * 2 == parsed.domain.tolist()
+    assert [0, 0, 0, 45, 0, 0] == parsed.forecast_minute.tolist()
+
+
+def test_matches_parse_filename():
+    '''Rows should match parse_filename for each file.'''
+
+    parsed = filenames.parse_filenames(_files)
+    for i, filename in enumerate(_files):
+        row = filenames.NwmFilename(*[column[i].item() for column in parsed])
+        assert filenames.parse_filename(filename) == row
+
+
+def test_empty():
+    '''An empty listing should return empty arrays.'''
+
+    parsed = filenames.parse_filenames([])
+    assert all(0 == len(column) for column in parsed)
+
+
+def test_not_model_filename():
+    '''A filename not following the model pattern should raise ValueError.'''
+
+    with pytest.raises(ValueError) as error:
+        filenames.parse_filenames(_files[:2] + ['readme.txt'] + _files[2:])
+    assert 'readme.txt' in str(error.value)
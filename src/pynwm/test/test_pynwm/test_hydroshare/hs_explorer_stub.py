@@ -0,0 +1,62 @@
+"""Local stand-in for the HydroShare data explorer API."""
+
+import json
+import os
+import time
+import urlparse
+
+from pynwm.test.test_pynwm.local_server import LocalServer
+
+_responses_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                              '..', '..', 'data', 'json_responses')
+
+_template = '{0}-nwm.{1}.t{2:02d}z.{0}.channel_rt.{3}.conus.nc_georeferenced.nc'
+
+
+def short_range_files(date, hour=0, steps=18):
+    return [_template.format('short_range', date, hour, 'f{0:03d}'.format(s))
+            for s in range(1, steps + 1)]
+
+
+def analysis_files(date, hour=0, steps=3):
+    return [_template.format('analysis_assim', date, hour,
+                             'tm{0:02d}'.format(s)) for s in range(steps)]
+
+
+def read_response(name):
+    """Reads a saved HydroShare response from data/json_responses."""
+
+    with open(os.path.join(_responses_dir, name)) as f:
+        return f.read()
+
+
+def start_explorer(files, delays=None):
+    """Serves GetFileList and folder contents for a list of files.
+
+    Args:
+        files: Dictionary of config, e.g., 'short_range', to list of
+            filenames.
+        delays: (Optional) Dictionary of yyyymmdd date to seconds to
+            wait before answering GetFileList for that date.
+    """
+
+    def get_file_list(handler):
+        query = urlparse.parse_qs(urlparse.urlsplit(handler.path).query)
+        config = query['config'][0]
+        found = files.get(config, [])
+        if 'startDate' in query:
+            date = query['startDate'][0].replace('-', '')
+            time.sleep((delays or {}).get(date, 0))
+            found = [f for f in found if '.{0}.'.format(date) in f]
+        return 200, {}, json.dumps(found)
+
+    def get_folder_contents(handler):
+        query = urlparse.parse_qs(urlparse.urlsplit(handler.path).query)
+        config = query['selection_path'][0].split('/')[-1].split('?')[0]
+        dates = sorted(set(f.split('.')[1] for f in files.get(config, [])))
+        items = ['<li>{0}</li>'.format(d) for d in dates]
+        return 200, {}, '<ul>{0}</ul>'.format(''.join(items))
+
+    return LocalServer(routes={
+        '/api/GetFileList/': get_file_list,
+        '/files_explorer/get-folder-contents/': get_folder_contents}).start()
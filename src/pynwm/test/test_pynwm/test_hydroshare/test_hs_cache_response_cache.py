@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from pynwm.hydroshare.hs_cache import ResponseCache
+from pynwm.test.test_pynwm.test_hydroshare import hs_explorer_stub as stub
+
+_uri = 'https://hydroshare/get-netcdf-data?config={0}&COMID=5671187'
+_products = ['short_range', 'medium_range', 'long_range']
+_responses = dict((p, stub.read_response('get-netcdf-data_{0}.json'.format(p)))
+                  for p in _products)
+
+
+@pytest.fixture
+def cache_file(request):
+    folder = tempfile.mkdtemp()
+    request.addfinalizer(lambda: shutil.rmtree(folder))
+    return os.path.join(folder, 'responses.sqlite')
+
+
+def test_put_get(cache_file):
+    '''Stored responses should be returned by URI.'''
+
+    cache = ResponseCache(cache_file)
+    for product in _products:
+        cache.put(_uri.format(product), _responses[product])
+    for product in _products:
+        assert _responses[product] == cache.get(_uri.format(product))
+    assert None is cache.get(_uri.format('analysis_assim'))
+
+
+def test_saved_across_instances(cache_file):
+    '''Responses should be read back from the database file.'''
+
+    ResponseCache(cache_file).put(_uri.format('short_range'),
+                                  _responses['short_range'])
+    cached = ResponseCache(cache_file).get(_uri.format('short_range'))
+    assert _responses['short_range'] == cached
+
+
+def test_expired(cache_file):
+    '''Responses should not be returned after their time-to-live.'''
+
+    cache = ResponseCache(cache_file)
+    cache.put(_uri.format('short_range'), _responses['short_range'], ttl=0)
+    cache.put(_uri.format('medium_range'), _responses['medium_range'],
+              ttl=60)
+    assert None is cache.get(_uri.format('short_range'))
+    assert _responses['medium_range'] == cache.get(_uri.format('medium_range'))
+
+
+def test_least_recently_used_evicted(cache_file):
+    '''The least recently used responses should be evicted first.'''
+
+    max_bytes = len(_responses['short_range']) + len(_responses['long_range'])
+    cache = ResponseCache(cache_file, max_bytes)
+    cache.put(_uri.format('short_range'), _responses['short_range'])
+    time.sleep(0.01)
+    cache.put(_uri.format('medium_range'), _responses['medium_range'])
+    time.sleep(0.01)
+    cache.get(_uri.format('short_range'))
+    time.sleep(0.01)
+    cache.put(_uri.format('long_range'), _responses['long_range'])
+    assert None is cache.get(_uri.format('medium_range'))
+    assert _responses['short_range'] == cache.get(_uri.format('short_range'))
+    assert _responses['long_range'] == cache.get(_uri.format('long_range'))
+
+
+def test_clear(cache_file):
+    '''Cleared responses should no longer be returned.'''
+
+    cache = ResponseCache(cache_file)
+    cache.put(_uri.format('short_range'), _responses['short_range'])
+    cache.clear()
+    assert None is cache.get(_uri.format('short_range'))
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from pynwm import listing_cache
+from pynwm.hydroshare import hs_latest, hs_list
+from pynwm.test.test_pynwm.test_hydroshare import hs_explorer_stub as stub
+
+_dates = ['2017060{0}'.format(i) for i in range(1, 7)]
+_files = {'short_range': []}
+for _date in _dates[:-2]:
+    _files['short_range'] += stub.short_range_files(_date)
+for _date in _dates[-2:]:
+    _files['short_range'] += stub.short_range_files(_date, steps=4)
+
+
+@pytest.fixture
+def explorer(request, monkeypatch):
+    server = stub.start_explorer(_files)
+    request.addfinalizer(server.stop)
+    monkeypatch.setattr(hs_list, 'HS_DATA_EXPLORER_URI', server.url('/'))
+    return server
+
+
+def _requested_dates(server):
+    return set(path.split('startDate=')[1][:10].replace('-', '')
+               for path, headers in server.requests if 'startDate=' in path)
+
+
+def test_latest_complete(explorer):
+    '''Should return the newest complete simulation.'''
+
+    for prefetch in [0, 2]:
+        listing_cache.get_listing_cache().clear()  # List again each pass
+        sims = hs_latest.find_latest_simulation('short_range', prefetch)
+        assert ['short_range_20170604t00-00'] == list(sims)
+
+
+def test_prefetch_bounded(explorer):
+    '''Dates older than the result should be listed only to prefetch.'''
+
+    hs_latest.find_latest_simulation('short_range', prefetch=1)
+    # 20170604 is complete; 20170603 was listed ahead
+    assert set(_dates[2:]) == _requested_dates(explorer)
+
+
+def test_early_exit_does_not_wait(monkeypatch):
+    '''Finding a simulation should not wait for slow prefetched dates.'''
+
+    server = stub.start_explorer(_files, {'20170603': 3, '20170602': 3})
+    try:
+        monkeypatch.setattr(hs_list, 'HS_DATA_EXPLORER_URI', server.url('/'))
+        start = time.time()
+        sims = hs_latest.find_latest_simulation('short_range', prefetch=2)
+        assert ['short_range_20170604t00-00'] == list(sims)
+        assert time.time() - start < 2
+    finally:
+        server.stop()
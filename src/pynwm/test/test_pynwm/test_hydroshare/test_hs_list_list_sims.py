@@ -0,0 +1,42 @@
+import pytest
+
+from pynwm import listing_cache
+from pynwm.hydroshare import hs_list
+from pynwm.test.test_pynwm.test_hydroshare import hs_explorer_stub as stub
+
+_files = {'short_range': (stub.short_range_files('20170601') +
+                          stub.short_range_files('20170602', steps=5)),
+          'analysis_assim': (stub.analysis_files('20170601') +
+                             stub.analysis_files('20170602', 1))}
+
+
+@pytest.fixture
+def explorer(request, monkeypatch):
+    server = stub.start_explorer(_files)
+    request.addfinalizer(server.stop)
+    monkeypatch.setattr(hs_list, 'HS_DATA_EXPLORER_URI', server.url('/'))
+    return server
+
+
+def test_all_products_and_dates(explorer):
+    '''Should list simulations for every product and date.'''
+
+    expected = ['analysis_assim_20170601t00-00',
+                'analysis_assim_20170602t01-00',
+                'short_range_20170601t00-00',
+                'short_range_20170602t00-00']
+    for workers in [1, 4]:
+        listing_cache.get_listing_cache().clear()  # List again each pass
+        sims = hs_list.list_sims(workers=workers)
+        assert expected == list(sims)
+    assert sims['short_range_20170601t00-00']['is_complete']
+    assert not sims['short_range_20170602t00-00']['is_complete']
+    link = sims['analysis_assim_20170601t00-00']['links'][0]
+    assert link.startswith(explorer.url('/api/GetFile?file='))
+
+
+def test_one_date(explorer):
+    '''Should list only simulations on the given date.'''
+
+    sims = hs_list.list_sims('short_range', 20170602)
+    assert ['short_range_20170602t00-00'] == list(sims)
@@ -0,0 +1,150 @@
+import os
+import shutil
+import socket
+import tempfile
+import urlparse
+from urllib2 import HTTPError
+
+import pytest
+
+from pynwm.hydroshare import hs_retrieve
+from pynwm.hydroshare.hs_cache import ResponseCache
+from pynwm.test.test_pynwm.local_server import LocalServer
+from pynwm.test.test_pynwm.test_hydroshare import hs_explorer_stub as stub
+
+_short_range = stub.read_response('get-netcdf-data_short_range.json')
+_server_error = stub.read_response('get-netcdf-data_500_error.html')
+
+
+@pytest.fixture
+def hydroshare(request, monkeypatch):
+    failures = {}  # COMID -> Number of 500 errors to return first
+    statuses = {}  # COMID -> Other error statuses to return first
+
+    def get_netcdf_data(handler):
+        query = urlparse.parse_qs(urlparse.urlsplit(handler.path).query)
+        comid = query['COMID'][0]
+        if failures.get(comid):
+            failures[comid] -= 1
+            return 500, {}, _server_error
+        if statuses.get(comid):
+            return statuses[comid].pop(0), {}, 'Error'
+        body = _short_range.replace('5671187', comid)
+        return 200, {'Content-Type': 'application/json'}, body
+
+    server = LocalServer(routes={'/get-netcdf-data': get_netcdf_data})
+    server.failures = failures
+    server.statuses = statuses
+    server.start()
+    request.addfinalizer(server.stop)
+    monkeypatch.setattr(hs_retrieve, 'HS_API_URI', server.url('/'))
+    monkeypatch.setattr(hs_retrieve, '_BACKOFF_SECS', 0)
+    return server
+
+
+def test_single_id(hydroshare):
+    '''A single identifier should return its list of series.'''
+
+    series = hs_retrieve.get_forecasted_streamflow('short_range', 5671187,
+                                                   '20170601', '00')
+    assert 1 == len(series)
+    assert 107.1176 == series[0]['values'][0]
+
+
+def test_id_list_keyed_by_id(hydroshare):
+    '''A list of identifiers should return series keyed by identifier.'''
+
+    ids = [30 + i for i in range(20)]
+    for workers in [1, 4]:
+        results = hs_retrieve.get_forecasted_streamflow(
+            'short_range', ids, '20170601', '00', workers=workers)
+        assert ids == list(results)
+        for series in results.values():
+            assert 107.1176 == series[0]['values'][0]
+    assert 40 == len(hydroshare.requests)
+    assert hydroshare.connections <= 5
+
+
+def test_server_error_retried(hydroshare):
+    '''Internal Server Errors should be retried.'''
+
+    hydroshare.failures['30'] = hs_retrieve._RETRIES
+    results = hs_retrieve.get_forecasted_streamflow('short_range', [30, 31],
+                                                    '20170601', '00')
+    assert [30, 31] == list(results)
+    assert 2 + hs_retrieve._RETRIES == len(hydroshare.requests)
+
+
+def test_server_error_raised(hydroshare):
+    '''Internal Server Errors should be raised once retries run out.'''
+
+    hydroshare.failures['30'] = hs_retrieve._RETRIES + 1
+    with pytest.raises(HTTPError):
+        hs_retrieve.get_forecasted_streamflow('short_range', [30], '20170601',
+                                              '00')
+
+
+def test_response_cache(hydroshare, monkeypatch):
+    '''Cached responses should be used instead of new requests.'''
+
+    folder = tempfile.mkdtemp()
+    try:
+        cache = ResponseCache(os.path.join(folder, 'responses.sqlite'))
+        monkeypatch.setattr(hs_retrieve, '_response_cache', cache)
+        hydroshare.failures['31'] = hs_retrieve._RETRIES + 1
+        for _ in range(2):
+            hs_retrieve.get_forecasted_streamflow('short_range', 30,
+                                                  '20170601', '00')
+            with pytest.raises(HTTPError):
+                hs_retrieve.get_forecasted_streamflow('short_range', 31,
+                                                      '20170601', '00')
+            hydroshare.failures['31'] = hs_retrieve._RETRIES + 1
+        comids = [path.split('COMID=')[1].split('&')[0]
+                  for path, headers in hydroshare.requests]
+        assert 1 == comids.count('30')
+        assert 2 * (hs_retrieve._RETRIES + 1) == comids.count('31')
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_transient_errors_retried(hydroshare, monkeypatch):
+    '''Gateway errors and dropped connections should be retried.'''
+
+    hydroshare.statuses['30'] = [502, 503]
+    pool = hs_retrieve.get_default_pool()
+    pool_open = pool.open
+    dropped = []
+
+    def open_dropping(url, *args, **kwargs):
+        if not dropped:
+            dropped.append(url)
+            raise socket.error('Connection reset by peer')
+        return pool_open(url, *args, **kwargs)
+
+    monkeypatch.setattr(pool, 'open', open_dropping)
+    series = hs_retrieve.get_forecasted_streamflow('short_range', 30,
+                                                   '20170601', '00')
+    assert 107.1176 == series[0]['values'][0]
+    assert 1 == len(dropped)
+    assert 3 == len(hydroshare.requests)
+
+
+def test_failed_id_keeps_other_results(hydroshare):
+    '''One failed identifier should not discard the other results.'''
+
+    ids = [30, 31, 32, 33]
+    for workers in [1, 4]:
+        hydroshare.statuses['32'] = [404, 404]
+        errors = {}
+        results = hs_retrieve.get_forecasted_streamflow(
+            'short_range', ids, '20170601', '00', workers=workers,
+            errors=errors)
+        assert [30, 31, 33] == list(results)
+        assert [32] == list(errors)
+        assert 404 == errors[32].code
+
+        with pytest.raises(HTTPError) as error:
+            hs_retrieve.get_forecasted_streamflow(
+                'short_range', ids, '20170601', '00', workers=workers)
+        assert [30, 31, 33] == list(error.value.results)
+        assert [32] == list(error.value.errors)
@@ -2,6 +2,7 @@ from datetime import timedelta
 import json
 
 from dateutil import parser
+import numpy as np
 
 from pynwm.hydroshare import hs_retrieve
 
@@ -14,9 +15,9 @@ _long_rng_json_str = ('{"5671187": [[[1466528400], [7.1, 6.9], "t06z"],'
                       '[[1496815200], [1.1, 2.9], "t12z"]]}')
 
 
-def call_unpack(json_str, product):
+def call_unpack(json_str, product, as_numpy=False):
     json_data = json.loads(json_str)
-    return hs_retrieve._unpack_series(json_data, product)
+    return hs_retrieve._unpack_series(json_data, product, as_numpy)
 
 
 def test_dates_analysis_assim():
@@ -70,3 +71,20 @@ def test_vals_not_long_range():
     assert expected == len(returned)
     expected = [7.1, 6.9]
     assert expected == returned[0]['values']
+
+
+def test_numpy_matches_lists():
+    '''NumPy output should hold the same dates and values as lists.'''
+
+    for json_str, product in [(_json_str, 'analysis_assim'),
+                              (_json_str, 'medium_range'),
+                              (_long_rng_json_str, 'long_range')]:
+        as_lists = call_unpack(json_str, product)
+        as_arrays = call_unpack(json_str, product, as_numpy=True)
+        for series, arrays in zip(as_lists, as_arrays):
+            assert series['name'] == arrays['name']
+            expected = [d.replace(tzinfo=None) for d in series['dates']]
+            assert 'datetime64[s]' == arrays['dates'].dtype
+            assert expected == arrays['dates'].tolist()
+            assert np.float32 == arrays['values'].dtype
+            assert np.allclose(series['values'], arrays['values'])
@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+
+import pytest
+
+from pynwm.listing_cache import ListingCache
+from pynwm.test.test_pynwm.local_server import LocalServer
+
+_etag = '"v1"'
+
+
+def _listing_route(handler):
+    if handler.headers.get('if-none-match') == _etag:
+        return 304, {'ETag': _etag}, ''
+    return 200, {'ETag': _etag}, '<a href="nwm.20170601/">nwm.20170601/</a>'
+
+
+@pytest.fixture
+def server(request):
+    server = LocalServer(routes={'/list/': _listing_route}).start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+def test_cached_within_ttl(server):
+    '''A listing should be requested once while it has not expired.'''
+
+    cache = ListingCache()
+    url = server.url('/list/')
+    first = cache.get(url, ttl=60)
+    assert first == cache.get(url, ttl=60)
+    assert 1 == len(server.requests)
+
+
+def test_expired_listing_revalidated(server):
+    '''An expired listing should be revalidated with its ETag.'''
+
+    cache = ListingCache()
+    url = server.url('/list/')
+    first = cache.get(url, ttl=0)
+    assert first == cache.get(url, ttl=0)
+    assert 2 == len(server.requests)
+    assert _etag == server.requests[1][1].get('if-none-match')
+
+
+def test_listing_reloaded_from_cache_dir(server):
+    '''Listings kept forever should be reused by a new cache on disk.'''
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        url = server.url('/list/')
+        first = ListingCache(cache_dir).get(url, ttl=None)
+        assert first == ListingCache(cache_dir).get(url, ttl=None)
+        assert 1 == len(server.requests)
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_clear(server):
+    '''Cleared listings should be requested again.'''
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = ListingCache(cache_dir)
+        url = server.url('/list/')
+        cache.get(url, ttl=None)
+        cache.clear()
+        cache.get(url, ttl=None)
+        assert 2 == len(server.requests)
+        assert None is server.requests[1][1].get('if-none-match')
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_least_recently_used_evicted(server):
+    '''Only max_entries listings should be kept in memory.'''
+
+    cache = ListingCache(max_entries=2)
+    urls = [server.url('/list/') + '?page={0}'.format(i) for i in range(3)]
+    cache.get(urls[0])
+    cache.get(urls[1])
+    cache.get(urls[0])  # Now more recently used than urls[1]
+    cache.get(urls[2])
+    assert 3 == len(server.requests)
+    cache.get(urls[0])
+    assert 3 == len(server.requests)
+    cache.get(urls[1])
+    assert 4 == len(server.requests)
@@ -0,0 +1,25 @@
+import datetime
+
+from pynwm import listing_cache
+
+
+def test_old_date_cached_forever():
+    '''Folders for dates before yesterday should never expire.'''
+
+    assert None is listing_cache.ttl_for_date('20170601')
+    assert None is listing_cache.ttl_for_date(datetime.date(2017, 6, 1))
+
+
+def test_recent_date_expires():
+    '''Folders for today and yesterday should expire quickly.'''
+
+    today = datetime.datetime.utcnow().date()
+    yesterday = today - datetime.timedelta(days=1)
+    for date in [today, yesterday.strftime('%Y%m%d')]:
+        assert listing_cache.RECENT_TTL == listing_cache.ttl_for_date(date)
+
+
+def test_no_date_expires():
+    '''Listings not tied to a date should expire quickly.'''
+
+    assert listing_cache.RECENT_TTL == listing_cache.ttl_for_date(None)
@@ -0,0 +1,30 @@
+"""Local stand-in for the NOMADS folder listings."""
+
+from pynwm.noaa import noaa_list
+from pynwm.test.test_pynwm.local_server import LocalServer
+
+
+def listing(names):
+    """Formats names as the links of a NOMADS folder listing."""
+
+    links = ['<a href="{0}">{0}</a>'.format(name) for name in names]
+    return ('<pre><a href="../">Parent Directory</a>\n' +
+            '\n'.join(links) + '</pre>')
+
+
+def start_nomads(files, request, monkeypatch):
+    """Serves files and points noaa_list at the server until teardown.
+
+    Args:
+        files: Dictionary of path, e.g., '/nwm.20170601/', to body.
+        request: The pytest request of the calling fixture.
+        monkeypatch: The pytest monkeypatch of the calling fixture.
+
+    Returns:
+        The started LocalServer.
+    """
+
+    server = LocalServer(files).start()
+    request.addfinalizer(server.stop)
+    monkeypatch.setattr(noaa_list, '_URI_ROOT', server.url('/'))
+    return server
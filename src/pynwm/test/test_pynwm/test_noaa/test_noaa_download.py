@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import urllib2
+
+import pytest
+
+from pynwm.connection_pool import ConnectionPool
+from pynwm.noaa import noaa_download
+from pynwm.test.test_pynwm.local_server import LocalServer
+
+_files = {'/nwm.20170601/short_range/nwm.t00z.short_range.f{0:03d}.nc'
+          .format(i): os.urandom(3000 + i) for i in range(1, 19)}
+
+
+@pytest.fixture
+def server(request):
+    local_server = LocalServer(dict(_files)).start()
+    request.addfinalizer(local_server.stop)
+    return local_server
+
+
+@pytest.fixture
+def out_folder(request):
+    folder = tempfile.mkdtemp()
+    request.addfinalizer(lambda: shutil.rmtree(folder))
+    return folder
+
+
+def test_download_files(server, out_folder):
+    '''Should download every file over a few pooled connections.'''
+
+    paths = sorted(_files)
+    links = [server.url(path) for path in paths]
+    pool = ConnectionPool()
+    returned = noaa_download.download_files(links, out_folder, workers=3,
+                                            pool=pool)
+    assert len(paths) == len(returned)
+    for path, filename in zip(paths, returned):
+        assert os.path.basename(path) == os.path.basename(filename)
+        with open(filename, 'rb') as f:
+            assert _files[path] == f.read()
+    assert server.connections <= 3
+    assert [] == [f for f in os.listdir(out_folder) if f.endswith('.part')]
+    pool.close()
+
+
+def test_resume_partial_file(server, out_folder):
+    '''Should request only the missing bytes of a partial download.'''
+
+    path = sorted(_files)[0]
+    out_filename = os.path.join(out_folder, 'resumed.nc')
+    with open(out_filename + '.part', 'wb') as f:
+        f.write(_files[path][:1000])
+    reports = []
+    noaa_download.download_file(server.url(path), out_filename,
+                                progress=lambda *args: reports.append(args))
+    with open(out_filename, 'rb') as f:
+        assert _files[path] == f.read()
+    assert 'bytes=1000-' == server.requests[-1][1]['range']
+    assert (out_filename, len(_files[path]), len(_files[path])) == reports[-1]
+    assert not os.path.isfile(out_filename + '.part')
+
+
+def test_skip_existing(server, out_folder):
+    '''Should not download files that already exist unless overwriting.'''
+
+    path = sorted(_files)[0]
+    existing = os.path.join(out_folder, os.path.basename(path))
+    with open(existing, 'wb') as f:
+        f.write('old')
+    noaa_download.download_files([server.url(path)], out_folder)
+    assert [] == server.requests
+    noaa_download.download_files([server.url(path)], out_folder,
+                                 overwrite=True)
+    with open(existing, 'rb') as f:
+        assert _files[path] == f.read()
+
+
+def test_missing_file(server, out_folder):
+    '''Should raise HTTPError and leave no output file for a 404.'''
+
+    out_filename = os.path.join(out_folder, 'missing.nc')
+    with pytest.raises(urllib2.HTTPError):
+        noaa_download.download_file(server.url('/missing.nc'), out_filename)
+    assert not os.path.isfile(out_filename)
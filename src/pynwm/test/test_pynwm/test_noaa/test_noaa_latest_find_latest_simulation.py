@@ -0,0 +1,71 @@
+import pytest
+
+from pynwm.noaa import noaa_latest
+from pynwm.test.test_pynwm.test_noaa import nomads_stub as stub
+
+
+def _short_range(hour, steps=18):
+    template = 'nwm.t{0:02d}z.short_range.channel_rt.f{1:03d}.conus.nc'
+    return [template.format(hour, step) for step in range(1, steps + 1)]
+
+
+def _long_range(member, hour):
+    template = 'nwm.t{0:02d}z.long_range.channel_rt_{1}.f{2:03d}.conus.nc'
+    return [template.format(hour, member, step)
+            for step in range(6, 721, 6)]
+
+
+_dates = ['20170601', '20170602', '20170603']
+_files = {'/': stub.listing(['nwm.{0}/'.format(d) for d in _dates])}
+for _date in _dates:
+    _files['/nwm.{0}/'.format(_date)] = stub.listing(
+        ['short_range/'] +
+        ['long_range_mem{0}/'.format(m) for m in range(1, 5)])
+_files['/nwm.20170601/short_range/'] = stub.listing(_short_range(0))
+_files['/nwm.20170602/short_range/'] = stub.listing(
+    _short_range(0) + _short_range(1))
+_files['/nwm.20170603/short_range/'] = stub.listing(_short_range(0, 5))
+for _date in _dates[:2]:
+    for _member in range(1, 5):
+        _names = []
+        for _hour in [0, 6, 12, 18]:
+            _names += _long_range(_member, _hour)
+        _path = '/nwm.{0}/long_range_mem{1}/'.format(_date, _member)
+        _files[_path] = stub.listing(_names)
+for _member in range(1, 5):
+    _path = '/nwm.20170603/long_range_mem{0}/'.format(_member)
+    _files[_path] = stub.listing(_long_range(_member, 0))
+
+
+@pytest.fixture
+def nomads(request, monkeypatch):
+    server = stub.start_nomads(_files, request, monkeypatch)
+    return server
+
+
+def _requested_dates(server):
+    return set(d for d in _dates for path, headers in server.requests
+               if d in path)
+
+
+def test_stops_at_latest_complete(nomads):
+    '''Should return the newest complete simulation without older folders.'''
+
+    sims = noaa_latest.find_latest_simulation('short_range')
+    assert ['short_range_20170602t01-00'] == list(sims)
+    assert set(_dates[1:]) == _requested_dates(nomads)
+
+
+def test_long_range_needs_all_groups(nomads):
+    '''A long range date should need all 16 member/cycle groups complete.'''
+
+    sims = noaa_latest.find_latest_simulation('long_range')
+    assert 16 == len(sims)
+    assert all('_20170602t' in key for key in sims)
+    assert set(_dates[1:]) == _requested_dates(nomads)
+
+
+def test_no_complete_sims(nomads):
+    '''Should return an empty dictionary if nothing is complete.'''
+
+    assert {} == noaa_latest.find_latest_simulation('medium_range')
@@ -0,0 +1,36 @@
+import pytest
+
+from pynwm import listing_cache
+from pynwm.noaa import noaa_list
+from pynwm.test.test_pynwm.test_noaa import nomads_stub as stub
+
+
+_dates = ['2017060{0}'.format(i) for i in range(1, 8)]
+_files = {'/': stub.listing(['nwm.{0}/'.format(d) for d in _dates])}
+for _i, _date in enumerate(_dates):
+    _products = ['analysis_assim/', 'short_range/']
+    if _i % 2:
+        _products.append('long_range_mem1/')
+    _files['/nwm.{0}/'.format(_date)] = stub.listing(_products)
+
+
+@pytest.fixture
+def nomads(request, monkeypatch):
+    server = stub.start_nomads(_files, request, monkeypatch)
+    return server
+
+
+def test_all_dates(nomads):
+    '''Should list every date folder without listing each folder.'''
+
+    assert _dates == noaa_list.list_dates()
+    assert 1 == len(nomads.requests)
+
+
+def test_dates_with_product(nomads):
+    '''Should list only dates whose folder includes the product.'''
+
+    for workers in [1, 4]:
+        listing_cache.get_listing_cache().clear()  # List again each pass
+        returned = noaa_list.list_dates('long_range', workers=workers)
+        assert _dates[1::2] == returned
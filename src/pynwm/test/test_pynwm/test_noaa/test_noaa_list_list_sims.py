@@ -0,0 +1,57 @@
+import pytest
+
+from pynwm import listing_cache
+from pynwm.noaa import noaa_list
+from pynwm.test.test_pynwm.test_noaa import nomads_stub as stub
+
+
+_dates = ['20170601', '20170602']
+_assim = ['nwm.t00z.analysis_assim.channel_rt.tm0{0}.conus.nc'.format(i)
+          for i in range(3)]
+_long = ['nwm.t00z.long_range.channel_rt_1.f{0:03d}.conus.nc'.format(h)
+         for h in range(6, 721, 6)]
+_files = {'/': stub.listing(['nwm.{0}/'.format(d) for d in _dates]),
+          '/nwm.20170601/': stub.listing(['analysis_assim/']),
+          '/nwm.20170602/': stub.listing(
+              ['analysis_assim/', 'long_range_mem1/']),
+          '/nwm.20170601/analysis_assim/': stub.listing(_assim[:2]),
+          '/nwm.20170602/analysis_assim/': stub.listing(_assim),
+          '/nwm.20170602/long_range_mem1/': stub.listing(_long)}
+
+
+@pytest.fixture
+def nomads(request, monkeypatch):
+    server = stub.start_nomads(_files, request, monkeypatch)
+    return server
+
+
+def test_all_dates_and_products(nomads):
+    '''Should list simulations in every date and product folder.'''
+
+    expected = ['analysis_assim_20170601t00-00',
+                'analysis_assim_20170602t00-00',
+                'long_range_mem1_20170602t00-00']
+    for workers in [1, 4]:
+        listing_cache.get_listing_cache().clear()  # List again each pass
+        sims = noaa_list.list_sims(workers=workers)
+        assert expected == list(sims)
+    assert not sims['analysis_assim_20170601t00-00']['is_complete']
+    assert sims['long_range_mem1_20170602t00-00']['is_complete']
+    # Files are sorted by forecast hour, so tm01 comes before tm00
+    link = nomads.url('/nwm.20170601/analysis_assim/' + _assim[1])
+    assert link == sims['analysis_assim_20170601t00-00']['links'][0]
+
+
+def test_missing_product_folders_not_requested(nomads):
+    '''Only product folders found in a date folder should be listed.'''
+
+    noaa_list.list_sims('long_range_mem1')
+    paths = [path for path, headers in nomads.requests]
+    assert '/nwm.20170601/long_range_mem1/' not in paths
+
+
+def test_long_range_members(nomads):
+    '''long_range should match the folders of its ensemble members.'''
+
+    sims = noaa_list.list_sims('long_range', '20170602')
+    assert ['long_range_mem1_20170602t00-00'] == list(sims)
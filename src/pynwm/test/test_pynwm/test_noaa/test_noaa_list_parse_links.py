@@ -0,0 +1,25 @@
+from pynwm.noaa import noaa_list
+
+
+_listing = '''<html>
+<head><title>Index of /pub/data/nccf/com/nwm/prod</title></head>
+<body>
+<h1>Index of /pub/data/nccf/com/nwm/prod</h1>
+<pre><a href="/pub/data/nccf/com/nwm/">Parent Directory</a>
+<a href="nwm.20170601/">nwm.20170601/</a>      01-Jun-2017 00:41    -
+<A HREF="nwm.20170602/">nwm.20170602/</A>      02-Jun-2017 00:40    -
+<a title="file" href="nwm.t00z.short_range.channel_rt.f001.conus.nc">nwm.t00z.short_range.channel_rt.f001.conus.nc</a>
+</pre>
+</body></html>'''
+
+
+def test_parse_links():
+    '''Should return link targets except the parent directory.'''
+
+    expected = ['nwm.20170601/', 'nwm.20170602/',
+                'nwm.t00z.short_range.channel_rt.f001.conus.nc']
+    assert expected == noaa_list._parse_links(_listing)
+
+
+def test_parse_no_links():
+    assert [] == noaa_list._parse_links('<html><body></body></html>')
@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+
+from netCDF4 import Dataset
+import pytest
+
+from pynwm import listing_cache
+from pynwm.noaa.noaa_watch import SimulationWatcher
+from pynwm.test.test_pynwm.test_noaa import nomads_stub as stub
+
+
+_assim = ['nwm.t00z.analysis_assim.channel_rt.tm0{0}.conus.nc'.format(i)
+          for i in range(3)]
+_folder = '/nwm.20170601/analysis_assim/'
+
+
+def _nc_bytes(step):
+    hour = 2 - step  # tm02 is valid two hours before the cycle hour
+    nc_file = tempfile.mktemp('.nc')
+    try:
+        with Dataset(nc_file, 'w') as nc:
+            nc.model_output_valid_time = '2017-06-01_0{0}:00:00'.format(hour)
+            nc.createDimension('feature_id', 3)
+            id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+            id_var[:] = [10, 20, 30]
+            flow_var = nc.createVariable('streamflow', 'f', ('feature_id',))
+            flow_var[:] = [1.0 + hour, 2.0, 3.0]
+        with open(nc_file, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(nc_file)
+
+
+@pytest.fixture
+def nomads(request, monkeypatch):
+    files = {'/': stub.listing(['nwm.20170601/']),
+             '/nwm.20170601/': stub.listing(['analysis_assim/']),
+             _folder: stub.listing(_assim[:2])}
+    for step, name in enumerate(_assim):
+        files[_folder + name] = _nc_bytes(step)
+    server = stub.start_nomads(files, request, monkeypatch)
+    monkeypatch.setattr(listing_cache, '_listing_cache', None)
+    return server
+
+
+@pytest.fixture
+def output_folder(request):
+    folder = tempfile.mkdtemp()
+    request.addfinalizer(lambda: shutil.rmtree(folder))
+    return folder
+
+
+def _complete_listing(server):
+    server.files[_folder] = stub.listing(_assim)
+
+
+def test_reports_when_complete(nomads):
+    '''A simulation should be reported once, when its last file arrives.'''
+
+    events = []
+    watcher = SimulationWatcher(
+        'analysis_assim', lambda *args: events.append(args))
+    assert {} == watcher.poll()
+    _complete_listing(nomads)
+    new_sims = watcher.poll()
+    assert ['analysis_assim_20170601t00-00'] == list(new_sims)
+    assert 1 == len(events)
+    key, sim, output = events[0]
+    assert 'analysis_assim_20170601t00-00' == key
+    assert _assim[::-1] == sim['files']
+    assert output is None
+    assert {} == watcher.poll()
+    assert 1 == len(events)
+
+
+def test_existing_sims(nomads):
+    '''Simulations complete at the first poll are reported only if asked.'''
+
+    _complete_listing(nomads)
+    assert {} == SimulationWatcher('analysis_assim').poll()
+    watcher = SimulationWatcher('analysis_assim', include_existing=True)
+    assert 1 == len(watcher.poll())
+
+
+def test_downloads_files(nomads, output_folder):
+    '''Files of a newly completed simulation should be downloaded.'''
+
+    events = []
+    watcher = SimulationWatcher(
+        'analysis_assim', lambda *args: events.append(args),
+        output_folder=output_folder, include_existing=True)
+    _complete_listing(nomads)
+    watcher.poll()
+    expected = [os.path.join(output_folder, f) for f in _assim[::-1]]
+    assert expected == events[0][2]
+    assert sorted(_assim) == sorted(os.listdir(output_folder))
+
+
+def test_combines_files(nomads, output_folder):
+    '''Files should be combined for the river_ids when they are given.'''
+
+    events = []
+    watcher = SimulationWatcher(
+        'analysis_assim', lambda *args: events.append(args),
+        output_folder=output_folder, river_ids=[30, 10],
+        include_existing=True)
+    _complete_listing(nomads)
+    watcher.poll()
+    out_filename = events[0][2]
+    expected = os.path.join(output_folder,
+                            'analysis_assim_20170601t00-00.nc')
+    assert expected == out_filename
+    assert ['analysis_assim_20170601t00-00.nc'] == os.listdir(output_folder)
+    with Dataset(out_filename) as nc:
+        assert [30, 10] == list(nc.variables['feature_id'][:])
+        assert [1.0, 2.0, 3.0] == list(nc.variables['streamflow'][:, 1])
+
+
+def test_failed_download_retried(nomads, output_folder):
+    '''A simulation whose files fail to download should be tried again.'''
+
+    del nomads.files[_folder + _assim[2]]
+    watcher = SimulationWatcher('analysis_assim',
+                                output_folder=output_folder,
+                                include_existing=True)
+    _complete_listing(nomads)
+    assert {} == watcher.poll()
+    nomads.files[_folder + _assim[2]] = _nc_bytes(2)
+    assert 1 == len(watcher.poll())
+
+
+def test_failure_does_not_block_later_sims(nomads):
+    '''A simulation that keeps failing should not hold back later ones.'''
+
+    later = [name.replace('t00z', 't01z') for name in _assim]
+    nomads.files[_folder] = stub.listing(_assim + later)
+    delivered = []
+    failed = []
+
+    def on_complete(key, sim, output):
+        if key.endswith('t00-00'):
+            failed.append(key)
+            raise ValueError('bad simulation')
+        delivered.append(key)
+
+    watcher = SimulationWatcher('analysis_assim', on_complete,
+                                include_existing=True, max_attempts=2)
+    assert ['analysis_assim_20170601t01-00'] == list(watcher.poll())
+    assert ['analysis_assim_20170601t01-00'] == delivered
+    assert {} == watcher.poll()  # Second and last attempt for t00
+    assert {} == watcher.poll()
+    assert 1 == len(delivered)
+    assert 2 == len(failed)
+
+
+def test_start_stop(nomads):
+    '''The watcher should poll in the background until stopped.'''
+
+    events = []
+    watcher = SimulationWatcher(
+        'analysis_assim', lambda *args: events.append(args), interval=0.05)
+    watcher.poll()
+    watcher.start()
+    _complete_listing(nomads)
+    for _ in range(100):
+        if events:
+            break
+        watcher._stop.wait(0.05)
+    watcher.stop()
+    assert 1 == len(events)
@@ -80,3 +80,115 @@ def test_cube_dates(files_to_cube_setup):
     expected = [parser.parse('2017-04-29 0{0}:00:00-00'.format(i))
                 for i in range(3)]
     assert expected == returned
+
+
+def test_cube_dates_as_datetime64(files_to_cube_setup):
+    '''Output times should be a datetime64 array if requested.'''
+
+    q, t = nwm_data.build_streamflow_cube(_files_to_cube, [2],
+                                          as_datetime64=True)
+    expected = np.array(['2017-04-29T00', '2017-04-29T01', '2017-04-29T02'],
+                        dtype='datetime64[s]')
+    assert np.array_equal(expected, t)
+    assert expected.dtype == t.dtype
+
+
+def test_cube_workers_match_serial(files_to_cube_setup):
+    '''Reading files in a worker pool should not change the output.'''
+
+    ids = [6, 2, 4]
+    q, t = nwm_data.build_streamflow_cube(_files_to_cube, ids)
+    for use_threads in [False, True]:
+        returned_q, returned_t = nwm_data.build_streamflow_cube(
+            _files_to_cube, ids, workers=2, use_threads=use_threads)
+        assert q.tolist() == returned_q.tolist()
+        assert t == returned_t
+
+
+def test_cube_dtypes(files_to_cube_setup):
+    '''Should return float32 or packed int32 streamflow when requested.'''
+
+    ids = [2, 4]
+    q, t = nwm_data.build_streamflow_cube(_files_to_cube, ids, dtype='f4')
+    assert np.float32 == q.dtype
+    assert pytest.approx([4.5, -9999.0, -9999.0]) == list(q[:,1])
+
+    q, t = nwm_data.build_streamflow_cube(_files_to_cube, ids, dtype='i4')
+    assert np.int32 == q.dtype
+    assert [300, 600, 900] == list(q[:,0])
+    assert [450, -999900, -999900] == list(q[:,1])
+
+    with pytest.raises(ValueError):
+        nwm_data.build_streamflow_cube(_files_to_cube, ids, dtype='i2')
+
+
+def test_cube_memmap(files_to_cube_setup):
+    '''Should store the cube in a memory-mapped file when requested.'''
+
+    out_file = os.path.join(_tempdir, 'cube_memmap.dat')
+    q, t = nwm_data.build_streamflow_cube(_files_to_cube, [6, 2],
+                                          out_filename=out_file)
+    assert isinstance(q, np.memmap)
+    del q
+    q = np.memmap(out_file, dtype='f8', mode='r', shape=(3, 2))
+    assert pytest.approx([5, 10, 15]) == list(q[:,0])
+    assert pytest.approx([3, 6, 9]) == list(q[:,1])
+    del q
+    os.remove(out_file)
+
+
+@pytest.fixture(scope='module', params=['f8', 'f4'])
+def packed_files_to_cube_setup(request):
+    '''Files storing streamflow as scaled integers like NWM v1.1+.
+
+    Model files store scale_factor and add_offset as float32.
+    '''
+
+    attr_type = np.dtype(request.param).type
+    packed_files = [os.path.join(_tempdir, 'packed_to_cube{0}.nc'.format(i))
+                    for i in range(2)]
+    for i, nc_file in enumerate(packed_files):
+        with Dataset(nc_file, 'w') as nc:
+            nc.model_output_valid_time = '2017-04-29_0{0}:00:00'.format(i)
+            nc.createDimension('feature_id', 3)
+            id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+            id_var[:] = _ids
+            flow_var = nc.createVariable('streamflow', 'i', ('feature_id',),
+                                         fill_value=-999900)
+            flow_var.scale_factor = attr_type(0.01)
+            flow_var.add_offset = attr_type(0.0)
+            flow_var.set_auto_maskandscale(False)
+            flow_var[:] = [300 * (i + 1), -999900, -5]
+    def packed_files_to_cube_teardown():
+        for nc_file in packed_files:
+            os.remove(nc_file)
+    request.addfinalizer(packed_files_to_cube_teardown)
+    return packed_files
+
+
+def test_packed_cube_dtypes(packed_files_to_cube_setup):
+    '''Packed files should read as raw int32 or scaled floats.'''
+
+    files = packed_files_to_cube_setup
+    ids = [2, 4]
+    q, t = nwm_data.build_streamflow_cube(files, ids, dtype='i4')
+    assert np.int32 == q.dtype
+    assert [[300, -999900], [600, -999900]] == q.tolist()
+
+    for dtype in ['f4', 'f8']:
+        q, t = nwm_data.build_streamflow_cube(files, ids, dtype=dtype)
+        assert np.dtype(dtype) == q.dtype
+        assert pytest.approx([3.0, 6.0]) == list(q[:,0])
+        assert [-9999.0, -9999.0] == list(q[:,1])
+
+
+def test_packed_cube_copies_ints(packed_files_to_cube_setup, monkeypatch):
+    '''Packed integers should be copied into int cubes without scaling.'''
+
+    def fail(q, dtype):
+        raise AssertionError('Packed values were scaled')
+
+    monkeypatch.setattr(nwm_data, '_to_cube_dtype', fail)
+    q, t = nwm_data.build_streamflow_cube(packed_files_to_cube_setup, [2, 6],
+                                          dtype='i4')
+    assert [[300, -5], [600, -5]] == q.tolist()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+
+from pynwm import nwm_data
+
+_all_ids = [50, 10, 40, 20, 30]
+
+
+@pytest.fixture
+def clean_cache(request):
+    nwm_data.clear_id_index_cache()
+    request.addfinalizer(nwm_data.clear_id_index_cache)
+
+
+def test_same_ids_reuse_index(clean_cache):
+    '''Identifier arrays with the same values should share one index.'''
+
+    first = nwm_data.get_id_index(_all_ids)
+    second = nwm_data.get_id_index(np.array(_all_ids))
+    assert first is second
+
+
+def test_different_ids_new_index(clean_cache):
+    '''Identifier arrays with different values should not share an index.'''
+
+    first = nwm_data.get_id_index(_all_ids)
+    second = nwm_data.get_id_index(_all_ids[::-1])
+    assert first is not second
+    assert [0, 4] == list(second.indices([30, 50]))
+
+
+def test_index_finds_ids(clean_cache):
+    '''Indices should point into the original, unsorted identifiers.'''
+
+    id_index = nwm_data.get_id_index(_all_ids)
+    expected = [3, 0, 1]
+    assert expected == list(id_index.indices([20, 50, 10]))
+    assert expected == list(id_index.indices([20, 50, 10]))
+
+
+def test_index_saved_to_cache_dir(clean_cache):
+    '''Sort order should be saved and reloaded from the cache folder.'''
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        id_index = nwm_data.get_id_index(_all_ids, cache_dir)
+        npy_files = os.listdir(cache_dir)
+        assert ['id_index_{0}.npy'.format(id_index.key)] == npy_files
+
+        nwm_data.clear_id_index_cache()
+        reloaded = nwm_data.get_id_index(_all_ids, cache_dir)
+        assert id_index is not reloaded
+        assert list(id_index.sorted_index) == list(reloaded.sorted_index)
+        assert [4, 2] == list(reloaded.indices([30, 40]))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_lookups_bounded(clean_cache, monkeypatch):
+    '''Only the most recently used lookups should be kept.'''
+
+    monkeypatch.setattr(nwm_data, '_MAX_CACHED_LOOKUPS', 2)
+    id_index = nwm_data.get_id_index(_all_ids)
+    first = id_index.lookup([10])
+    id_index.lookup([20])
+    assert first is id_index.lookup([10])  # Now most recently used
+    id_index.lookup([30])
+    assert 2 == len(id_index._lookups)
+    assert first is id_index.lookup([10])
+    assert [1] == list(id_index.lookup([10])[0])
+
+
+def test_caches_shared_by_threads(clean_cache, monkeypatch):
+    '''Cache hits and evictions from many threads should not fail.'''
+
+    monkeypatch.setattr(nwm_data, '_MAX_CACHED_ID_INDICES', 2)
+    monkeypatch.setattr(nwm_data, '_MAX_CACHED_LOOKUPS', 2)
+    layouts = [np.arange(i, i + 50) for i in range(4)]
+    errors = []
+
+    def work(seed):
+        try:
+            for i in range(300):
+                all_ids = layouts[(seed + i) % len(layouts)]
+                find_ids = all_ids[[i % 7, 10 + i % 3]]
+                indices = nwm_data.get_id_index(all_ids).indices(find_ids)
+                assert list(find_ids) == list(all_ids[indices])
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    interval = sys.getcheckinterval()
+    sys.setcheckinterval(1)  # Switch threads as often as possible
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setcheckinterval(interval)
+    assert [] == errors
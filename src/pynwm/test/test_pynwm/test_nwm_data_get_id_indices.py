@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 from pynwm import nwm_data
@@ -30,3 +31,29 @@ def test_invalid_ids():
     no_id = [100]
     with pytest.raises(IndexError):
         returned = list(nwm_data.get_id_indices(no_id, _all_ids))
+
+
+def test_missing_id_between_ids():
+    '''Should raise IndexError for an id that sorts between existing ids.'''
+
+    with pytest.raises(IndexError) as error:
+        nwm_data.get_id_indices([30, 25], _all_ids)
+    assert '25' in str(error.value)
+
+
+def test_return_found():
+    '''Should flag missing ids instead of raising an error.'''
+
+    index, found = nwm_data.get_id_indices([25, 50, 100, 10], _all_ids,
+                                           return_found=True)
+    assert [False, True, False, True] == list(found)
+    assert [-1, 4, -1, 0] == list(index)
+
+
+def test_int64_indices():
+    '''Should return int64 indices for any input id type.'''
+
+    for ids in ([20, 40], ['20', '40'], np.array([20, 40], dtype='i4')):
+        returned = nwm_data.get_id_indices(ids, _all_ids)
+        assert np.int64 == returned.dtype
+        assert [1, 3] == list(returned)
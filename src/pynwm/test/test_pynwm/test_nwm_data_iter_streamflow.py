@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+import time
+
+from netCDF4 import Dataset
+import pytest
+
+from pynwm import nwm_data
+
+_tempdir = tempfile.gettempdir()
+_files_to_iter = [os.path.join(_tempdir, 'files_to_iter{0}.nc'.format(i))
+                  for i in range(3)]
+_ids = [2, 4, 6, 8, 10]
+
+
+@pytest.fixture(scope='module')
+def files_to_iter_setup(request):
+    date_template = '2017-04-29_0{0}:00:00'
+    for i, nc_file in enumerate(_files_to_iter):
+        with Dataset(nc_file, 'w') as nc:
+            nc.model_output_valid_time = date_template.format(i)
+            nc.createDimension('feature_id', len(_ids))
+            id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+            id_var[:] = _ids
+            flow_var = nc.createVariable('streamflow', 'f', ('feature_id',),
+                                         fill_value=-9999.0)
+            flow_var[:] = [x * (i + 1) for x in _ids]
+    def files_to_iter_teardown():
+        for nc_file in _files_to_iter:
+            os.remove(nc_file)
+    request.addfinalizer(files_to_iter_teardown)
+
+
+def test_iter_matches_cube(files_to_iter_setup):
+    '''Each step should match the same row of the streamflow cube.'''
+
+    ids = [8, 2]
+    q, t = nwm_data.build_streamflow_cube(_files_to_iter, ids)
+    for prefetch in [False, True]:
+        steps = list(nwm_data.iter_streamflow(_files_to_iter, ids,
+                                              prefetch=prefetch))
+        assert t == [date for date, flows in steps]
+        assert q.tolist() == [list(flows) for date, flows in steps]
+
+
+def test_iter_chunks(files_to_iter_setup):
+    '''Should yield chunks of rivers with their positions in river_ids.'''
+
+    steps = list(nwm_data.iter_streamflow(_files_to_iter[:1], chunk_size=2))
+    assert [slice(0, 2), slice(2, 4), slice(4, 6)] == \
+        [chunk for date, chunk, flows in steps]
+    assert [[2, 4], [6, 8], [10]] == \
+        [list(flows) for date, chunk, flows in steps]
+
+
+def test_iter_prefetch_error():
+    '''Errors reading files in the background should reach the caller.'''
+
+    missing = os.path.join(_tempdir, 'no_such_file_to_iter.nc')
+    with pytest.raises(IOError) as error:
+        list(nwm_data.iter_streamflow([missing], [2], prefetch=True))
+    # The traceback should reach into the background reader
+    assert 'open_dataset' in [entry.name for entry in error.traceback]
+
+
+def test_prefetch_stops_with_caller():
+    '''The background thread should end when the caller stops reading.'''
+
+    def steps():
+        yield 1
+        yield 2
+        raise ValueError('Error after the caller stopped')
+
+    before = threading.active_count()
+    prefetched = nwm_data._prefetch(steps())
+    assert 1 == next(prefetched)
+    time.sleep(0.3)  # Let the error wait on the full queue
+    prefetched.close()
+    for _ in range(40):
+        if before == threading.active_count():
+            break
+        time.sleep(0.05)
+    assert before == threading.active_count()
@@ -0,0 +1,100 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from netCDF4 import Dataset
+import pytest
+
+from pynwm import nwm_data, nwm_subset
+
+_tempdir = tempfile.gettempdir()
+_nc_file = os.path.join(_tempdir, 'file_to_gzip.nc')
+_gz_file = _nc_file + '.gz'
+
+
+@pytest.fixture(scope='module')
+def gz_file_setup(request):
+    with Dataset(_nc_file, 'w') as nc:
+        nc.model_output_valid_time = '2017-04-29_04:00:00'
+        nc.createDimension('feature_id', 3)
+        id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+        id_var[:] = [2, 4, 6]
+        flow_var = nc.createVariable('streamflow', 'f', ('feature_id',))
+        flow_var[:] = [1.5, 2.5, 3.5]
+    with open(_nc_file, 'rb') as f, gzip.open(_gz_file, 'wb') as z:
+        shutil.copyfileobj(f, z)
+    def gz_file_teardown():
+        os.remove(_nc_file)
+        os.remove(_gz_file)
+    request.addfinalizer(gz_file_teardown)
+
+
+def test_open_gz_in_memory(gz_file_setup):
+    '''Should open a gzipped file without writing a temporary file.'''
+
+    with nwm_data.open_dataset(_gz_file) as nc:
+        assert [2, 4, 6] == list(nc.variables['feature_id'][:])
+
+
+def test_open_gz_temp_file(gz_file_setup):
+    '''Should open a gzipped file through a temporary file.'''
+
+    with nwm_data.open_dataset(_gz_file, in_memory=False) as nc:
+        tmp_filename = nc.filepath()
+        assert [2, 4, 6] == list(nc.variables['feature_id'][:])
+    assert not os.path.isfile(tmp_filename)
+
+
+def test_gunzip_in_chunks(gz_file_setup):
+    '''Decompressed file should match the original.'''
+
+    out_file = os.path.join(_tempdir, 'gunzipped.nc')
+    nwm_data.gunzip(_gz_file, out_file, chunk_size=100)
+    with open(_nc_file, 'rb') as f, open(out_file, 'rb') as g:
+        assert f.read() == g.read()
+    os.remove(out_file)
+
+
+def test_gunzip_to_memory_multiple_members():
+    '''Should read past the size in the trailer of the last member.'''
+
+    gz_file = os.path.join(_tempdir, 'two_members.gz')
+    with open(gz_file, 'wb') as f:
+        for text in ['first member ' * 20, 'second']:
+            with gzip.GzipFile(fileobj=f, mode='wb') as z:
+                z.write(text)
+    returned = nwm_data._gunzip_to_memory(gz_file, chunk_size=7)
+    assert 'first member ' * 20 + 'second' == str(returned)
+    os.remove(gz_file)
+
+
+def test_read_streamflow_from_gz(gz_file_setup):
+    '''Should read streamflow directly from gzipped files.'''
+
+    returned = nwm_data.read_streamflow(_gz_file, [6, 2])
+    assert pytest.approx([3.5, 1.5]) == list(returned['flows'])
+    q, t = nwm_data.build_streamflow_cube([_gz_file] * 3, [4], workers=2)
+    assert pytest.approx([2.5, 2.5, 2.5]) == list(q[:,0])
+
+
+def test_readers_pass_in_memory(gz_file_setup, monkeypatch):
+    '''Readers given in_memory=False should not decompress into memory.'''
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Decompressed into memory')
+
+    monkeypatch.setattr(nwm_data, '_gunzip_to_memory', fail)
+    result = nwm_data.read_streamflow(_gz_file, [4], in_memory=False)
+    assert [2.5] == list(result['flows'])
+    q, t = nwm_data.build_streamflow_cube([_gz_file], [6], in_memory=False)
+    assert [[3.5]] == q.tolist()
+    steps = list(nwm_data.iter_streamflow([_gz_file], in_memory=False))
+    assert [1.5, 2.5, 3.5] == list(steps[0][1])
+    out_file = os.path.join(_tempdir, 'combined_from_gz.nc')
+    try:
+        nwm_subset.combine_files([_gz_file], out_file, [2], in_memory=False)
+        with Dataset(out_file) as nc:
+            assert [[1.5]] == nc.variables['streamflow'][:].tolist()
+    finally:
+        os.remove(out_file)
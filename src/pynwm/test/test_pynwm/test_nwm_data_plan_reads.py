@@ -0,0 +1,44 @@
+from pynwm import nwm_data
+
+
+def test_plan_points():
+    '''Should read far apart indices one at a time.'''
+
+    strategy, blocks = nwm_data._plan_reads([900, 10, 500], 1000, 100)
+    assert 'points' == strategy
+    assert [(10, 11), (500, 501), (900, 901)] == blocks
+
+
+def test_plan_blocks():
+    '''Should merge indices separated by gaps cheaper than a read call.'''
+
+    strategy, blocks = nwm_data._plan_reads([12, 10, 15, 900, 905],
+                                            10000, 100)
+    assert 'blocks' == strategy
+    assert [(10, 16), (900, 906)] == blocks
+
+
+def test_plan_full():
+    '''Should read the whole variable when blocks cost more.'''
+
+    indices = range(5, 1000, 100)  # One value in every chunk
+    strategy, blocks = nwm_data._plan_reads(indices, 1000, 50, 100)
+    assert 'full' == strategy
+    assert [(0, 1000)] == blocks
+
+
+def test_plan_blocks_by_chunk():
+    '''Should merge indices in neighboring chunks and skip empty chunks.'''
+
+    indices = [5, 150, 210, 720, 990]
+    strategy, blocks = nwm_data._plan_reads(indices, 1000, 50, 100)
+    assert 'blocks' == strategy
+    assert [(5, 211), (720, 721), (990, 991)] == blocks
+
+
+def test_plan_duplicates():
+    '''Should read duplicate indices once.'''
+
+    strategy, blocks = nwm_data._plan_reads([5, 5, 5], 1000, 100)
+    assert 'points' == strategy
+    assert [(5, 6)] == blocks
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+
+from netCDF4 import Dataset
+import numpy as np
+
+from pynwm import nwm_data
+
+_UNITS = 'minutes since 1970-01-01 00:00:00 UTC'
+
+
+def test_mixed_units():
+    '''Times in several units should convert to one datetime64 array.'''
+
+    raw = [(24802560, _UNITS),
+           ('2017-02-27_01:00:00', None),
+           (1488160800, 'seconds since 1970-01-01'),
+           (24802740, _UNITS),
+           (1, 'hours since 2017-02-27 03:00:00 -01:00')]
+    returned = nwm_data.raw_times_to_datetime64(raw)
+    expected = np.array(['2017-02-27T00', '2017-02-27T01', '2017-02-27T02',
+                         '2017-02-27T03', '2017-02-27T05'],
+                        dtype='datetime64[s]')
+    assert np.array_equal(expected, returned)
+
+
+def test_empty():
+    '''No raw times should give an empty array.'''
+
+    returned = nwm_data.raw_times_to_datetime64([])
+    assert 0 == len(returned)
+    assert np.dtype('datetime64[s]') == returned.dtype
+
+
+def test_round_trip():
+    '''datetime64_to_times should invert the conversion.'''
+
+    values = [24802440, 24802500, 24802560]
+    dates = nwm_data.raw_times_to_datetime64([(v, _UNITS) for v in values])
+    assert values == nwm_data.datetime64_to_times(dates, _UNITS).tolist()
+
+
+def test_raw_time_from_dataset():
+    '''Should read the time value and units without converting them.'''
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        nc_file = os.path.join(tempdir, 'test_raw_time.nc')
+        with Dataset(nc_file, 'w') as nc:
+            nc.createDimension('time', 1)
+            time_var = nc.createVariable('time', 'i', ('time',))
+            time_var[:] = [24802440]
+            time_var.units = _UNITS
+            assert (24802440, _UNITS) == nwm_data.raw_time_from_dataset(nc)
+    finally:
+        shutil.rmtree(tempdir)
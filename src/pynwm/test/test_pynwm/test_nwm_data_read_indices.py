@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+from netCDF4 import Dataset
+import numpy as np
+import numpy.ma as ma
+import pytest
+
+from pynwm import nwm_data
+
+
+_file_to_read_indices = os.path.join(tempfile.gettempdir(),
+                                     'file_to_read_indices.nc')
+_size = 50000
+_indices = [49999, 3, 20000, 4, 3, 20010, 0]
+
+
+@pytest.fixture(scope='module')
+def file_to_read_indices_setup(request):
+    flows = ma.masked_array(np.arange(_size, dtype='f'))
+    flows[20000] = ma.masked
+    with Dataset(_file_to_read_indices, 'w') as nc:
+        nc.createDimension('feature_id', _size)
+        flow_var = nc.createVariable('streamflow', 'f', ('feature_id',),
+                                     fill_value=-9999.0)
+        flow_var[:] = flows
+    def file_to_read_indices_teardown():
+        os.remove(_file_to_read_indices)
+    request.addfinalizer(file_to_read_indices_teardown)
+
+
+def test_strategies_match(file_to_read_indices_setup):
+    '''Every strategy should return values and mask in input order.'''
+
+    expected = [49999, 3, -9999, 4, 3, 20010, 0]
+    with Dataset(_file_to_read_indices) as nc:
+        var = nc.variables['streamflow']
+        for strategy in ['auto', 'full', 'blocks', 'points']:
+            returned = nwm_data.read_indices(var, _indices, strategy)
+            assert expected == list(returned.filled())
+            assert [False, False, True, False, False, False, False] == \
+                list(ma.getmaskarray(returned))
+
+
+def test_invalid_strategy(file_to_read_indices_setup):
+    '''Should raise ValueError for an unknown strategy.'''
+
+    with Dataset(_file_to_read_indices) as nc:
+        with pytest.raises(ValueError):
+            nwm_data.read_indices(nc.variables['streamflow'], [1], 'bogus')
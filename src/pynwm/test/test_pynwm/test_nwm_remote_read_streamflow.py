@@ -0,0 +1,159 @@
+import os
+import tempfile
+import urllib2
+
+from netCDF4 import Dataset
+import numpy as np
+import pytest
+
+from pynwm import nwm_data, nwm_remote
+from pynwm.connection_pool import ConnectionPool
+from pynwm.test.test_pynwm.local_server import LocalServer
+
+h5py = pytest.importorskip('h5py')
+
+_num_rivers = 200000
+_random = np.random.RandomState(0)
+_ids = np.cumsum(_random.randint(1, 1000, _num_rivers)).astype('i4')
+_flows = _random.randint(0, 10 ** 6, _num_rivers) * 0.01
+
+
+@pytest.fixture(scope='module')
+def nc_file(request):
+    nc_file = tempfile.mktemp('.nc')
+    with Dataset(nc_file, 'w') as nc:
+        nc.createDimension('time', 1)
+        nc.createDimension('feature_id', _num_rivers)
+        time_var = nc.createVariable('time', 'i', ('time',))
+        time_var.units = 'minutes since 1970-01-01 00:00:00 UTC'
+        time_var[:] = [24842160]
+        id_var = nc.createVariable('feature_id', 'i', ('feature_id',),
+                                   zlib=True, chunksizes=(10000,))
+        id_var[:] = _ids
+        q_var = nc.createVariable('streamflow', 'i', ('feature_id',),
+                                  zlib=True, chunksizes=(10000,),
+                                  fill_value=-999900)
+        q_var.scale_factor = 0.01
+        q_var.add_offset = 0.0
+        flows = np.ma.masked_array(_flows, mask=np.zeros(_num_rivers))
+        flows[5] = np.ma.masked
+        q_var[:] = flows
+    request.addfinalizer(lambda: os.remove(nc_file))
+    return nc_file
+
+
+@pytest.fixture(scope='module')
+def server(request, nc_file):
+    with open(nc_file, 'rb') as f:
+        server = LocalServer({'/nwm.nc': f.read()}).start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+def test_matches_local_read(nc_file, server):
+    '''Remote reads should return the same values as local reads.'''
+
+    river_ids = [_ids[150000], _ids[5], _ids[3]]
+    expected = nwm_data.read_streamflow(nc_file, river_ids)
+    result = nwm_remote.read_streamflow(server.url('/nwm.nc'), river_ids)
+    assert expected['datetime'] == result['datetime']
+    assert list(expected['flows'].mask) == list(result['flows'].mask)
+    assert np.allclose(expected['flows'], result['flows'])
+
+
+def test_fetches_part_of_file(nc_file, server):
+    '''Given the identifiers, only a small part of the file is fetched.'''
+
+    remote_files = []
+
+    class TrackedRangeFile(nwm_remote.RangeFile):
+        def __init__(self, *args, **kwargs):
+            super(TrackedRangeFile, self).__init__(*args, **kwargs)
+            remote_files.append(self)
+
+    original = nwm_remote.RangeFile
+    nwm_remote.RangeFile = TrackedRangeFile
+    try:
+        result = nwm_remote.read_streamflow(server.url('/nwm.nc'),
+                                            [_ids[123456]], all_ids=_ids,
+                                            block_size=16 * 1024)
+    finally:
+        nwm_remote.RangeFile = original
+    assert np.isclose(_flows[123456], result['flows'][0])
+    assert remote_files[0].bytes_fetched < os.path.getsize(nc_file) / 4
+
+
+def test_all_ids_length_checked(server):
+    '''all_ids with the wrong number of rivers should raise ValueError.'''
+
+    with pytest.raises(ValueError):
+        nwm_remote.read_streamflow(server.url('/nwm.nc'), [7], all_ids=[7])
+
+
+def test_range_file_reads(nc_file, server):
+    '''RangeFile should read like a local file across block boundaries.'''
+
+    with open(nc_file, 'rb') as f:
+        local = f.read()
+    remote_file = nwm_remote.RangeFile(server.url('/nwm.nc'), block_size=100)
+    assert len(local) == remote_file.size
+    remote_file.seek(250)
+    assert local[250:1000] == remote_file.read(750)
+    assert 1000 == remote_file.tell()
+    remote_file.seek(-10, 2)
+    assert local[-10:] == remote_file.read()
+    assert b'' == remote_file.read(5)
+
+
+def test_version_1_0_layout():
+    '''Station ids and the valid time attribute should be used if present.'''
+
+    nc_file = tempfile.mktemp('.nc')
+    try:
+        with Dataset(nc_file, 'w') as nc:
+            nc.model_output_valid_time = '2016-06-01_05:00:00'
+            nc.createDimension('station', 3)
+            id_var = nc.createVariable('station_id', 'i', ('station',))
+            id_var[:] = [7, 8, 9]
+            q_var = nc.createVariable('streamflow', 'f', ('station',))
+            q_var[:] = [1.5, 2.5, 3.5]
+        expected = nwm_data.read_streamflow(nc_file, [9, 7])
+        with open(nc_file, 'rb') as f:
+            server = LocalServer({'/v1_0.nc': f.read()}).start()
+        try:
+            result = nwm_remote.read_streamflow(server.url('/v1_0.nc'), [9, 7])
+        finally:
+            server.stop()
+        assert expected['datetime'] == result['datetime']
+        assert [3.5, 1.5] == list(result['flows'])
+    finally:
+        os.remove(nc_file)
+
+
+def test_range_ignored():
+    '''A server ignoring Range should fail without reusing the connection.'''
+
+    body = 'x' * (4 * 1024 * 1024)
+    server = LocalServer(routes={'/f.nc': lambda h: (200, {}, body)}).start()
+    pool = ConnectionPool()
+    try:
+        with pytest.raises(urllib2.HTTPError):
+            nwm_remote.RangeFile(server.url('/f.nc'), pool=pool)
+        assert not any(pool._idle.values())
+    finally:
+        pool.close()
+        server.stop()
+
+
+def test_range_without_size():
+    '''A Content-Range without the file size should raise HTTPError.'''
+
+    for content_range in ['bytes 0-0/*', None]:
+        headers = {'Content-Range': content_range} if content_range else {}
+        route = lambda h: (206, headers, 'x')
+        server = LocalServer(routes={'/f.nc': route}).start()
+        try:
+            with pytest.raises(urllib2.HTTPError):
+                nwm_remote.RangeFile(server.url('/f.nc'))
+        finally:
+            server.stop()
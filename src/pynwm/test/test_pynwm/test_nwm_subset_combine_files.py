@@ -110,3 +110,73 @@ def test_combined_streamflow(file_to_combine_setup):
     with Dataset(_ids_in_order_nc) as nc:
         returned = list(nc.variables['streamflow'][:,2])
         assert expected == returned
+
+
+def test_compressed_chunked_output(file_to_combine_setup):
+    '''Compression and chunking settings should be applied to streamflow.'''
+
+    ids = [2, 4]
+    in_file = join(tempfile.gettempdir(), 'combine_me_compressed.nc')
+    out_file = join(tempfile.gettempdir(), 'combined_compressed.nc')
+    with Dataset(in_file, 'w') as nc:
+        nc.model_output_valid_time = '2017-04-29_00:00:00'
+        nc.createDimension('feature_id', 2)
+        id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+        id_var[:] = ids
+        flow_var = nc.createVariable('streamflow', 'f', ('feature_id',))
+        flow_var[:] = [1.5, 2.5]
+    nwm_subset.combine_files([in_file], out_file, zlib=True, complevel=6,
+                             chunking='time_series')
+    with Dataset(out_file) as nc:
+        var = nc.variables['streamflow']
+        filters = var.filters()
+        assert filters['zlib']
+        assert 6 == filters['complevel']
+        assert filters['shuffle']
+        assert [1, 2] == var.chunking()
+        assert pytest.approx([1.5, 2.5]) == list(var[0])
+    os.remove(in_file)
+    os.remove(out_file)
+
+
+def test_full_domain_streamed(monkeypatch):
+    '''Combining all rivers should write one time step at a time.'''
+
+    tempdir = tempfile.gettempdir()
+    in_files = [join(tempdir, 'combine_me_streamed{0}.nc'.format(i))
+                for i in range(3)]
+    for i, in_file in enumerate(in_files):
+        with Dataset(in_file, 'w') as nc:
+            nc.model_output_valid_time = '2017-04-29_0{0}:00:00'.format(i)
+            nc.createDimension('feature_id', 3)
+            id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+            id_var[:] = [5, 3, 9]
+            flow_var = nc.createVariable('streamflow', 'f', ('feature_id',),
+                                         fill_value=-9999.0)
+            flow_var[:] = [1.5 + i, -9999.0, 2.25]
+    subset_file = join(tempdir, 'combined_subset.nc')
+    nwm_subset.combine_files(in_files, subset_file, [5, 3, 9])
+
+    def build_cube(*args, **kwargs):
+        raise AssertionError('Full-domain cube built in memory')
+
+    monkeypatch.setattr(nwm_subset.nwm_data, 'build_streamflow_cube',
+                        build_cube)
+    out_file = join(tempdir, 'combined_streamed.nc')
+    try:
+        for workers in [None, 2]:
+            nwm_subset.combine_files(in_files, out_file, workers=workers)
+            with Dataset(out_file) as nc, Dataset(subset_file) as expected:
+                for name in ['feature_id', 'time', 'streamflow',
+                             'source_file']:
+                    assert (list(expected.variables[name][:].ravel()) ==
+                            list(nc.variables[name][:].ravel()))
+        nwm_subset.combine_files(in_files[:1], out_file)
+        nwm_subset.combine_files(in_files, out_file, append=True)
+        with Dataset(out_file) as nc:
+            assert 3 == len(nc.dimensions['time'])
+            assert pytest.approx([1.5, 2.5, 3.5]) == list(
+                nc.variables['streamflow'][:, 0])
+    finally:
+        for filename in in_files + [subset_file, out_file]:
+            os.remove(filename)
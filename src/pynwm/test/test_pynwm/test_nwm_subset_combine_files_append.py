@@ -0,0 +1,94 @@
+import os
+from os.path import join
+import tempfile
+
+from netCDF4 import Dataset, num2date
+from dateutil import parser
+import pytest
+
+from pynwm import nwm_data, nwm_subset
+
+_tempdir = tempfile.gettempdir()
+_files_to_append = [join(_tempdir, 'append_me{0}.nc'.format(i))
+                    for i in range(3)]
+_ids = [2, 4, 6]
+
+
+@pytest.fixture(scope='module')
+def files_to_append_setup(request):
+    date_template = '2017-04-29_0{0}:00:00'
+    for i, nc_file in enumerate(_files_to_append):
+        with Dataset(nc_file, 'w') as nc:
+            nc.model_output_valid_time = date_template.format(i)
+            nc.createDimension('feature_id', 3)
+            id_var = nc.createVariable('feature_id', 'i', ('feature_id',))
+            id_var[:] = _ids
+            flow_var = nc.createVariable('streamflow', 'f', ('feature_id',))
+            flow_var[:] = [x * (i + 1) for x in _ids]
+    def files_to_append_teardown():
+        for nc_file in _files_to_append:
+            os.remove(nc_file)
+    request.addfinalizer(files_to_append_teardown)
+
+
+def test_append_new_time_steps(files_to_append_setup):
+    '''Should add only time steps not already in the output, in order.'''
+
+    out_file = join(_tempdir, 'appended.nc')
+    nwm_subset.combine_files(_files_to_append[:1], out_file, [6, 2],
+                             append=True)
+    in_files = _files_to_append[::-1] + _files_to_append[1:2]
+    nwm_subset.combine_files(in_files, out_file, [2, 6], append=True)
+    with Dataset(out_file) as nc:
+        assert [6, 2] == list(nc.variables['feature_id'])
+        var = nc.variables['time']
+        expected = [parser.parse('2017-04-29 0{0}:00:00'.format(i))
+                    for i in [0, 1, 2]]
+        assert expected == list(num2date(var[:], var.units))
+        expected = [[6, 2], [12, 4], [18, 6]]
+        assert expected == nc.variables['streamflow'][:].tolist()
+    os.remove(out_file)
+
+
+def test_append_earlier_time_step(files_to_append_setup):
+    '''Should raise ValueError rather than append an earlier time step.'''
+
+    out_file = join(_tempdir, 'appended_earlier.nc')
+    nwm_subset.combine_files(_files_to_append[1:2], out_file, [2, 4])
+    with pytest.raises(ValueError):
+        nwm_subset.combine_files(_files_to_append, out_file, [2, 4],
+                                 append=True)
+    with Dataset(out_file) as nc:
+        assert 1 == len(nc.variables['time'])
+    os.remove(out_file)
+
+
+def test_append_skips_combined_files(files_to_append_setup, monkeypatch):
+    '''Files already combined should not be opened again.'''
+
+    out_file = join(_tempdir, 'appended_skip.nc')
+    nwm_subset.combine_files(_files_to_append[:2], out_file, [2, 4])
+    opened = []
+    open_dataset = nwm_data.open_dataset
+
+    def record_open(nc_file, *args, **kwargs):
+        opened.append(nc_file)
+        return open_dataset(nc_file, *args, **kwargs)
+
+    monkeypatch.setattr(nwm_data, 'open_dataset', record_open)
+    nwm_subset.combine_files(_files_to_append, out_file, [2, 4], append=True)
+    assert set(opened) == set(_files_to_append[2:])
+    with Dataset(out_file) as nc:
+        assert 3 == len(nc.variables['time'])
+    os.remove(out_file)
+
+
+def test_append_mismatched_ids(files_to_append_setup):
+    '''Should raise ValueError if ids differ from those in the output.'''
+
+    out_file = join(_tempdir, 'appended_mismatch.nc')
+    nwm_subset.combine_files(_files_to_append[:1], out_file, [2, 4])
+    with pytest.raises(ValueError):
+        nwm_subset.combine_files(_files_to_append[1:], out_file, [2, 6],
+                                 append=True)
+    os.remove(out_file)
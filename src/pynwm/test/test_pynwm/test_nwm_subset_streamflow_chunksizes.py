@@ -0,0 +1,40 @@
+import pytest
+
+from pynwm import nwm_subset
+
+
+def test_default_chunking():
+    '''Should leave chunking to netCDF if no chunking is given.'''
+
+    assert None == nwm_subset._streamflow_chunksizes(None, 18, 1000)
+
+
+def test_time_series_chunking():
+    '''Chunks should hold every time step for a block of rivers.'''
+
+    returned = nwm_subset._streamflow_chunksizes('time_series', 18, 1000)
+    assert (18, 1000) == returned
+    returned = nwm_subset._streamflow_chunksizes('time_series', 80, 2700000)
+    assert 80 == returned[0]
+    assert nwm_subset._CHUNK_VALUES // 80 == returned[1]
+
+
+def test_map_chunking():
+    '''Chunks should hold one time step for many rivers.'''
+
+    returned = nwm_subset._streamflow_chunksizes('map', 18, 1000)
+    assert (1, 1000) == returned
+    returned = nwm_subset._streamflow_chunksizes('map', 18, 2700000)
+    assert (1, nwm_subset._CHUNK_VALUES) == returned
+
+
+def test_tuple_chunking():
+    '''Chunk tuples should be limited to the variable shape.'''
+
+    returned = nwm_subset._streamflow_chunksizes((6, 5000), 18, 1000)
+    assert (6, 1000) == returned
+
+
+def test_invalid_chunking():
+    with pytest.raises(ValueError):
+        nwm_subset._streamflow_chunksizes('bogus', 18, 1000)